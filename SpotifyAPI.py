@@ -1,7 +1,17 @@
+import sys
+import json
+import argparse
 import spotipy
-from playlist_analysis import PlaylistAnalyser
-from playlist_csv_manager import PlaylistCSVManager
-from playlist_maker import PlaylistMaker
+from feature_cache import DEFAULT_CACHE_DIR, FeatureCache
+from instrumentation import INSTRUMENTATION, stage
+from request_scheduler import RequestScheduler, ScheduledSpotify, SPOTIPY_RETRY_OPTIONS
+
+# The playlist modules pull in pandas, numpy and (for analysis) matplotlib, which take hundreds of
+# milliseconds to import. They are imported inside the menu options and commands that use them, so
+# each run only pays for what it needs.
+
+# The global options, which apply to a whole job file and so cannot be set by one of its jobs
+JOB_GLOBAL_OPTIONS = ['key_file', 'cache_dir', 'concurrency', 'report', 'profile', 'async_client']
 
 # Read the sensitive information from a file
 def read_credentials(filename):
@@ -30,9 +40,12 @@ def read_credentials(filename):
 def get_spotifyObject(clientID, clientSecret, redirect_uri):
     """
     Creates an authenticated Spotify API object using OAuth 2.0.
+
+    Every API call made through the object goes through a shared RequestScheduler, which
+    rate limits requests and retries throttled (429) and failed (5xx) requests.
     
     Returns:
-        spotipy.Spotify: An authenticated Spotify API object.
+        ScheduledSpotify: An authenticated Spotify API object.
     """
     # Create a SpotifyOAuth object for authentication
     auth_manager = spotipy.SpotifyOAuth(
@@ -41,10 +54,49 @@ def get_spotifyObject(clientID, clientSecret, redirect_uri):
         redirect_uri   
     )
     
-    # Create a Spotify API object using the authentication manager
-    sp = spotipy.Spotify(auth_manager=auth_manager)
+    # Create a Spotify API object using the authentication manager, leaving status retries to the scheduler
+    sp = spotipy.Spotify(auth_manager=auth_manager, **SPOTIPY_RETRY_OPTIONS)
     
-    return sp  # Return the authenticated Spotify API object
+    return ScheduledSpotify(sp, RequestScheduler())  # Return the authenticated Spotify API object
+
+
+def get_async_spotifyObject(clientID, clientSecret, redirect_uri, max_connections=None):
+    """
+    Creates an authenticated Spotify API object backed by the asyncio client.
+
+    The object has the same blocking interface as the one get_spotifyObject returns, but its
+    requests share a pooled keep-alive session and a single token refresh.
+
+    Args:
+        max_connections (int): The maximum number of requests in flight, the client's default if None.
+    Returns:
+        SyncFacade: An authenticated Spotify API object.
+    """
+    from async_spotify import DEFAULT_MAX_CONNECTIONS, AsyncSpotify, SyncFacade, async_available
+    if not async_available():
+        raise SystemExit("The async client needs aiohttp: pip install aiohttp")
+
+    auth_manager = spotipy.SpotifyOAuth(clientID, clientSecret, redirect_uri)
+    client = AsyncSpotify(auth_manager=auth_manager, max_connections=max_connections or DEFAULT_MAX_CONNECTIONS)
+    return SyncFacade(client)
+
+
+def create_client(filename='key.txt', redirect_uri='http://localhost:3000', use_async=False, max_connections=None):
+    """
+    Creates an authenticated Spotify API object from a credentials file.
+
+    Args:
+        filename (str): The name of the file containing credentials.
+        redirect_uri (str): The redirect URI registered for the Spotify app.
+        use_async (bool): Whether to use the asyncio client with a pooled session instead of spotipy's.
+        max_connections (int): The maximum number of requests in flight with the asyncio client.
+    Returns:
+        ScheduledSpotify or SyncFacade: An authenticated Spotify API object.
+    """
+    clientID, clientSecret = read_credentials(filename)
+    if use_async:
+        return get_async_spotifyObject(clientID, clientSecret, redirect_uri, max_connections)
+    return get_spotifyObject(clientID, clientSecret, redirect_uri)
 
 
 def menu():
@@ -52,11 +104,10 @@ def menu():
     Displays a main menu for the user to choose from different options.
     """
     # Assuming 'key.txt' is in the same directory as your script
-    filename = 'key.txt'
-    clientID, clientSecret = read_credentials(filename)
-    redirect_uri = 'http://localhost:3000'
+    spotifyObject = create_client('key.txt')
 
-    spotifyObject = get_spotifyObject(clientID, clientSecret, redirect_uri)
+    # Share one persistent audio feature cache between runs
+    featureCache = FeatureCache()
 
     while True:  # Continue displaying the menu until the user chooses to exit
         print(
@@ -64,25 +115,46 @@ def menu():
             "\n0 - Exit the console" +
             "\n1 - Playlist CSV Analysis" +
             "\n2 - Create Playlist CSV file" +
-            "\n3 - Make Playlist"
+            "\n3 - Make Playlist" +
+            "\n4 - Clear audio feature cache" +
+            "\n5 - Sync Playlist CSV file" +
+            "\n6 - Export all my playlists"
         )
         try:
             user_input = int(input("Enter Your Choice: "))  # Read the user's choice as an integer
 
             # Playlist CSV Analysis
             if user_input == 1:
+                from playlist_analysis import PlaylistAnalyser
                 analyser = PlaylistAnalyser()  # Instantiate PlaylistAnalyser
                 analyser.analyse()  # Call the analyse method to perform the analysis
             # Create Playlist CSV File
             elif user_input == 2:
                 # Instantiate PlaylistCSVManager and call create_playlist_csv method
-                csvManager = PlaylistCSVManager(spotifyObject)
+                from playlist_csv_manager import PlaylistCSVManager
+                csvManager = PlaylistCSVManager(spotifyObject, featureCache)
                 csvManager.create_playlist_csv()
             # Make Playlist
             elif user_input == 3:
                 # Instantiate PlaylistMaker and call make_playlist method
-                playlistMaker = PlaylistMaker(spotifyObject)
+                from playlist_maker import PlaylistMaker
+                playlistMaker = PlaylistMaker(spotifyObject, featureCache)
                 playlistMaker.make_playlist()
+            # Clear audio feature cache
+            elif user_input == 4:
+                from playlist_csv_manager import PlaylistCSVManager
+                csvManager = PlaylistCSVManager(spotifyObject, featureCache)
+                csvManager.clear_feature_cache()
+            # Sync Playlist CSV File
+            elif user_input == 5:
+                from playlist_csv_manager import PlaylistCSVManager
+                csvManager = PlaylistCSVManager(spotifyObject, featureCache)
+                csvManager.sync_playlist_csv()
+            # Export all my playlists
+            elif user_input == 6:
+                from playlist_csv_manager import PlaylistCSVManager
+                csvManager = PlaylistCSVManager(spotifyObject, featureCache)
+                csvManager.export_all_playlists()
             # Exit the console
             elif user_input == 0:
                 print("Goodbye")
@@ -94,7 +166,443 @@ def menu():
             # Error handling when input is in an invalid format (not an integer)
             print("Invalid Input")
 
-    
 
-#start main menu 
-menu()
\ No newline at end of file
+class CommandContext:
+    """
+    Holds what the commands of one process share: a single authenticated client, created on
+    first use so that commands which never call the API never authenticate, and one feature cache.
+    """
+
+    def __init__(self, args):
+        """
+        Initializes a CommandContext instance from the global command line options.
+
+        Args:
+            args (argparse.Namespace): The parsed command line options.
+        """
+        self.key_file = args.key_file
+        self.cache_dir = args.cache_dir
+        self._concurrency = args.concurrency
+        self.use_async = args.async_client
+        self._client = None
+        self._cache = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = create_client(self.key_file, use_async=self.use_async, max_connections=self._concurrency)
+        return self._client
+
+    def close(self):
+        """
+        Closes the asyncio client's pooled connections, if it was used.
+        """
+        if self._client is not None and self.use_async:
+            self._client.close()
+
+    @property
+    def concurrency(self):
+        if self._concurrency is None:
+            from playlist_csv_manager import DEFAULT_PAGE_CONCURRENCY
+            self._concurrency = DEFAULT_PAGE_CONCURRENCY
+        return self._concurrency
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = FeatureCache(self.cache_dir)
+        return self._cache
+
+
+def run_export(args, context):
+    """
+    Exports playlists: one playlist to a file, or several (or all owned) to the consolidated store.
+    """
+    from bulk_export import bulk_export
+    from playlist_csv_manager import create_csv_at
+    from playlist_storage import DEFAULT_PLAYLIST_PATH, DEFAULT_STORE_PATH
+
+    if len(args.playlist_ids) == 1 and not args.store:
+        create_csv_at(context.client, args.playlist_ids[0], args.output or DEFAULT_PLAYLIST_PATH,
+                      context.cache, context.concurrency)
+    else:
+        # No IDs means every playlist the user owns
+        bulk_export(context.client, args.playlist_ids or None, args.store or DEFAULT_STORE_PATH,
+                    context.cache, context.concurrency)
+
+
+def run_sync(args, context):
+    """
+    Brings a playlist file up to date with a playlist, fetching only new tracks.
+    """
+    from playlist_csv_manager import sync_csv
+    sync_csv(context.client, args.playlist_id, args.output, context.cache, context.concurrency)
+
+
+def run_analyse(args, context):
+    """
+    Prints the summary statistics of a playlist file.
+    """
+    from playlist_storage import load_playlist_stats, load_store_stats
+    if args.store:
+        # Combine the precomputed statistics of every playlist in the store
+        load_store_stats(args.store).report()
+    else:
+        load_playlist_stats(args.input).report()
+
+
+def run_history(args, context):
+    """
+    Prints the number of tracks added in each period from the date added rollup, without reading any tracks.
+    """
+    import pandas as pd
+    from playlist_analysis import DATE_FORMATS
+    from playlist_storage import load_playlist_rollup, load_store_rollup
+    rollup = load_store_rollup(args.store) if args.store else load_playlist_rollup(args.input)
+
+    if args.artist:
+        added = rollup.artist_timeline(args.artist, args.level)
+        if not added.sum():
+            raise SystemExit(f"No tracks by '{args.artist}' found")
+    else:
+        added = rollup.counts(args.level)
+
+    columns = {'Added': added, 'Total': added.cumsum()}
+    if args.rolling:
+        columns[f'Rolling {args.rolling} Mean'] = added.rolling(args.rolling, min_periods=1).mean().round(2)
+    history = pd.DataFrame(columns)
+    history.index = history.index.strftime(DATE_FORMATS[args.level])
+    print(history.to_string())
+
+
+def run_reshape(args, context):
+    """
+    Rearranges a playlist file into one of the shapes and saves the result.
+
+    With --target options, or a smoothness weight, several features are fitted at once by the
+    reshaping engine, using audio features from the cache and fetching any it is missing.
+    """
+    from playlist_analysis import SHAPES, rearrange_to_shape
+    from playlist_storage import load_playlist, save_playlist
+
+    targets = dict(parse_assignment(target, int) for target in args.target or [])
+    if args.shape is not None:
+        targets.setdefault('composite', args.shape)
+    if not targets:
+        raise SystemExit("Give a shape number or at least one --target FEATURE=SHAPE")
+
+    unknown = [shape for shape in targets.values() if shape not in SHAPES]
+    if unknown:
+        shapes = ", ".join(f"{number} - {description}" for number, (description, _) in SHAPES.items())
+        raise SystemExit(f"Unknown shape {unknown[0]}, choose one of: {shapes}")
+
+    df = load_playlist(args.input)
+    if list(targets) == ['composite'] and not (args.tempo_smoothness or args.key_smoothness):
+        df = rearrange_to_shape(df, targets['composite'])
+    else:
+        from reshape_engine import load_reshape_features, reshape_playlist
+        weights = dict(parse_assignment(weight, float) for weight in args.weight or [])
+        table = load_reshape_features(df, context.cache, None if args.cached_only else lambda: context.client)
+        try:
+            df, summary = reshape_playlist(df, table, targets, weights, args.tempo_smoothness, args.key_smoothness,
+                                           args.method, args.time_budget)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"Reshaped {summary['tracks']} tracks with the {summary['method']} method: cost "
+              f"{summary['initial_cost']:.2f} -> {summary['cost']:.2f} after {summary['swaps']} swaps "
+              f"in {summary['seconds']:.2f}s")
+    save_playlist(df, args.output or args.input)
+
+
+def parse_assignment(value, convert):
+    """
+    Splits a NAME=VALUE command line option, converting the value.
+
+    Returns:
+        tuple: The name and the converted value.
+    """
+    name, separator, setting = value.partition('=')
+    try:
+        if not separator:
+            raise ValueError
+        return name.strip(), convert(setting)
+    except ValueError:
+        raise SystemExit(f"Expected NAME=VALUE, got '{value}'")
+
+
+def run_publish(args, context):
+    """
+    Publishes a playlist file as a new playlist, or reorders an existing playlist to match it.
+    """
+    from playlist_maker import publish_playlist, reorder_playlist
+    from playlist_storage import load_tracks
+
+    track_ids = [track_id for track_id in load_tracks(args.input, ['ID']).track_ids() if track_id]
+
+    if args.playlist_id:
+        try:
+            requests_made = reorder_playlist(context.client, args.playlist_id, track_ids)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f'Playlist reordered with {requests_made} requests')
+    else:
+        publish_playlist(context.client, args.name, track_ids)
+        print(f'Playlist "{args.name}" created and songs added successfully!')
+
+
+def run_similar(args, context):
+    """
+    Builds a playlist of tracks like a playlist file's, or like given tracks, from every exported track.
+
+    Without --name the chosen track IDs are printed instead of published.
+    """
+    from playlist_maker import publish_playlist, similar_track_ids
+
+    if args.track:
+        seed_ids = args.track
+    else:
+        from playlist_storage import load_playlist
+        seed_ids = load_playlist(args.input, ['ID'])['ID'].dropna().tolist()
+
+    track_ids = similar_track_ids(context.cache, seed_ids, args.size, args.rebuild_index)
+    if not track_ids:
+        raise SystemExit("None of the seed tracks have cached audio features, export them first")
+
+    if args.name:
+        publish_playlist(context.client, args.name, track_ids)
+        print(f'Playlist "{args.name}" created with {len(track_ids)} similar songs!')
+    else:
+        print("\n".join(track_ids))
+
+
+def run_render(args, context):
+    """
+    Renders the charts of playlist files to image files, several files at a time.
+    """
+    from playlist_analysis import render_many
+    from playlist_storage import DEFAULT_PLAYLIST_PATH
+
+    written = render_many(args.inputs or [DEFAULT_PLAYLIST_PATH], args.output_dir, args.format, args.workers)
+    print(f"Rendered {len(written)} charts to '{args.output_dir}'")
+
+
+def run_batch(args, context):
+    """
+    Analyses every playlist file in directories or glob patterns in a pool of processes and writes one report.
+    """
+    from batch_analysis import batch_analyse
+    from playlist_analysis import SHAPES
+    if args.shape is not None and args.shape not in SHAPES:
+        shapes = ", ".join(f"{number} - {description}" for number, (description, _) in SHAPES.items())
+        raise SystemExit(f"Unknown shape {args.shape}, choose one of: {shapes}")
+    try:
+        report = batch_analyse(args.inputs, args.report_file, equation_number=args.shape, charts_dir=args.charts,
+                               reshaped_dir=args.reshaped_dir, file_format=args.format, workers=args.workers,
+                               chunk_size=args.chunk_size, memory_limit_mb=args.memory_limit)
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    # Per-file errors are kept in the report, but a batch in which every file failed is an error itself
+    if report['Error'].notna().all():
+        raise SystemExit(f"All {len(report)} playlist files failed, e.g. {report['Error'].iloc[0]}")
+
+
+def parse_job(parser, job):
+    """
+    Parses the argument list of one job of a job file.
+
+    Args:
+        parser (argparse.ArgumentParser): The command line parser.
+        job (list): The arguments of the job.
+    Returns:
+        argparse.Namespace: The parsed arguments of the job's command.
+    Raises:
+        ValueError: If the job is not a command other than jobs, or sets global options, which
+            only apply to the whole job file.
+        SystemExit: If argparse rejects the arguments.
+    """
+    if not isinstance(job, list) or not job:
+        raise ValueError("a job must be a non-empty list of command arguments")
+    job_args = parser.parse_args([str(argument) for argument in job])
+    if getattr(job_args, 'func', run_jobs) is run_jobs:
+        raise ValueError("a job must be an export, sync, analyse, history, reshape, publish, similar, render or batch command")
+
+    global_options = [f"--{dest.replace('_', '-')}" for dest in JOB_GLOBAL_OPTIONS
+                      if getattr(job_args, dest) != parser.get_default(dest)]
+    if global_options:
+        raise ValueError(f"{', '.join(global_options)} must be given before 'jobs', as they apply to every job")
+    return job_args
+
+
+def run_clear_cache(args, context):
+    """
+    Removes tracks, or every track, from the audio feature cache so their features are fetched again.
+    """
+    removed = context.cache.invalidate(args.track_ids or None)
+    print(f"Removed {removed} tracks from the audio feature cache")
+
+
+def run_jobs(args, context):
+    """
+    Runs every job in a job file in this process, sharing one client and one feature cache.
+
+    The job file is a JSON list in which each job is the argument list of one command,
+    for example ["export", "<playlist id>", "--output", "a.parquet"].
+    """
+    with open(args.job_file, 'r') as file:
+        jobs = json.load(file)
+
+    parser = build_parser()
+    failures = 0
+    for number, job in enumerate(jobs, start=1):
+        print(f"Job {number}/{len(jobs)}: {' '.join(map(str, job)) if isinstance(job, list) else job}")
+        try:
+            job_args = parse_job(parser, job)
+            with stage(f"job.{job_args.func.__name__.replace('run_', '', 1)}"):
+                job_args.func(job_args, context)
+        except SystemExit as e:
+            # Invalid arguments (argparse has printed why) or a command stopping with a message
+            failures += 1
+            print(f"Job {number} failed: {e.code if isinstance(e.code, str) else 'invalid arguments'}")
+        except Exception as e:
+            # Keep going so one bad playlist does not stop the whole batch
+            failures += 1
+            print(f"Job {number} failed: {e}")
+
+    if failures:
+        raise SystemExit(f"{failures} of {len(jobs)} jobs failed")
+
+
+def build_parser():
+    """
+    Builds the command line parser of the non-interactive commands.
+
+    Returns:
+        argparse.ArgumentParser: The parser; with no command the interactive menu is shown.
+    """
+    parser = argparse.ArgumentParser(description="Analyse and reshape Spotify playlists.")
+    parser.add_argument('--key-file', default='key.txt', help="file containing the client ID and client secret")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="directory of the audio feature cache")
+    parser.add_argument('--concurrency', type=int,
+                        help="number of pages or playlists fetched at the same time (default 4)")
+    parser.add_argument('--report', help="write a JSON report of stage timings, API calls and errors to this file")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="profile the run with cProfile, saving the raw profile to FILE and the slowest functions to the report")
+    parser.add_argument('--async-client', action='store_true',
+                        help="send requests through the asyncio client with pooled connections (needs aiohttp)")
+    commands = parser.add_subparsers(title='commands')
+
+    export = commands.add_parser('export', help="export playlists to a file or the consolidated store")
+    export.add_argument('playlist_ids', nargs='*', help="playlist IDs; none exports every playlist you own")
+    export.add_argument('-o', '--output', help="playlist file to write when exporting a single playlist")
+    export.add_argument('--store', help="consolidated store directory to write to")
+    export.set_defaults(func=run_export)
+
+    sync = commands.add_parser('sync', help="update a playlist file with only the changes to a playlist")
+    sync.add_argument('playlist_id')
+    sync.add_argument('-o', '--output', help="playlist file to update")
+    sync.set_defaults(func=run_sync)
+
+    analyse = commands.add_parser('analyse', help="print the statistics of a playlist file")
+    analyse.add_argument('-i', '--input', help="playlist file to analyse")
+    analyse.add_argument('--store', help="analyse every playlist of a bulk export store instead")
+    analyse.set_defaults(func=run_analyse)
+
+    history = commands.add_parser('history', help="print the tracks added to a playlist file in each period")
+    history.add_argument('-i', '--input', help="playlist file to summarise")
+    history.add_argument('--store', help="summarise every playlist of a bulk export store instead")
+    history.add_argument('--level', default='month', choices=['day', 'week', 'month', 'year'], help="period length")
+    history.add_argument('--artist', help="only count the tracks of this artist, by name or Spotify ID")
+    history.add_argument('--rolling', type=int, metavar='N', help="add the mean tracks added over the last N periods")
+    history.set_defaults(func=run_history)
+
+    reshape = commands.add_parser('reshape', help="rearrange a playlist file into a shape")
+    reshape.add_argument('shape', type=int, nargs='?', help="shape of the composite value, as listed in the analysis menu")
+    reshape.add_argument('-i', '--input', help="playlist file to rearrange")
+    reshape.add_argument('-o', '--output', help="file to write, the input file if not given")
+    reshape.add_argument('--target', action='append', metavar='FEATURE=SHAPE',
+                         help="shape of an audio feature, e.g. energy=9; repeat to fit several features at once")
+    reshape.add_argument('--weight', action='append', metavar='FEATURE=WEIGHT', help="weight of a feature's target (default 1)")
+    reshape.add_argument('--tempo-smoothness', type=float, default=0.0, help="cost of an 80 bpm jump between neighbours")
+    reshape.add_argument('--key-smoothness', type=float, default=0.0, help="cost of the worst key clash between neighbours")
+    reshape.add_argument('--method', default='auto', choices=['auto', 'hungarian', 'greedy'],
+                         help="how the starting order is found; hungarian needs scipy")
+    reshape.add_argument('--time-budget', type=float, default=2.0, help="seconds to spend improving the order")
+    reshape.add_argument('--cached-only', action='store_true', help="only use cached audio features, never log in")
+    reshape.set_defaults(func=run_reshape)
+
+    publish = commands.add_parser('publish', help="publish a playlist file to Spotify")
+    publish.add_argument('-i', '--input', help="playlist file to publish")
+    target = publish.add_mutually_exclusive_group(required=True)
+    target.add_argument('--name', help="name of a new playlist to create")
+    target.add_argument('--playlist-id', help="existing playlist to reorder to match the file")
+    publish.set_defaults(func=run_publish)
+
+    similar = commands.add_parser('similar', help="make a playlist of tracks like a playlist file's")
+    similar.add_argument('-i', '--input', help="playlist file whose tracks are the seeds")
+    similar.add_argument('--track', action='append', help="seed track ID instead of a file; repeat for several")
+    similar.add_argument('--size', type=int, default=50, help="number of tracks to choose")
+    similar.add_argument('--name', help="name of a new playlist to publish them to; printed if not given")
+    similar.add_argument('--rebuild-index', action='store_true', help="rebuild the similarity index first")
+    similar.set_defaults(func=run_similar)
+
+    render = commands.add_parser('render', help="render the charts of playlist files to image files")
+    render.add_argument('inputs', nargs='*', help="playlist files to render")
+    render.add_argument('-o', '--output-dir', default='charts', help="directory to write the images to")
+    render.add_argument('--format', default='png', choices=['png', 'svg'], help="image format")
+    render.add_argument('--workers', type=int, help="number of rendering processes (default: number of CPUs)")
+    render.set_defaults(func=run_render)
+
+    batch = commands.add_parser('batch', help="analyse many playlist files in parallel into one comparative report")
+    batch.add_argument('inputs', nargs='+', help="directories, glob patterns or playlist files to analyse")
+    batch.add_argument('-o', '--report-file', default='batch_report.csv', help="report file; its extension picks the format")
+    batch.add_argument('--shape', type=int, help="rearrange each playlist into this shape and report how well it fits")
+    batch.add_argument('--reshaped-dir', help="directory to save the rearranged playlists to")
+    batch.add_argument('--charts', metavar='DIR', help="directory to render each playlist's charts to")
+    batch.add_argument('--format', default='png', choices=['png', 'svg'], help="image format of the charts")
+    batch.add_argument('--workers', type=int, help="number of analysis processes (default: number of CPUs)")
+    batch.add_argument('--chunk-size', type=int, help="playlist files per task (default: about four tasks per process)")
+    batch.add_argument('--memory-limit', type=int, metavar='MB', help="memory limit of each process, where supported")
+    batch.set_defaults(func=run_batch)
+
+    clear_cache = commands.add_parser('clear-cache', help="remove tracks from the audio feature cache so they are fetched again")
+    clear_cache.add_argument('track_ids', nargs='*', help="IDs of the tracks to remove; none clears the whole cache")
+    clear_cache.set_defaults(func=run_clear_cache)
+
+    jobs = commands.add_parser('jobs', help="run a JSON file of commands with one shared client")
+    jobs.add_argument('job_file')
+    jobs.set_defaults(func=run_jobs)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs a command given on the command line, or the interactive menu when there is none.
+
+    Args:
+        argv (list): The command line arguments, sys.argv[1:] if None.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser().parse_args(argv)
+    context = CommandContext(args)
+    if args.profile:
+        INSTRUMENTATION.start_profile(args.profile)
+
+    try:
+        if not hasattr(args, 'func'):
+            menu()
+        else:
+            with stage(f"command.{args.func.__name__.replace('run_', '', 1)}"):
+                args.func(args, context)
+    finally:
+        context.close()
+        if args.report:
+            # The report is written even when the command fails, so the failure is in it
+            INSTRUMENTATION.write_report(args.report, {'arguments': argv})
+            print(f"Run report written to '{args.report}'")
+        elif args.profile:
+            INSTRUMENTATION.stop_profile()
+
+
+if __name__ == '__main__':
+    main()
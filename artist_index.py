@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+
+# The separator the Artist column joins the credited artists of a track with
+ARTIST_SEPARATOR = ', '
+
+
+def artist_lookup(artist_id, name):
+    """
+    Returns the key an artist is interned under: its Spotify ID, or its name for local files without one.
+    """
+    return artist_id if isinstance(artist_id, str) and artist_id else f'name:{name}'
+
+
+def split_artists(artists):
+    """
+    Splits joined Artist values back into one lookup key per credited artist.
+
+    Only used for playlist files written without an artist index; an artist whose name
+    contains the separator is split in two.
+
+    Args:
+        artists (pd.Series): The joined artist names of each track.
+    Returns:
+        pd.Series: The lookup key of every credited artist.
+    """
+    names = artists.dropna().astype(str).str.split(ARTIST_SEPARATOR).explode()
+    return 'name:' + names
+
+
+class ArtistIndex:
+    """
+    The credited artists of playlist tracks, normalised into an interned artist dictionary
+    and a track-artist edge table.
+
+    Every artist is given an integer key the first time it is seen, and each edge links a
+    track ID to the key of one of its artists. Edges are keyed by track ID rather than row
+    position, so the index stays valid when a playlist is rearranged, and a track shared by
+    several playlists only needs its edges once. Counts, collaborations and filters are then
+    integer operations on the keys instead of string operations on the joined names.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty ArtistIndex instance.
+        """
+        self._lookups = []          # Spotify ID (or 'name:<name>') of each artist key
+        self._names = []            # Name of each artist key
+        self._keys = {}             # Lookup -> artist key
+        self._edge_tracks = []      # Track ID of each edge
+        self._edge_artists = []     # Artist key of each edge
+        self._indexed_tracks = set()
+        self._edges = None          # The edge table, built on first use after a change
+
+    def __len__(self):
+        return len(self._names)
+
+    def intern(self, artist_id, name):
+        """
+        Returns the key of an artist, adding the artist to the dictionary if it is new.
+
+        Args:
+            artist_id (str): The Spotify ID of the artist, None for local files.
+            name (str): The name of the artist.
+        Returns:
+            int: The artist key.
+        """
+        lookup = artist_lookup(artist_id, name)
+        key = self._keys.get(lookup)
+        if key is None:
+            key = len(self._names)
+            self._keys[lookup] = key
+            self._lookups.append(lookup)
+            self._names.append(name)
+        return key
+
+    def add_track(self, track_id, artists):
+        """
+        Adds the edges of one track; tracks without an ID or already indexed are skipped.
+
+        Args:
+            track_id (str): The Spotify ID of the track.
+            artists (list): The (artist ID, name) pairs of the track's artists, in credit order.
+        """
+        if not track_id or track_id in self._indexed_tracks:
+            return
+        self._indexed_tracks.add(track_id)
+        for artist_id, name in artists:
+            self._edge_tracks.append(track_id)
+            self._edge_artists.append(self.intern(artist_id, name))
+        self._edges = None
+
+    def add_table(self, tracks):
+        """
+        Adds the edges of the tracks of a TrackTable from their credited artists.
+
+        Args:
+            tracks (TrackTable): The tracks.
+        """
+        for track_id, artists in tracks.track_credits():
+            if artists:
+                self.add_track(track_id, artists)
+
+    @property
+    def artists(self):
+        """
+        The artist dictionary, one row per artist key.
+        """
+        ids = [None if lookup.startswith('name:') else lookup for lookup in self._lookups]
+        return pd.DataFrame({'ArtistID': ids, 'Artist': self._names}, dtype=object).rename_axis('ArtistKey')
+
+    @property
+    def edges(self):
+        """
+        The track-artist edge table, one row per credited artist of each track.
+        """
+        if self._edges is None:
+            self._edges = pd.DataFrame({
+                'TrackID': np.array(self._edge_tracks, dtype=object),
+                'ArtistKey': np.array(self._edge_artists, dtype=np.int32)
+            })
+        return self._edges
+
+    def _edge_positions(self, track_ids):
+        """
+        Returns the positions of the edges of each track, repeated for tracks listed more than once.
+        """
+        positions = pd.Index(self.edges['TrackID']).get_indexer_for(pd.Index(track_ids, dtype=object))
+        return positions[positions >= 0]
+
+    def artist_keys_of(self, track_ids):
+        """
+        Returns the artist key of every credited artist of the given tracks.
+
+        Args:
+            track_ids (list): The track IDs, e.g. the ID column of a playlist.
+        Returns:
+            np.ndarray: One artist key per edge.
+        """
+        return self.edges['ArtistKey'].to_numpy()[self._edge_positions(track_ids)]
+
+    def artist_ids_of(self, track_ids):
+        """
+        Returns the lookup key of every credited artist of the given tracks, which is the same in every index.
+
+        Args:
+            track_ids (list): The track IDs.
+        Returns:
+            pd.Series: One Spotify ID (or 'name:<name>') per edge.
+        """
+        return pd.Series(np.array(self._lookups, dtype=object)[self.artist_keys_of(track_ids)], dtype=object)
+
+    def credits_of(self, track_ids):
+        """
+        Lists the credited artists of each of the given tracks.
+
+        Args:
+            track_ids (list): The track IDs, e.g. the ID column of a playlist.
+        Returns:
+            pd.DataFrame: The Position of the track in track_ids, and the Lookup key and Artist name
+                of the credited artist, one row per edge of each track.
+        """
+        tracks = pd.DataFrame({'TrackID': pd.Series(track_ids, dtype=object).to_numpy(),
+                               'Position': np.arange(len(track_ids))})
+        credits = tracks.merge(self.edges, on='TrackID')
+        keys = credits['ArtistKey'].to_numpy()
+        return pd.DataFrame({
+            'Position': credits['Position'].to_numpy(),
+            'Lookup': np.array(self._lookups, dtype=object)[keys],
+            'Artist': np.array(self._names, dtype=object)[keys]
+        })
+
+    def artist_counts(self, track_ids=None):
+        """
+        Counts the tracks each artist is credited on.
+
+        Args:
+            track_ids (list): The tracks to count, e.g. the ID column of a playlist, or None for every indexed track.
+        Returns:
+            pd.Series: The number of tracks of each credited artist, largest first, indexed by name.
+        """
+        keys = self.edges['ArtistKey'].to_numpy() if track_ids is None else self.artist_keys_of(track_ids)
+        counts = pd.Series(np.bincount(keys, minlength=len(self)), index=pd.Index(self._names, name='Artist'))
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+    def co_occurrence(self, track_ids=None, top_n=None):
+        """
+        Counts the tracks each pair of artists is credited on together.
+
+        Args:
+            track_ids (list): The tracks to count, or None for every indexed track.
+            top_n (int): The number of pairs to return, or None for every pair.
+        Returns:
+            pd.DataFrame: The names of both artists and their number of shared tracks, most shared first.
+        """
+        edges = self.edges
+        if track_ids is not None:
+            edges = edges[edges['TrackID'].isin(pd.unique(pd.Series(track_ids, dtype=object)))]
+
+        # Join the edges of each track with themselves on an integer track code
+        pairs = pd.DataFrame({'Track': pd.factorize(edges['TrackID'])[0], 'ArtistKey': edges['ArtistKey'].to_numpy()})
+        pairs = pairs.merge(pairs, on='Track', suffixes=('A', 'B'))
+        pairs = pairs[pairs['ArtistKeyA'] < pairs['ArtistKeyB']]
+
+        counts = pairs.groupby(['ArtistKeyA', 'ArtistKeyB']).size().sort_values(ascending=False, kind='stable')
+        if top_n is not None:
+            counts = counts.iloc[:top_n]
+
+        names = np.array(self._names, dtype=object)
+        return pd.DataFrame({
+            'Artist A': names[counts.index.get_level_values(0).to_numpy(dtype=np.int64)],
+            'Artist B': names[counts.index.get_level_values(1).to_numpy(dtype=np.int64)],
+            'Tracks': counts.to_numpy()
+        })
+
+    def tracks_with_artist(self, track_ids, artist):
+        """
+        Finds which of the given tracks credit an artist.
+
+        Args:
+            track_ids (list): The track IDs to filter, e.g. the ID column of a playlist.
+            artist (str): The Spotify ID or name of the artist.
+        Returns:
+            np.ndarray: A boolean mask, True for each track crediting the artist.
+        """
+        keys = [key for key, (lookup, name) in enumerate(zip(self._lookups, self._names)) if artist in (lookup, name)]
+        edges = self.edges
+        matching_tracks = edges['TrackID'][edges['ArtistKey'].isin(keys)]
+        return pd.Index(track_ids, dtype=object).isin(matching_tracks.to_numpy())
+
+    def to_frames(self):
+        """
+        Returns the artist dictionary and edge table, for saving.
+        """
+        return self.artists.reset_index(drop=True), self.edges
+
+    @classmethod
+    def from_frames(cls, artists, edges):
+        """
+        Rebuilds an index from its artist dictionary and edge table.
+
+        Args:
+            artists (pd.DataFrame): The ArtistID and Artist of each artist key, in key order.
+            edges (pd.DataFrame): The TrackID and ArtistKey of each edge.
+        Returns:
+            ArtistIndex: The index.
+        """
+        index = cls()
+        index._names = artists['Artist'].astype(object).tolist()
+        index._lookups = [artist_lookup(artist_id, name) for artist_id, name in zip(artists['ArtistID'], index._names)]
+        index._keys = {lookup: key for key, lookup in enumerate(index._lookups)}
+        index._edge_tracks = edges['TrackID'].astype(object).tolist()
+        index._edge_artists = edges['ArtistKey'].astype(np.int32).tolist()
+        index._indexed_tracks = set(index._edge_tracks)
+        return index
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Builds an index from the ID and joined Artist columns of a playlist written without one.
+
+        Artists are interned by name, since the file has no artist IDs.
+
+        Args:
+            df (pd.DataFrame): The playlist data.
+        Returns:
+            ArtistIndex: The index.
+        """
+        index = cls()
+        for track_id, artists in zip(df['ID'], df['Artist']):
+            if isinstance(artists, str):
+                index.add_track(track_id, [(None, name) for name in artists.split(ARTIST_SEPARATOR)])
+        return index
+
+    @classmethod
+    def concat(cls, indices):
+        """
+        Combines the indices of several playlists into one, giving shared artists a single key.
+
+        Args:
+            indices (list): The ArtistIndex of each playlist.
+        Returns:
+            ArtistIndex: The combined index.
+        """
+        if not indices:
+            return cls()
+        frames = [index.to_frames() for index in indices]
+        artists = pd.concat([artists for artists, _ in frames], ignore_index=True)
+
+        # Map every local key to a global key, numbered in order of first appearance
+        lookups = [lookup for index in indices for lookup in index._lookups]
+        global_keys, _ = pd.factorize(pd.Series(lookups, dtype=object))
+        offsets = np.cumsum([0] + [len(index) for index in indices[:-1]])
+        edges = pd.concat([
+            pd.DataFrame({'TrackID': edges['TrackID'], 'ArtistKey': global_keys[offset + edges['ArtistKey'].to_numpy()]})
+            for (_, edges), offset in zip(frames, offsets)
+        ], ignore_index=True).drop_duplicates()
+
+        first_seen = np.unique(global_keys, return_index=True)[1]
+        return cls.from_frames(artists.iloc[first_seen].reset_index(drop=True), edges)
@@ -0,0 +1,393 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from spotipy.exceptions import SpotifyException
+from instrumentation import count
+from request_scheduler import (
+    DEFAULT_BASE_BACKOFF, DEFAULT_MAX_BACKOFF, DEFAULT_MAX_RETRIES, RequestScheduler, get_retry_after, is_retryable
+)
+
+# The base URL of the Spotify Web API, the same prefix spotipy uses
+API_BASE_URL = 'https://api.spotify.com/v1/'
+
+# The default number of pooled keep-alive connections, which also bounds the requests in flight
+DEFAULT_MAX_CONNECTIONS = 16
+
+# The default time (seconds) a request may take before it is retried
+DEFAULT_TIMEOUT = 10
+
+# Tokens are refreshed this many seconds before they expire, so no request is sent with a stale one
+TOKEN_REFRESH_MARGIN = 60
+
+# The lifetime (seconds) assumed for tokens whose expiry the auth manager does not report
+DEFAULT_TOKEN_LIFETIME = 3600
+
+
+def async_available():
+    """
+    Checks whether aiohttp, which the async client needs, is installed.
+
+    Returns:
+        bool: True if AsyncSpotify can be used.
+    """
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_id(kind, value):
+    """
+    Returns the Spotify ID of an ID, URI ('spotify:track:<id>') or open.spotify.com URL.
+
+    Args:
+        kind (str): The kind of object expected, e.g. 'track' or 'playlist'.
+        value (str): The ID, URI or URL.
+    Returns:
+        str: The Spotify ID.
+    Raises:
+        SpotifyException: If the URI or URL is of another kind, as spotipy raises.
+    """
+    if value.startswith('spotify:'):
+        parts = value.split(':')
+    elif 'open.spotify.com' in value:
+        parts = value.split('?')[0].rstrip('/').split('/')
+    else:
+        return value
+
+    # The kind precedes the ID in both URIs and URLs
+    if len(parts) < 2 or parts[-2] != kind:
+        raise SpotifyException(400, -1, f"Unexpected Spotify URI or URL type, expected a {kind}: {value}")
+    return parts[-1]
+
+
+def get_uri(kind, value):
+    """
+    Returns the Spotify URI of an ID, URI or URL, as the playlist item endpoints expect.
+    """
+    return value if value.startswith('spotify:') else f'spotify:{kind}:{get_id(kind, value)}'
+
+
+class AsyncSpotify:
+    """
+    An asyncio Spotify Web API client with the methods of spotipy.Spotify used by this project.
+
+    Requests share one aiohttp session, whose pool of keep-alive connections also bounds how
+    many requests are in flight. Every request, retries included, takes a token from the bucket
+    of a RequestScheduler first, so requests are smoothed to its rate; the scheduler can be
+    shared with blocking clients to keep them all under one rate limit. The access token is
+    fetched once and shared by every request; when it nears expiry (or a request is rejected
+    with 401) a single refresh is made while the other requests wait for it. Throttled (429)
+    requests pause every request sharing the scheduler for the Retry-After time, and server
+    errors are retried with jittered exponential backoff, as RequestScheduler does for the
+    blocking client.
+    """
+
+    def __init__(self, auth=None, auth_manager=None, prefix=API_BASE_URL, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_retries=DEFAULT_MAX_RETRIES, timeout=DEFAULT_TIMEOUT, scheduler=None):
+        """
+        Initializes an AsyncSpotify instance.
+
+        Args:
+            auth (str): A fixed access token, used instead of an auth manager.
+            auth_manager: A spotipy auth manager, e.g. spotipy.SpotifyOAuth, that provides and refreshes tokens.
+            prefix (str): The base URL of the API.
+            max_connections (int): The maximum number of connections, and so of requests in flight.
+            max_retries (int): The number of times a throttled or failed request is retried.
+            timeout (float): The time (seconds) a request may take before it is retried.
+            scheduler (RequestScheduler): The scheduler whose token bucket and Retry-After pauses the
+                requests share, or None for one of the client's own at the default rate.
+        """
+        self.auth_manager = auth_manager
+        self.prefix = prefix
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+
+        self._token = auth
+        self._token_expires_at = float('inf') if auth else 0.0
+        self._session = None        # The aiohttp session, created in the event loop on first use
+        self._semaphore = None
+        self._token_lock = None
+
+        self.metrics = {
+            'requests': 0,          # Requests sent, including retries
+            'retries': 0,           # Requests that were retried
+            'throttled': 0,         # 429 responses received
+            'server_errors': 0,     # 5xx responses and connection failures received
+            'token_refreshes': 0    # Access tokens fetched from the auth manager
+        }
+
+    def stats(self):
+        """
+        Returns a copy of the client's metrics.
+
+        Returns:
+            dict: The request, retry and token refresh counters.
+        """
+        return dict(self.metrics)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_session(self):
+        """
+        Returns the shared session, creating it and the locks it needs in the running event loop.
+        """
+        if self._session is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+            self._token_lock = asyncio.Lock()
+        return self._session
+
+    async def close(self):
+        """
+        Closes the session and its pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _fetch_token(self):
+        """
+        Fetches an access token from the auth manager, refreshing it if it has expired.
+
+        Returns:
+            tuple: The access token and the time.time() it expires at.
+        """
+        try:
+            token = self.auth_manager.get_access_token(as_dict=False)
+        except TypeError:
+            # Auth managers without the as_dict argument return the token itself
+            token = self.auth_manager.get_access_token()
+
+        get_cached_token = getattr(self.auth_manager, 'get_cached_token', None)
+        token_info = get_cached_token() if get_cached_token else None
+        expires_at = (token_info or {}).get('expires_at', time.time() + DEFAULT_TOKEN_LIFETIME)
+        return token, expires_at
+
+    async def _get_token(self, stale=None):
+        """
+        Returns the shared access token, refreshing it once for every request waiting on it.
+
+        Args:
+            stale (str): A token that was rejected, which is refreshed unless another request already has.
+        Returns:
+            str: The access token, or None without authentication.
+        """
+        if self.auth_manager is None:
+            return self._token
+
+        async with self._token_lock:
+            expiring = time.time() > self._token_expires_at - TOKEN_REFRESH_MARGIN
+            if self._token is None or expiring or (stale is not None and stale == self._token):
+                # spotipy's auth managers refresh and cache tokens with blocking requests
+                loop = asyncio.get_running_loop()
+                self._token, self._token_expires_at = await loop.run_in_executor(None, self._fetch_token)
+                self.metrics['token_refreshes'] += 1
+                count('api.token_refreshes')
+            return self._token
+
+    async def _acquire(self):
+        """
+        Waits, without blocking the event loop, until the scheduler's bucket has a token and takes it.
+        """
+        while True:
+            wait = self.scheduler.reserve()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _request(self, method, url, payload=None, **params):
+        """
+        Sends a request, retrying throttled and failed attempts.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL relative to the API prefix.
+            payload (dict): The JSON body, if any.
+            **params: Query parameters; those that are None are left out.
+        Returns:
+            dict: The decoded response, or None for an empty response.
+        Raises:
+            SpotifyException: If the API rejects the request, or still fails after all retries.
+        """
+        import aiohttp
+
+        session = self._get_session()
+        params = {key: str(value) for key, value in params.items() if value is not None}
+        token = await self._get_token()
+        attempt = 0
+        refreshed = False
+
+        while True:
+            # Wait for the rate limit, and out any Retry-After pause set by a request sharing the scheduler
+            await self._acquire()
+
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            try:
+                async with self._semaphore:
+                    self.metrics['requests'] += 1
+                    async with session.request(method, self.prefix + url, params=params, json=payload,
+                                               headers=headers) as response:
+                        text = await response.text()
+                        status = response.status
+                        response_headers = dict(response.headers)
+                        response_url = str(response.url)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            else:
+                if status < 400:
+                    return json.loads(text) if text else None
+
+                try:
+                    message = json.loads(text)['error']['message']
+                except (ValueError, KeyError, TypeError):
+                    message = text or 'error'
+                error = SpotifyException(status, -1, f'{response_url}:\n {message}', headers=response_headers)
+
+                if status == 401 and self.auth_manager is not None and not refreshed:
+                    # The token expired early; refresh it once and send the request again
+                    token = await self._get_token(stale=token)
+                    refreshed = True
+                    continue
+
+            retryable = is_retryable(error) or isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+            if not retryable or attempt >= self.max_retries:
+                if retryable:
+                    count('api.failures')
+                raise error
+
+            self.metrics['retries'] += 1
+            count('api.retries')
+            retry_after = get_retry_after(error) if getattr(error, 'http_status', None) == 429 else None
+            if getattr(error, 'http_status', None) == 429:
+                self.metrics['throttled'] += 1
+                count('api.throttled')
+            else:
+                self.metrics['server_errors'] += 1
+                count('api.server_errors')
+
+            if retry_after is not None:
+                # Pause every request sharing the scheduler, not only this one
+                self.scheduler.pause(retry_after)
+            else:
+                await asyncio.sleep(random.uniform(0, min(DEFAULT_MAX_BACKOFF, DEFAULT_BASE_BACKOFF * (2 ** attempt))))
+            attempt += 1
+
+    async def current_user(self):
+        return await self._request('GET', 'me/')
+
+    async def current_user_playlists(self, limit=50, offset=0):
+        return await self._request('GET', 'me/playlists', limit=limit, offset=offset)
+
+    async def playlist(self, playlist_id, fields=None, market=None, additional_types=('track',)):
+        return await self._request('GET', f"playlists/{get_id('playlist', playlist_id)}",
+                                   fields=fields, market=market, additional_types=','.join(additional_types))
+
+    async def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0, market=None,
+                              additional_types=('track',)):
+        return await self._request('GET', f"playlists/{get_id('playlist', playlist_id)}/tracks",
+                                   limit=limit, offset=offset, fields=fields, market=market,
+                                   additional_types=','.join(additional_types))
+
+    async def audio_features(self, tracks=None):
+        # Accept either a single ID or a list of IDs, as spotipy does
+        track_ids = [tracks] if isinstance(tracks, str) else list(tracks or [])
+        results = await self._request('GET', 'audio-features/', ids=','.join(get_id('track', track_id) for track_id in track_ids))
+        if results is None:
+            # An empty response means none of the tracks have features, as the blocking client treats it
+            return [None] * len(track_ids)
+        return results['audio_features'] if 'audio_features' in results else results
+
+    async def user_playlist_create(self, user, name, public=True, collaborative=False, description=''):
+        payload = {'name': name, 'public': public, 'collaborative': collaborative, 'description': description}
+        return await self._request('POST', f'users/{user}/playlists', payload=payload)
+
+    async def playlist_change_details(self, playlist_id, name=None, public=None, collaborative=None, description=None):
+        payload = {key: value for key, value in (('name', name), ('public', public), ('collaborative', collaborative),
+                                                 ('description', description)) if value is not None}
+        return await self._request('PUT', f"playlists/{get_id('playlist', playlist_id)}", payload=payload)
+
+    async def playlist_add_items(self, playlist_id, items, position=None):
+        payload = {'uris': [get_uri('track', item) for item in items]}
+        return await self._request('POST', f"playlists/{get_id('playlist', playlist_id)}/tracks",
+                                   payload=payload, position=position)
+
+    async def playlist_replace_items(self, playlist_id, items):
+        payload = {'uris': [get_uri('track', item) for item in items]}
+        return await self._request('PUT', f"playlists/{get_id('playlist', playlist_id)}/tracks", payload=payload)
+
+    async def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        payload = {'range_start': range_start, 'range_length': range_length, 'insert_before': insert_before}
+        if snapshot_id:
+            payload['snapshot_id'] = snapshot_id
+        return await self._request('PUT', f"playlists/{get_id('playlist', playlist_id)}/tracks", payload=payload)
+
+
+class SyncFacade:
+    """
+    Exposes an AsyncSpotify through the blocking interface of spotipy.Spotify.
+
+    The client runs on an event loop in a background thread and every method call waits for
+    its coroutine there, so the facade can be passed anywhere a spotipy.Spotify is expected.
+    Calls made from several threads at once, such as the concurrent page fetches of an
+    export, run concurrently on the one pooled session.
+    """
+
+    def __init__(self, client):
+        """
+        Initializes a SyncFacade instance and starts its event loop.
+
+        Args:
+            client (AsyncSpotify): The async client to expose.
+        """
+        self.client = client
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='async-spotify', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine on the facade's event loop and waits for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+
+        def blocking(*args, **kwargs):
+            count(f'api.calls.{name}')
+            return self.run(attribute(*args, **kwargs))
+
+        return blocking
+
+    def close(self):
+        """
+        Closes the client's session and stops the event loop.
+        """
+        if self._loop.is_closed():
+            return
+        self.run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,285 @@
+import os
+import glob
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+import pandas as pd
+from date_rollup import DateRollup, read_rollup
+from instrumentation import count, stage
+from playlist_analysis import SHAPES, playlist_name, playlist_names, rearrange_to_shape, render_playlist_charts
+from playlist_stats import PlaylistStats, read_stats
+from playlist_storage import FORMATS, load_playlist, read_artist_index, save_playlist, save_table
+
+# The comparative report written by default, one row per playlist file
+DEFAULT_REPORT_PATH = 'batch_report.csv'
+
+# The columns of the comparative report
+REPORT_COLUMNS = [
+    'Playlist', 'Path', 'Tracks', 'Composite Mean', 'Composite Median', 'Composite Std', 'Lowest', 'Highest',
+    'Unique Artists', 'Earliest Added', 'Latest Added', 'Tracks per Month', 'Shape Fit', 'Charts', 'Seconds', 'Error'
+]
+
+# The most playlist files analysed by one task; smaller chunks even out playlists of very different sizes
+MAX_CHUNK_SIZE = 16
+
+# The number of chunks queued per worker, so a worker never waits for its next chunk
+CHUNKS_PER_WORKER = 2
+
+# The number of playlists listed at each end of the printed summary
+SUMMARY_ROWS = 10
+
+
+def is_playlist_file(path):
+    """
+    Checks whether a path is a playlist file rather than a sidecar, artist index or unfinished write.
+    """
+    stem, extension = os.path.splitext(path)
+    return extension.lower() in FORMATS and not stem.endswith(('.artists', '.artist_edges'))
+
+
+def find_playlist_files(inputs):
+    """
+    Lists the playlist files in directories, glob patterns or file paths.
+
+    Args:
+        inputs (list): Directories (searched recursively, e.g. a consolidated store), glob
+            patterns such as 'playlists/*/tracks.parquet', or paths of playlist files.
+    Returns:
+        list: The paths of the playlist files, sorted and without duplicates.
+    """
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for directory, _, filenames in os.walk(pattern):
+                paths.update(os.path.join(directory, filename) for filename in filenames)
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+    return sorted(path for path in paths if os.path.isfile(path) and is_playlist_file(path))
+
+
+def default_chunk_size(file_count, workers):
+    """
+    Splits the files into about four chunks per worker, so workers finishing early pick up more work.
+    """
+    return max(1, min(MAX_CHUNK_SIZE, -(-file_count // (workers * 4))))
+
+
+def limit_memory(memory_limit_mb):
+    """
+    Caps the address space of a worker process, so a playlist too large for it fails with a MemoryError.
+
+    Only applied where the resource module exists (not on Windows).
+
+    Args:
+        memory_limit_mb (int): The limit in megabytes, or None for no limit.
+    """
+    if memory_limit_mb is None:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = int(memory_limit_mb) * 2 ** 20
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def shape_fit(composite, equation_number):
+    """
+    Measures how closely rearranged composite values follow a shape's curve.
+
+    Args:
+        composite (pd.Series): The composite values in their rearranged order.
+        equation_number (int): The shape the values were rearranged into (a key of SHAPES).
+    Returns:
+        float: The correlation of the values with the curve, 1.0 for a perfect fit; NaN if either is flat.
+    """
+    values = composite.to_numpy(dtype=float)
+    target = SHAPES[equation_number][1](np.arange(1, len(values) + 1) / len(values))
+    known = ~np.isnan(values)
+    if known.sum() < 2 or np.std(values[known]) == 0 or np.std(target[known]) == 0:
+        return float('nan')
+    return float(np.corrcoef(values[known], target[known])[0, 1])
+
+
+def analyse_playlist_file(path, equation_number=None, charts_dir=None, reshaped_dir=None, file_format='png', name=None):
+    """
+    Analyses one playlist file: its statistics, and optionally its rearrangement and charts.
+
+    The statistics and date added rollup come from the file's sidecars when they are up to
+    date, and are computed from the loaded tracks otherwise. The tracks are only loaded when
+    the sidecars are out of date or the playlist is rearranged or charted, and then only the
+    columns needed. Errors are recorded in the row instead of raised, so one bad file does not
+    stop the batch.
+
+    Args:
+        path (str): The path of the playlist file.
+        equation_number (int): The shape to rearrange the playlist into, or None not to rearrange it.
+        charts_dir (str): The directory to render the charts to, or None not to render them.
+        reshaped_dir (str): The directory to save the rearranged playlist to, or None not to save it.
+        file_format (str): The image format of the charts, e.g. 'png' or 'svg'.
+        name (str): The name of the playlist in the report and of its output files, playlist_name(path) if None.
+    Returns:
+        dict: The playlist's row of the comparative report.
+    """
+    start = time.perf_counter()
+    row = {'Playlist': name or playlist_name(path), 'Path': path}
+    try:
+        stats, rollup = read_stats(path), read_rollup(path)
+        if stats is None or rollup is None or (equation_number is not None and reshaped_dir is not None):
+            df = load_playlist(path)
+        elif equation_number is not None or charts_dir is not None:
+            # The shape fit and the charts only need each track's ID and composite value
+            df = load_playlist(path, columns=['ID', 'Composite Value'])
+        else:
+            df = None
+
+        if stats is None or rollup is None:
+            artists = read_artist_index(path)
+            if stats is None:
+                stats = PlaylistStats.from_dataframe(df, artists)
+            if rollup is None:
+                rollup = DateRollup.from_dataframe(df, artists)
+
+        monthly = rollup.counts('month')
+        row.update({
+            'Tracks': stats.rows,
+            'Composite Mean': stats.composite_mean if stats.composite_count else float('nan'),
+            'Composite Median': stats.composite_quantile(0.5),
+            'Composite Std': stats.composite_std,
+            'Lowest': stats.lowest['Composite Value'] if stats.lowest else float('nan'),
+            'Highest': stats.highest['Composite Value'] if stats.highest else float('nan'),
+            'Unique Artists': stats.unique_artists(),
+            'Earliest Added': stats.earliest_date,
+            'Latest Added': stats.latest_date,
+            'Tracks per Month': float(monthly.mean()) if len(monthly) else float('nan')
+        })
+
+        if equation_number is not None:
+            reshaped = rearrange_to_shape(df, equation_number)
+            row['Shape Fit'] = shape_fit(reshaped['Composite Value'], equation_number)
+            if reshaped_dir is not None:
+                os.makedirs(reshaped_dir, exist_ok=True)
+                save_playlist(reshaped, os.path.join(reshaped_dir, row['Playlist'] + os.path.splitext(path)[1]))
+
+        if charts_dir is not None:
+            row['Charts'] = len(render_playlist_charts(path, charts_dir, file_format, df, row['Playlist']))
+    except Exception as e:
+        # MemoryError included, when a playlist is too large for the worker's memory limit
+        row['Error'] = f"{type(e).__name__}: {e}"
+
+    row['Seconds'] = round(time.perf_counter() - start, 4)
+    return row
+
+
+def analyse_chunk(paths, names, options):
+    """
+    Analyses a chunk of playlist files one after another in a worker process.
+
+    Args:
+        paths (list): The paths of the playlist files.
+        names (list): The name of each playlist file, unique within the batch.
+        options (dict): The other keyword arguments of analyse_playlist_file.
+    Returns:
+        list: The report row of each file, in order.
+    """
+    return [analyse_playlist_file(path, name=name, **options) for path, name in zip(paths, names)]
+
+
+def analyse_many(paths, equation_number=None, charts_dir=None, reshaped_dir=None, file_format='png',
+                 workers=None, chunk_size=None, memory_limit_mb=None):
+    """
+    Analyses many playlist files in a pool of processes and gathers one comparative report.
+
+    Files are split into chunks that each worker analyses one file at a time, so a worker only
+    holds one playlist in memory and memory use stays within about workers times the largest
+    playlist. Only a few chunks per worker are queued at once, and results are gathered as
+    chunks finish, so thousands of files never pile up as pending work.
+
+    Args:
+        paths (list): The paths of the playlist files.
+        equation_number (int): The shape to rearrange each playlist into, or None not to rearrange them.
+        charts_dir (str): The directory to render the charts to, or None not to render them.
+        reshaped_dir (str): The directory to save the rearranged playlists to, or None not to save them.
+        file_format (str): The image format of the charts, e.g. 'png' or 'svg'.
+        workers (int): The number of processes, the number of CPUs if None.
+        chunk_size (int): The number of files per task, chosen from the number of files and workers if None.
+        memory_limit_mb (int): The address space limit of each worker in megabytes, or None for no limit.
+    Returns:
+        pd.DataFrame: One row per playlist file with the REPORT_COLUMNS, in the order of paths.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or default_chunk_size(len(paths), workers)
+    chunks = [paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size)]
+    # Playlists in different directories may share a file name, so each is given a unique name
+    names = playlist_names(paths)
+    name_chunks = [names[start:start + chunk_size] for start in range(0, len(names), chunk_size)]
+    options = {'equation_number': equation_number, 'charts_dir': charts_dir, 'reshaped_dir': reshaped_dir,
+               'file_format': file_format}
+
+    results = [None] * len(chunks)
+    with stage('batch.analyse'):
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_memory, initargs=(memory_limit_mb,)) as executor:
+            pending = {}
+            next_chunk = 0
+            while next_chunk < len(chunks) or pending:
+                # Top up the queue, then wait for any chunk to finish
+                while next_chunk < len(chunks) and len(pending) < workers * CHUNKS_PER_WORKER:
+                    pending[executor.submit(analyse_chunk, chunks[next_chunk], name_chunks[next_chunk], options)] = next_chunk
+                    next_chunk += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+
+    rows = [row for chunk_rows in results for row in chunk_rows]
+    count('playlists.analysed', len(rows))
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def print_summary(report, top_n=SUMMARY_ROWS):
+    """
+    Prints how many playlist files were analysed and those with the highest and lowest composite mean.
+
+    Args:
+        report (pd.DataFrame): The comparative report.
+        top_n (int): The number of playlists listed at each end.
+    """
+    failed = report[report['Error'].notna()]
+    analysed = report[report['Error'].isna()]
+    print(f"Analysed {len(analysed)} playlist files ({int(analysed['Tracks'].sum())} tracks), {len(failed)} failed")
+
+    columns = ['Playlist', 'Tracks', 'Composite Mean', 'Composite Std', 'Unique Artists', 'Tracks per Month']
+    if analysed['Shape Fit'].notna().any():
+        columns.append('Shape Fit')
+    ranked = analysed.sort_values('Composite Mean', ascending=False)[columns]
+    if len(ranked) <= 2 * top_n:
+        print(ranked.to_string(index=False))
+    else:
+        print(f"\nHighest Composite Mean:\n{ranked.head(top_n).to_string(index=False)}")
+        print(f"\nLowest Composite Mean:\n{ranked.tail(top_n).to_string(index=False)}")
+
+    for _, row in failed.head(top_n).iterrows():
+        print(f"Failed: {row['Path']}: {row['Error']}")
+
+
+def batch_analyse(inputs, report_path=DEFAULT_REPORT_PATH, **options):
+    """
+    Analyses every playlist file in directories or glob patterns and writes the comparative report.
+
+    Args:
+        inputs (list): Directories, glob patterns or paths of playlist files.
+        report_path (str): The file to write the report to; its extension picks the format.
+        **options: The keyword arguments of analyse_many.
+    Returns:
+        pd.DataFrame: The comparative report.
+    Raises:
+        FileNotFoundError: If no playlist files are found.
+    """
+    paths = find_playlist_files(inputs)
+    if not paths:
+        raise FileNotFoundError(f"No playlist files found in {', '.join(inputs)}")
+
+    report = analyse_many(paths, **options)
+    save_table(report, report_path)
+    print_summary(report)
+    print(f"Report of {len(report)} playlist files written to '{report_path}'")
+    return report
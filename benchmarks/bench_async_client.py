@@ -0,0 +1,99 @@
+"""
+Benchmarks playlist export and publish throughput of the spotipy client and the asyncio client.
+
+Run from the repository root with `python benchmarks/bench_async_client.py`. Both clients talk
+to a FakeSpotifyServer on localhost that delays every response by --latency seconds, so the
+numbers reflect how well each client overlaps requests rather than the speed of the real API.
+The asyncio client needs aiohttp; without it only the spotipy client is timed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import spotipy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_spotify import AsyncSpotify, SyncFacade, async_available
+from mock_spotify import FakeSpotifyServer, MockSpotify, make_track_item
+from playlist_csv_manager import get_playlist_tracks
+from playlist_maker import publish_playlist
+from request_scheduler import SPOTIPY_RETRY_OPTIONS, RequestScheduler, ScheduledSpotify
+
+# The token sent to the fake server, which only checks that one is present
+FAKE_TOKEN = 'benchmark-token'
+
+
+def build_mock(playlists, tracks):
+    """
+    Builds a MockSpotify with the given number of playlists of the given length.
+    """
+    playlist_data = {}
+    features = {}
+    for playlist in range(playlists):
+        items = []
+        for track in range(tracks):
+            track_id = f'{playlist}x{track}'
+            items.append(make_track_item(track_id, f'Track {track}', [f'Artist {track % 50}'], '2024-01-01T00:00:00Z'))
+            features[track_id] = {'energy': 0.5, 'danceability': 0.5, 'tempo': 120, 'loudness': -6, 'valence': 0.5}
+        playlist_data[f'playlist{playlist}'] = {'name': f'Playlist {playlist}', 'items': items}
+    return MockSpotify(playlist_data, features)
+
+
+def make_spotipy_client(url):
+    sp = spotipy.Spotify(auth=FAKE_TOKEN, **SPOTIPY_RETRY_OPTIONS)
+    sp.prefix = url
+    # No rate limit, so only the client itself is measured
+    return ScheduledSpotify(sp, RequestScheduler(rate=1e9, burst=10 ** 9))
+
+
+def make_async_client(url, connections):
+    return SyncFacade(AsyncSpotify(auth=FAKE_TOKEN, prefix=url, max_connections=connections))
+
+
+def run(name, sp, mock, playlist_ids, concurrency):
+    """
+    Exports the playlists, then publishes the first one as a new playlist, printing the throughput.
+    """
+    mock.reset_counts()
+    start = time.perf_counter()
+    exported = sum(len(get_playlist_tracks(sp, playlist_id, concurrency=concurrency)) for playlist_id in playlist_ids)
+    export_time = time.perf_counter() - start
+    export_requests = mock.total_requests
+
+    track_ids = [item['track']['id'] for item in mock.playlists[playlist_ids[0]]['items']]
+    mock.reset_counts()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        publish_playlist(sp, f'{name} benchmark', track_ids, os.path.join(checkpoint_dir, 'checkpoint.json'))
+    publish_time = time.perf_counter() - start
+
+    print(f"{name:<8} export {exported / export_time:9.0f} tracks/s {export_requests / export_time:7.0f} requests/s"
+          f"   publish {len(track_ids) / publish_time:9.0f} tracks/s {mock.total_requests / publish_time:7.0f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--playlists', type=int, default=5, help='playlists to export')
+    parser.add_argument('--tracks', type=int, default=1000, help='tracks per playlist')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    parser.add_argument('--concurrency', type=int, default=8, help='pages fetched at the same time')
+    args = parser.parse_args()
+
+    mock = build_mock(args.playlists, args.tracks)
+    # Published playlists are added to the mock, so only the generated ones are exported
+    playlist_ids = list(mock.playlists)
+    with FakeSpotifyServer(mock, latency=args.latency) as server:
+        run('spotipy', make_spotipy_client(server.url), mock, playlist_ids, args.concurrency)
+
+        if not async_available():
+            print("asyncio  skipped, aiohttp is not installed")
+            return
+        with make_async_client(server.url, args.concurrency) as sp:
+            run('asyncio', sp, mock, playlist_ids, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
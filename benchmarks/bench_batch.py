@@ -0,0 +1,66 @@
+"""
+Compares analysing many synthetic playlist files in one process and in a pool of processes.
+
+Run from the repository root with `python benchmarks/bench_batch.py`. Playlist files of
+synthetic libraries are written to a temporary directory, then batch_analysis.analyse_many
+computes their statistics and rearranges each one, first with one worker and then with each
+larger worker count. Pass --charts to render every file's charts as well.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_analysis import analyse_many
+from playlist_storage import STORE_EXTENSION, save_playlist
+from synthetic_playlists import SyntheticLibrary
+
+# The number of playlist files analysed by default
+DEFAULT_FILE_COUNT = 200
+
+# The number of tracks of each playlist file by default
+DEFAULT_TRACKS = 2000
+
+# The shape each playlist is rearranged into
+RESHAPE_SHAPE = 3
+
+
+def write_playlists(directory, file_count, tracks):
+    """
+    Writes synthetic playlist files, each from a library with its own seed, and returns their paths.
+    """
+    paths = []
+    for number in range(file_count):
+        path = os.path.join(directory, f'synthetic{number}{STORE_EXTENSION}')
+        save_playlist(SyntheticLibrary(tracks, seed=number).dataframe(), path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=DEFAULT_FILE_COUNT, help='number of playlist files')
+    parser.add_argument('--tracks', type=int, default=DEFAULT_TRACKS, help='tracks per playlist file')
+    parser.add_argument('--workers', type=lambda value: [int(workers) for workers in value.split(',')],
+                        default=[1, os.cpu_count() or 1], help='comma separated worker counts (default 1,<CPUs>)')
+    parser.add_argument('--charts', action='store_true', help='render the charts of every file too')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_playlists(directory, args.files, args.tracks)
+        charts_dir = os.path.join(directory, 'charts') if args.charts else None
+
+        print(f"{'workers':>8} {'seconds':>9} {'files/s':>9} {'failed':>7}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            report = analyse_many(paths, RESHAPE_SHAPE, charts_dir, workers=workers)
+            elapsed = time.perf_counter() - start
+            failed = int(report['Error'].notna().sum())
+            print(f"{workers:>8} {elapsed:9.2f} {len(paths) / elapsed:9.1f} {failed:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Guards the cold-start import time of the entry point and its export and publish paths.
+
+Run from the repository root with `python benchmarks/bench_import_time.py`. Each path is
+imported in a fresh interpreter several times and the fastest run is compared with its
+budget. The script exits with status 1 if a budget is exceeded or if a path imports a
+module it should never need (matplotlib outside of analysis).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules each run path imports, the modules it must not import and its budget in milliseconds
+PATHS = {
+    'startup': (['SpotifyAPI'], ['pandas', 'numpy', 'matplotlib'], 400),
+    'export': (['SpotifyAPI', 'playlist_csv_manager', 'bulk_export'], ['matplotlib'], 1200),
+    'publish': (['SpotifyAPI', 'playlist_maker'], ['matplotlib'], 1200),
+    'analyse': (['SpotifyAPI', 'playlist_analysis'], ['matplotlib'], 1200)
+}
+
+# Prints the import time in seconds and the forbidden modules that were imported
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(module for module in {forbidden!r} if module in sys.modules))
+"""
+
+
+def measure(modules, forbidden):
+    """
+    Imports modules in a fresh interpreter.
+
+    Returns:
+        tuple: The import time in milliseconds and the forbidden modules that were imported.
+    """
+    code = PROBE.format(imports='\n'.join(f'import {module}' for module in modules), forbidden=forbidden)
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    return float(output[0]) * 1000, [module for module in output[1].split(',') if module]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per path')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='multiply every budget, e.g. for slow machines')
+    args = parser.parse_args()
+
+    failed = False
+    for name, (modules, forbidden, budget) in PATHS.items():
+        runs = [measure(modules, forbidden) for _ in range(args.repeat)]
+        fastest = min(elapsed for elapsed, _ in runs)
+        leaked = sorted(set(module for _, imported in runs for module in imported))
+        limit = budget * args.budget_scale
+
+        status = 'ok'
+        if fastest > limit:
+            status = 'OVER BUDGET'
+        if leaked:
+            status = f"imports {', '.join(leaked)}"
+        failed = failed or status != 'ok'
+
+        print(f"{name:<8} {fastest:8.1f} ms  (budget {limit:.0f} ms)  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
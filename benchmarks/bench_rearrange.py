@@ -0,0 +1,89 @@
+"""
+Benchmarks rearrange_to_shape at 1k, 100k and 1M tracks.
+
+Run from the repository root with `python benchmarks/bench_rearrange.py`. Each size is timed
+for every shape, and for sizes up to --compare-limit the result is checked against the
+original list-and-sorted() implementation, which is also timed for comparison.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist_analysis import SHAPES, rearrange_to_shape
+
+
+def legacy_rearrange_to_shape(df, equation_number):
+    """
+    The original implementation of rearrange_to_shape for shapes 1 - 6, kept as a reference.
+    """
+    def equation_y(x, equation_number, t):
+        x_over_t = x / t
+        if equation_number == 1:
+            return x_over_t
+        elif equation_number == 2:
+            return (-x_over_t) + 1
+        elif equation_number == 3:
+            return 4 * pow(x_over_t, 2) - 4 * x_over_t + 1
+        elif equation_number == 4:
+            return -4 * pow(x_over_t, 2) + 4 * x_over_t
+        elif equation_number == 5:
+            return 9 * pow(x_over_t, 3) - (27/2) * pow(x_over_t, 2) + (11/2) * x_over_t
+        else:
+            return -9 * pow(x_over_t, 3) + (27/2) * pow(x_over_t, 2) - (11/2) * x_over_t + 1
+
+    a = [equation_y(x + 1, equation_number, len(df)) for x in df['Composite Value'].index]
+    b = df['Composite Value'].values
+    a_original_position = [index for _, index in sorted((value, index) for index, value in enumerate(a))]
+    b_original_position = [index for _, index in sorted((value, index) for index, value in enumerate(b))]
+    targeted_positions = [target for _, target in sorted(zip(a_original_position, b_original_position))]
+    return df.iloc[targeted_positions]
+
+
+def make_playlist(track_count, seed=0):
+    """
+    Builds a playlist DataFrame with composite values rounded to 3 significant figures, so ties occur.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ID': np.arange(track_count),
+        'Composite Value': np.round(rng.beta(2, 5, track_count), 3)
+    })
+
+
+def time_call(func, *args):
+    """
+    Returns the result of a call and the time it took in seconds.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--compare-limit', type=int, default=100000,
+                        help='largest size checked against the original implementation')
+    args = parser.parse_args()
+
+    for track_count in args.sizes:
+        df = make_playlist(track_count)
+        for equation_number, (description, _) in SHAPES.items():
+            result, elapsed = time_call(rearrange_to_shape, df, equation_number)
+            line = f"{track_count:>9} tracks  {description:<22} {elapsed * 1000:9.1f} ms"
+
+            if equation_number <= 6 and track_count <= args.compare_limit:
+                expected, legacy_elapsed = time_call(legacy_rearrange_to_shape, df, equation_number)
+                same = np.array_equal(result['ID'].to_numpy(), expected['ID'].to_numpy())
+                line += f"  legacy {legacy_elapsed * 1000:9.1f} ms  {'identical' if same else 'DIFFERENT'}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
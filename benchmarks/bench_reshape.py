@@ -0,0 +1,57 @@
+"""
+Benchmarks the multi-feature reshaping engine on synthetic playlists.
+
+Run from the repository root with `python benchmarks/bench_reshape.py`. Each size is reshaped
+to an energy arc, a tempo ramp and a valence curve with smooth tempo and key transitions, and
+the cost of the starting order and of the final order are printed with the time taken, so the
+methods and time budgets can be compared. The 'hungarian' method needs scipy and only runs on
+sizes up to HUNGARIAN_LIMIT.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reshape_engine import DEFAULT_TIME_BUDGET, HUNGARIAN_LIMIT, reshape_features, reshape_playlist, scipy_available
+from synthetic_playlists import SyntheticFeatures, SyntheticLibrary
+
+# The playlist sizes benchmarked by default
+DEFAULT_SIZES = [1000, 10000, 50000]
+
+# Build and cool down energy, a rising tempo and valence peaking in the middle
+TARGETS = {'energy': 9, 'tempo': 1, 'valence': 4}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=DEFAULT_SIZES,
+                        help='comma separated playlist sizes (default 1000,10000,50000)')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, help='seconds per reshape')
+    parser.add_argument('--tempo-smoothness', type=float, default=0.5, help='cost of an 80 bpm jump')
+    parser.add_argument('--key-smoothness', type=float, default=0.2, help='cost of the worst key clash')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic libraries')
+    args = parser.parse_args()
+
+    print(f"{'tracks':>9} {'method':<10} {'features s':>10} {'initial cost':>13} {'cost':>10} {'swaps':>8} {'seconds':>8}")
+    for size in args.sizes:
+        library = SyntheticLibrary(size, seed=args.seed, missing_features_rate=0.01)
+        df = library.dataframe()
+        features = SyntheticFeatures(library)
+
+        start = time.perf_counter()
+        table = reshape_features(df, {track_id: features[track_id] for track_id in df['ID']})
+        features_time = time.perf_counter() - start
+
+        # The exact solver's cost matrix grows with the square of the size
+        methods = ['greedy', 'hungarian'] if scipy_available() and size <= HUNGARIAN_LIMIT else ['greedy']
+        for method in methods:
+            _, summary = reshape_playlist(df, table, TARGETS, None, args.tempo_smoothness, args.key_smoothness,
+                                          method, args.time_budget, args.seed)
+            print(f"{size:>9} {summary['method']:<10} {features_time:10.2f} {summary['initial_cost']:13.1f} "
+                  f"{summary['cost']:10.1f} {summary['swaps']:8} {summary['seconds']:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmarks building and querying the similarity index over a feature cache of synthetic tracks.
+
+Run from the repository root with `python benchmarks/bench_similarity.py`. For each size a
+feature cache is filled with synthetic audio features, then the index is built from it and
+nearest-neighbour queries for one track and for a whole seed playlist are timed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_cache import FeatureCache
+from similarity_index import DEFAULT_SIMILAR_SIZE, build_similarity_index
+from synthetic_playlists import SyntheticFeatures, SyntheticLibrary
+
+# The numbers of cached tracks benchmarked by default
+DEFAULT_SIZES = [100000, 1000000]
+
+# The number of tracks written to the cache at a time while filling it
+FILL_CHUNK_SIZE = 100000
+
+
+def fill_cache(cache, library):
+    features = SyntheticFeatures(library)
+    for start in range(0, library.track_count, FILL_CHUNK_SIZE):
+        stop = min(start + FILL_CHUNK_SIZE, library.track_count)
+        cache.put_many({library.track_id(index): features[library.track_id(index)] for index in range(start, stop)})
+
+
+def timed(func, repeat=1):
+    """
+    Returns the result of the last of repeat calls of a function and the average seconds per call.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=DEFAULT_SIZES,
+                        help='comma separated numbers of cached tracks (default 100000,1000000)')
+    parser.add_argument('--seeds', type=int, default=200, help='tracks in the seed playlist')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIMILAR_SIZE, help='tracks chosen per query')
+    parser.add_argument('--repeat', type=int, default=5, help='times each query is run')
+    args = parser.parse_args()
+
+    print(f"{'tracks':>9} {'build s':>8} {'MB':>6} {'1 track ms':>11} {'playlist ms':>12}")
+    for size in args.sizes:
+        library = SyntheticLibrary(size)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FeatureCache(os.path.join(directory, 'cache'), max_entries=size)
+            fill_cache(cache, library)
+
+            index_path = os.path.join(directory, 'index')
+            index, build_time = timed(lambda: build_similarity_index(cache, index_path))
+            megabytes = sum(os.path.getsize(os.path.join(index_path, name)) for name in os.listdir(index_path)) / 2 ** 20
+
+            rng = np.random.default_rng(0)
+            seed_ids = [library.track_id(int(number)) for number in rng.choice(size, args.seeds, replace=False)]
+            _, single_time = timed(lambda: index.similar_tracks(seed_ids[:1], args.size), args.repeat)
+            _, playlist_time = timed(lambda: index.similar_tracks(seed_ids, args.size), args.repeat)
+
+            print(f"{size:>9} {build_time:8.2f} {megabytes:6.1f} {single_time * 1000:11.1f} {playlist_time * 1000:12.1f}")
+            cache.close()
+            # Drop the memory-mapped index before its directory is removed
+            index = None
+
+
+if __name__ == '__main__':
+    main()
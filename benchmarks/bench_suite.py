@@ -0,0 +1,145 @@
+"""
+Times export, load, stats, reshape and publish end to end on synthetic playlists.
+
+Run from the repository root with `python benchmarks/bench_suite.py`. For each size a synthetic
+library is generated and served by an in-process SyntheticSpotify, then each stage runs
+against a temporary playlist file. Every stage reports its time, throughput, API requests
+and peak traced memory. Pass --json to save the results, so runs before and after a change
+to playlist_csv_manager, playlist_analysis or playlist_maker can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist_analysis import rearrange_to_shape
+from playlist_csv_manager import DEFAULT_PAGE_CONCURRENCY, create_csv_at
+from playlist_maker import publish_playlist
+from playlist_stats import PlaylistStats
+from playlist_storage import DEFAULT_PLAYLIST_PATH, load_playlist, load_playlist_rollup, load_playlist_stats
+from synthetic_playlists import SyntheticLibrary, SyntheticSpotify
+
+# The playlist sizes benchmarked by default
+DEFAULT_SIZES = [100, 10000, 1000000]
+
+# The stages in the order they run; each one uses the file the export wrote
+STAGES = ['export', 'load', 'stats', 'stats_sidecar', 'rollup_sidecar', 'reshape', 'publish']
+
+# The shape used by the reshape stage
+RESHAPE_SHAPE = 3
+
+
+def measure(func, trace_memory):
+    """
+    Runs a function with its output silenced.
+
+    Returns:
+        tuple: The function's result, the seconds it took and its peak traced memory in MB (None if not traced).
+    """
+    if trace_memory:
+        tracemalloc.reset_peak()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None
+    return result, elapsed, peak
+
+
+def run_size(size, extension, concurrency, trace_memory, seed):
+    """
+    Runs every stage on a synthetic playlist of the given size.
+
+    Returns:
+        list: One result dictionary per stage.
+    """
+    library = SyntheticLibrary(size, seed=seed)
+    sp = SyntheticSpotify(library)
+    results = []
+    state = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'playlist{extension}')
+        checkpoint_path = os.path.join(directory, 'checkpoint.json')
+
+        stages = {
+            'export': lambda: create_csv_at(sp, 'synthetic0', path, concurrency=concurrency),
+            'load': lambda: state.update(df=load_playlist(path)),
+            'stats': lambda: PlaylistStats.from_dataframe(state['df']),
+            'stats_sidecar': lambda: load_playlist_stats(path),
+            'rollup_sidecar': lambda: load_playlist_rollup(path).cumulative('week'),
+            'reshape': lambda: rearrange_to_shape(state['df'], RESHAPE_SHAPE),
+            'publish': lambda: publish_playlist(sp, 'Benchmark', state['df']['ID'].tolist(), checkpoint_path)
+        }
+
+        for stage in STAGES:
+            sp.reset_counts()
+            _, elapsed, peak = measure(stages[stage], trace_memory)
+            results.append({
+                'size': size,
+                'stage': stage,
+                'seconds': round(elapsed, 6),
+                'tracks_per_second': round(size / elapsed, 1) if elapsed else None,
+                'api_requests': sp.total_requests,
+                'peak_memory_mb': round(peak, 2) if peak is not None else None
+            })
+            print_result(results[-1])
+
+        results.append({'size': size, 'stage': 'file', 'bytes': os.path.getsize(path)})
+
+    return results
+
+
+def print_result(result):
+    memory = f"{result['peak_memory_mb']:10.1f}" if result['peak_memory_mb'] is not None else f"{'-':>10}"
+    print(f"{result['size']:>9} {result['stage']:<14} {result['seconds']:10.4f} "
+          f"{result['tracks_per_second'] or 0:14.0f} {result['api_requests']:9} {memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=DEFAULT_SIZES,
+                        help='comma separated playlist sizes (default 100,10000,1000000)')
+    parser.add_argument('--format', default=os.path.splitext(DEFAULT_PLAYLIST_PATH)[1].lstrip('.'),
+                        choices=['csv', 'parquet', 'feather'], help='playlist file format')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_PAGE_CONCURRENCY, help='pages fetched at the same time')
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc, which slows allocation-heavy stages')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic libraries')
+    parser.add_argument('--json', help='file to save the results to')
+    args = parser.parse_args()
+
+    trace_memory = not args.no_memory
+    if trace_memory:
+        tracemalloc.start()
+
+    print(f"{'tracks':>9} {'stage':<14} {'seconds':>10} {'tracks/s':>14} {'requests':>9} {'peak MB':>10}")
+    results = []
+    for size in args.sizes:
+        results.extend(run_size(size, f'.{args.format}', args.concurrency, trace_memory, args.seed))
+
+    if args.json:
+        report = {
+            'format': args.format,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'results': results
+        }
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to '{args.json}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares per-track memory and load time of TrackTable with one dictionary per track.
+
+Run from the repository root with `python benchmarks/bench_track_table.py`. Playlist items of a
+synthetic library are turned into track details both ways, measuring the memory each holds with
+tracemalloc and the time to build it and convert it to a typed DataFrame.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist_storage import PLAYLIST_COLUMNS, normalise_types
+from synthetic_playlists import SyntheticLibrary
+from track_table import TrackTable
+
+# The playlist sizes benchmarked by default
+DEFAULT_SIZES = [10000, 100000]
+
+
+def dict_rows(items):
+    """
+    Builds one dictionary of boxed values per track, as exports did before TrackTable.
+    """
+    return [
+        {
+            'Name': item['track']['name'],
+            'Artist': ', '.join(artist['name'] for artist in item['track']['artists']),
+            'ID': item['track']['id'],
+            'DateAdded': item['added_at'],
+            'Composite Value': 0.5
+        }
+        for item in items
+    ]
+
+
+def measure(build, items):
+    """
+    Returns the bytes held by what build returns, the seconds to build it, and the seconds to make it a DataFrame.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    tracks = build(items)
+    build_time = time.perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    if isinstance(tracks, TrackTable):
+        tracks.to_dataframe()
+    else:
+        normalise_types(pd.DataFrame(tracks, columns=PLAYLIST_COLUMNS))
+    return held, build_time, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=DEFAULT_SIZES,
+                        help='comma separated playlist sizes (default 10000,100000)')
+    args = parser.parse_args()
+
+    print(f"{'tracks':>9} {'container':<11} {'bytes/track':>12} {'build s':>8} {'DataFrame s':>12}")
+    for size in args.sizes:
+        library = SyntheticLibrary(size)
+        items = [library.item(index) for index in range(size)]
+        for name, build in [('dicts', dict_rows), ('TrackTable', TrackTable.from_items)]:
+            held, build_time, convert_time = measure(build, items)
+            print(f"{size:>9} {name:<11} {held / size:12.1f} {build_time:8.3f} {convert_time:12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from artist_index import ArtistIndex
+from playlist_csv_manager import get_composite_values, get_user_playlists, iter_playlist_pages
+from playlist_storage import DEFAULT_STORE_PATH, save_partition
+from track_table import TrackTable
+
+# The number of unique tracks whose composite values are resolved by one worker at a time
+FEATURE_CHUNK_SIZE = 1000
+
+
+def get_playlist_listing(sp, playlist_id):
+    """
+    Retrieves the track details of a playlist without resolving any audio features.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist.
+    Returns:
+        TrackTable: The track details (Name, Artist, ID, DateAdded) of every track in the playlist.
+    """
+    return TrackTable.concat(list(iter_playlist_pages(sp, playlist_id, with_composite=False)))
+
+
+def bulk_export(sp, playlist_ids=None, root=DEFAULT_STORE_PATH, cache=None, concurrency=4):
+    """
+    Exports many playlists into the consolidated store without any prompts.
+
+    Playlists are listed in parallel, then the audio features of every unique track across all
+    of them are fetched once, so a track shared by many playlists costs a single lookup. Each
+    playlist is written to its own partition of the store, keyed by playlist ID.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_ids (list): The IDs of the playlists to export, or None for every playlist the user owns.
+        root (str): The directory of the consolidated store.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        concurrency (int): The maximum number of playlists or feature chunks fetched at the same time.
+    Returns:
+        dict: The number of tracks exported for each playlist ID.
+    """
+    if playlist_ids is None:
+        playlist_ids = [playlist['id'] for playlist in get_user_playlists(sp, owned_only=True)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Stage 1: list the tracks of every playlist in parallel
+        listings = list(executor.map(lambda playlist_id: get_playlist_listing(sp, playlist_id), playlist_ids))
+
+        # Stage 2: resolve the composite value of each unique track once, in parallel chunks
+        unique_ids = list(dict.fromkeys(
+            track_id for tracks in listings for track_id in tracks.track_ids() if track_id
+        ))
+        chunks = [unique_ids[start:start + FEATURE_CHUNK_SIZE] for start in range(0, len(unique_ids), FEATURE_CHUNK_SIZE)]
+        composites = {}
+        for chunk, values in zip(chunks, executor.map(lambda chunk: get_composite_values(sp, chunk, cache), chunks)):
+            composites.update(zip(chunk, values))
+
+    # Stage 3: write each playlist to its partition of the store
+    exported = {}
+    for playlist_id, tracks in zip(playlist_ids, listings):
+        tracks.set_composites([composites.get(track_id) for track_id in tracks.track_ids()])
+        artists = ArtistIndex()
+        artists.add_table(tracks)
+        save_partition(tracks.to_dataframe(), playlist_id, root, artists)
+        exported[playlist_id] = len(tracks)
+
+    print(f"Exported {len(exported)} playlists ({len(unique_ids)} unique tracks) to '{root}'")
+    return exported
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# The audio features combined into the composite 'uplifting' value, in the order they are multiplied
+COMPOSITE_FEATURES = ['energy', 'danceability', 'tempo', 'loudness', 'valence']
+
+# The value used for a feature missing from a track's features, matching track_features.get(feature, 1)
+DEFAULT_FEATURE_VALUE = 1
+
+# The number of significant figures the composite value is rounded to
+SIGNIFICANT_FIGURES = 3
+
+
+def normalise_features(features):
+    """
+    Scales the composite audio features of many tracks to the range 0.0 - 1.0.
+
+    Tempo is clamped to 60 - 140 bpm and loudness is mapped from -60db - 0db; energy,
+    danceability and valence are already in range. A feature missing from a track's features
+    counts as DEFAULT_FEATURE_VALUE, while tracks without any features are left as NaN.
+
+    Args:
+        features (pd.DataFrame): One row of raw audio features per track.
+    Returns:
+        pd.DataFrame: One column of normalised values per composite feature.
+    """
+    normalised = pd.DataFrame(index=features.index)
+
+    for feature in COMPOSITE_FEATURES:
+        if feature in features:
+            normalised[feature] = pd.to_numeric(features[feature], errors='coerce').astype(float)
+        else:
+            normalised[feature] = np.nan
+
+    # Fill the gaps of tracks that have features, as track_features.get(feature, 1) did per track
+    has_features = features.notna().any(axis=1).to_numpy()
+    normalised.loc[has_features] = normalised.loc[has_features].fillna(float(DEFAULT_FEATURE_VALUE))
+
+    normalised['tempo'] = (normalised['tempo'].clip(60, 140) - 60) / 80 # bpm
+    normalised['loudness'] = (normalised['loudness'] + 60) / 60 # least -60db - most 0db
+
+    return normalised
+
+
+def product_mean(values, weights):
+    """
+    Multiplies the features together, each raised to the power of its weight.
+    """
+    composite = None
+    for feature in values:
+        factor = values[feature].to_numpy()
+        if weights[feature] != 1:
+            factor = np.power(factor, weights[feature])
+        # Multiply in feature order so unweighted results match the original formula exactly
+        composite = factor if composite is None else composite * factor
+    return composite
+
+
+def geometric_mean(values, weights):
+    """
+    The weighted geometric mean of the features.
+    """
+    return np.power(product_mean(values, weights), 1 / sum(weights.values()))
+
+
+def harmonic_mean(values, weights):
+    """
+    The weighted harmonic mean of the features; any feature of 0 gives a composite of 0.
+    """
+    with np.errstate(divide='ignore'):
+        reciprocal = sum(weights[feature] / values[feature].to_numpy() for feature in values)
+    return sum(weights.values()) / reciprocal
+
+
+def arithmetic_mean(values, weights):
+    """
+    The weighted arithmetic mean of the features.
+    """
+    return sum(weights[feature] * values[feature].to_numpy() for feature in values) / sum(weights.values())
+
+
+# The ways the normalised features can be combined, selectable by name in composite_values
+MEANS = {
+    'product': product_mean,
+    'geometric': geometric_mean,
+    'harmonic': harmonic_mean,
+    'arithmetic': arithmetic_mean
+}
+
+
+def round_significant(values, digits=SIGNIFICANT_FIGURES):
+    """
+    Rounds every value to a number of significant figures.
+
+    Gives the same results as np.around(value, digits - int(np.floor(np.log10(abs(value)))) - 1)
+    applied to each value, but zeros stay 0 and missing values stay NaN instead of failing in log10.
+
+    Args:
+        values (np.ndarray): The values to round.
+        digits (int): The number of significant figures to keep.
+    Returns:
+        np.ndarray: The rounded values.
+    """
+    values = np.asarray(values, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+
+    # Zero (magnitude -inf) and NaN are left as they are
+    decimals = np.where(np.isfinite(magnitude), digits - 1 - magnitude, 0).astype(int)
+    scale = np.power(10.0, np.abs(decimals))
+
+    # Mirror np.around: scale up for positive decimals and down for negative ones, round, then undo
+    rounded = np.where(decimals >= 0, np.rint(values * scale) / scale, np.rint(values / scale) * scale)
+    return np.where(np.isfinite(magnitude), rounded, values)
+
+
+def composite_values(features, weights=None, mean='product', digits=SIGNIFICANT_FIGURES):
+    """
+    Calculates the composite 'uplifting' value of many tracks in one vectorized pass.
+
+    Args:
+        features (pd.DataFrame): One row of raw audio features per track; rows of NaN give NaN.
+        weights (dict): Optional weights for the composite features, 1 for any feature left out.
+        mean (str): The name of the function in MEANS used to combine the features.
+        digits (int): The number of significant figures to round the composite values to.
+    Returns:
+        np.ndarray: The composite value of each track.
+    """
+    weights = {feature: (weights or {}).get(feature, 1) for feature in COMPOSITE_FEATURES}
+    composite = MEANS[mean](normalise_features(features), weights)
+    return round_significant(composite, digits)
@@ -0,0 +1,352 @@
+import os
+import json
+import base64
+import numpy as np
+import pandas as pd
+from artist_index import split_artists
+from track_table import to_nanoseconds
+
+# The resolutions additions can be counted at, finest first
+LEVELS = ('day', 'week', 'month', 'year')
+
+# The number of periods averaged by rolling addition rates by default
+DEFAULT_ROLLING_WINDOW = 30
+
+# The number of nanoseconds in a day, to turn timestamps into day numbers
+NANOSECONDS_PER_DAY = 86400 * 10 ** 9
+
+
+def rollup_path(path):
+    """
+    Returns the path of the date added rollup sidecar of a playlist file.
+    """
+    return f"{path}.rollup.json"
+
+
+def epoch_days(dates):
+    """
+    Converts dates of any form pandas understands to whole days since 1970-01-01 in UTC.
+
+    Args:
+        dates (pd.Series): The dates, e.g. the DateAdded column of a playlist.
+    Returns:
+        tuple: The int64 day number of each date, and a mask that is True where the date is missing.
+    """
+    nanoseconds = to_nanoseconds(dates)
+    missing = nanoseconds == np.iinfo(np.int64).min
+    return nanoseconds // NANOSECONDS_PER_DAY, missing
+
+
+def period_keys(days, level):
+    """
+    Numbers the period of the given level that each day falls in, counting from the period of 1970-01-01.
+
+    Consecutive periods have consecutive numbers at every level, so a range of periods is a range of numbers.
+
+    Args:
+        days (np.ndarray): Day numbers since 1970-01-01.
+        level (str): One of LEVELS; weeks start on Monday.
+    Returns:
+        np.ndarray: The int64 period number of each day.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    if level == 'day':
+        return days
+    if level == 'week':
+        # 1970-01-01 was a Thursday, so shifting by 3 days makes each week start on Monday
+        return (days + 3) // 7
+    if level in ('month', 'year'):
+        unit = 'M' if level == 'month' else 'Y'
+        return days.astype('datetime64[D]').astype(f'datetime64[{unit}]').view(np.int64)
+    raise ValueError(f"Unknown level '{level}', expected one of {', '.join(LEVELS)}")
+
+
+def period_starts(keys, level):
+    """
+    Returns the first day of each numbered period, the inverse of period_keys.
+
+    Args:
+        keys (np.ndarray): Period numbers of the given level.
+        level (str): One of LEVELS.
+    Returns:
+        pd.DatetimeIndex: The UTC midnight each period starts at.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    if level == 'week':
+        days = keys * 7 - 3
+    elif level in ('month', 'year'):
+        unit = 'M' if level == 'month' else 'Y'
+        days = keys.view(f'datetime64[{unit}]').astype('datetime64[D]').view(np.int64)
+    else:
+        days = keys
+    return pd.DatetimeIndex(days.view('datetime64[D]').astype('datetime64[ns]'), tz='UTC')
+
+
+def _sum_by(keys, counts):
+    """
+    Adds up the counts of equal keys.
+
+    Returns:
+        tuple: The sorted distinct keys and the total count of each.
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse.ravel(), weights=counts, minlength=len(unique)).astype(np.int64)
+
+
+def _encode(array):
+    return base64.b64encode(np.ascontiguousarray(array, dtype=np.int64).tobytes()).decode()
+
+
+def _decode(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.int64).copy()
+
+
+class DateRollup:
+    """
+    The number of tracks added on each day, overall and per credited artist, that can be merged.
+
+    Rows are aggregated once into daily counts; weekly, monthly and yearly counts are added up
+    from the daily counts, which number at most a few thousand however many tracks there are,
+    so counts, cumulative curves, rolling rates and artist timelines never rescan the tracks.
+    Rollups of new batches of tracks, or of other playlists, merge into an existing rollup by
+    adding the counts of equal days.
+    """
+
+    def __init__(self, days=None, day_counts=None, artist_lookups=None, artist_names=None,
+                 artist_codes=None, artist_days=None, artist_counts=None):
+        """
+        Initializes a DateRollup instance, empty unless given the counts of an existing rollup.
+
+        Args:
+            days (np.ndarray): The sorted distinct day numbers tracks were added on.
+            day_counts (np.ndarray): The number of tracks added on each day.
+            artist_lookups (list): The lookup key (Spotify ID or 'name:<name>') of each artist code.
+            artist_names (list): The name of each artist code.
+            artist_codes (np.ndarray): The artist code of each artist count, sorted with artist_days.
+            artist_days (np.ndarray): The day number of each artist count.
+            artist_counts (np.ndarray): The number of the artist's tracks added on the day.
+        """
+        empty = np.empty(0, dtype=np.int64)
+        self.days = days if days is not None else empty
+        self.day_counts = day_counts if day_counts is not None else empty
+        self.artist_lookups = artist_lookups if artist_lookups is not None else []
+        self.artist_names = artist_names if artist_names is not None else []
+        self.artist_codes = artist_codes if artist_codes is not None else empty
+        self.artist_days = artist_days if artist_days is not None else empty
+        self.artist_counts = artist_counts if artist_counts is not None else empty
+        self._levels = {}  # The counts of each coarser level, added up on first use
+
+    @property
+    def total(self):
+        return int(self.day_counts.sum())
+
+    @classmethod
+    def from_dataframe(cls, df, artists=None):
+        """
+        Counts the tracks of playlist data added on each day, in one pass over the DateAdded column.
+
+        Tracks without a date added are left out.
+
+        Args:
+            df (pd.DataFrame): The playlist data; without a DateAdded column the rollup is empty.
+            artists (ArtistIndex): The artists of the tracks, or None to split the joined Artist column.
+        Returns:
+            DateRollup: The rollup.
+        """
+        if 'DateAdded' not in df or not len(df):
+            return cls()
+        track_days, missing = epoch_days(df['DateAdded'])
+        days, counts = _sum_by(track_days[~missing], np.ones(int((~missing).sum())))
+
+        # One row per credited artist of each track, with the position of the track
+        if artists is not None and 'ID' in df:
+            credits = artists.credits_of(df['ID'])
+            positions, lookups, names = credits['Position'].to_numpy(), credits['Lookup'], credits['Artist']
+        elif 'Artist' in df:
+            lookups = split_artists(df['Artist'].reset_index(drop=True))
+            positions, names = lookups.index.to_numpy(), lookups.str[len('name:'):]
+        else:
+            return cls(days, counts)
+
+        dated = ~missing[positions]
+        codes, unique_lookups = pd.factorize(pd.Series(lookups, dtype=object).to_numpy()[dated])
+        first_seen = np.unique(codes, return_index=True)[1]
+        rollup = cls(days, counts, list(unique_lookups), list(np.asarray(names, dtype=object)[dated][first_seen]))
+        rollup._set_artist_counts(codes, track_days[positions][dated], np.ones(len(codes), dtype=np.int64))
+        return rollup
+
+    def _set_artist_counts(self, codes, days, counts):
+        """
+        Adds up the counts of equal artist codes and days and stores them sorted by artist, then day.
+        """
+        if not len(codes):
+            return
+        artist_counts = pd.Series(counts).groupby([np.asarray(codes, dtype=np.int64), np.asarray(days)]).sum()
+        self.artist_codes = artist_counts.index.get_level_values(0).to_numpy(dtype=np.int64)
+        self.artist_days = artist_counts.index.get_level_values(1).to_numpy(dtype=np.int64)
+        self.artist_counts = artist_counts.to_numpy(dtype=np.int64)
+
+    def merge(self, other):
+        """
+        Returns the rollup of the tracks of both this and another rollup.
+        """
+        return DateRollup.concat([self, other])
+
+    @classmethod
+    def concat(cls, rollups):
+        """
+        Combines several rollups into one in a single pass, e.g. those of the batches of an export.
+
+        Args:
+            rollups (list): The rollups to combine.
+        Returns:
+            DateRollup: The rollup of the tracks of every rollup.
+        """
+        rollups = list(rollups)
+        if not rollups:
+            return cls()
+        days, counts = _sum_by(np.concatenate([rollup.days for rollup in rollups]),
+                               np.concatenate([rollup.day_counts for rollup in rollups]))
+
+        # Give each rollup's artists one code per lookup across every rollup, in order of first appearance
+        codes, lookups, names, mappings = {}, [], [], []
+        for rollup in rollups:
+            for lookup, name in zip(rollup.artist_lookups, rollup.artist_names):
+                if lookup not in codes:
+                    codes[lookup] = len(lookups)
+                    lookups.append(lookup)
+                    names.append(name)
+            mappings.append(np.array([codes[lookup] for lookup in rollup.artist_lookups], dtype=np.int64))
+
+        combined = cls(days, counts, lookups, names)
+        combined._set_artist_counts(
+            np.concatenate([mapping[rollup.artist_codes] for mapping, rollup in zip(mappings, rollups)]),
+            np.concatenate([rollup.artist_days for rollup in rollups]),
+            np.concatenate([rollup.artist_counts for rollup in rollups])
+        )
+        return combined
+
+    def _level_counts(self, level):
+        """
+        Returns the distinct periods of a level that tracks were added in and the number added in each.
+        """
+        if level == 'day':
+            return self.days, self.day_counts
+        if level not in self._levels:
+            self._levels[level] = _sum_by(period_keys(self.days, level), self.day_counts)
+        return self._levels[level]
+
+    @staticmethod
+    def _to_series(keys, counts, level, fill):
+        """
+        Turns period numbers and counts into a Series indexed by the start of each period.
+        """
+        if fill and len(keys):
+            # Periods without additions are counted as zero, so the series is evenly spaced
+            filled = np.zeros(keys[-1] - keys[0] + 1, dtype=np.int64)
+            filled[keys - keys[0]] = counts
+            keys, counts = np.arange(keys[0], keys[-1] + 1), filled
+        return pd.Series(counts, index=period_starts(keys, level).rename('DateAdded'), name='Tracks Added')
+
+    def counts(self, level='day', fill=True):
+        """
+        Counts the tracks added in each period.
+
+        Args:
+            level (str): One of LEVELS.
+            fill (bool): Whether periods without additions between the first and last are included as zero.
+        Returns:
+            pd.Series: The number of tracks added, indexed by the UTC start of each period.
+        """
+        keys, counts = self._level_counts(level)
+        return self._to_series(keys, counts, level, fill)
+
+    def cumulative(self, level='day'):
+        """
+        Returns the total number of tracks added by the end of each period.
+        """
+        return self.counts(level).cumsum().rename('Total Tracks Added')
+
+    def rolling_rate(self, window=DEFAULT_ROLLING_WINDOW, level='day'):
+        """
+        Returns the average number of tracks added per period over the last window periods, at each period.
+
+        Args:
+            window (int): The number of periods averaged, including the current one.
+            level (str): One of LEVELS.
+        Returns:
+            pd.Series: The rolling rate, indexed by the UTC start of each period.
+        """
+        return self.counts(level).rolling(window, min_periods=1).mean().rename(f'Tracks Added per {level.title()}')
+
+    def artist_timeline(self, artist, level='month', fill=True):
+        """
+        Counts the tracks of an artist added in each period.
+
+        Args:
+            artist (str): The Spotify ID or name of the artist.
+            level (str): One of LEVELS.
+            fill (bool): Whether periods without additions between the first and last are included as zero.
+        Returns:
+            pd.Series: The number of the artist's tracks added, empty if the artist has none.
+        """
+        matches = [code for code, (lookup, name) in enumerate(zip(self.artist_lookups, self.artist_names))
+                   if artist in (lookup, name)]
+        rows = np.isin(self.artist_codes, matches)
+        keys, counts = _sum_by(period_keys(self.artist_days[rows], level), self.artist_counts[rows])
+        return self._to_series(keys, counts, level, fill)
+
+    def to_dict(self):
+        # The count arrays are stored as base64 int64 bytes, which is much smaller than JSON lists
+        return {
+            'days': _encode(self.days),
+            'counts': _encode(self.day_counts),
+            'artist_lookups': self.artist_lookups,
+            'artist_names': self.artist_names,
+            'artist_codes': _encode(self.artist_codes),
+            'artist_days': _encode(self.artist_days),
+            'artist_counts': _encode(self.artist_counts)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            _decode(data['days']), _decode(data['counts']), data['artist_lookups'], data['artist_names'],
+            _decode(data['artist_codes']), _decode(data['artist_days']), _decode(data['artist_counts'])
+        )
+
+
+def write_rollup(rollup, path):
+    """
+    Writes the date added rollup sidecar of a playlist file, recording the file's modification time.
+
+    Args:
+        rollup (DateRollup): The rollup of the playlist file.
+        path (str): The path of the playlist file.
+    """
+    data = rollup.to_dict()
+    data['source_mtime_ns'] = os.stat(path).st_mtime_ns
+    temp_path = f"{rollup_path(path)}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, rollup_path(path))
+
+
+def read_rollup(path):
+    """
+    Reads the date added rollup sidecar of a playlist file if it is up to date with the file.
+
+    Args:
+        path (str): The path of the playlist file.
+    Returns:
+        DateRollup: The rollup, or None if there is no sidecar or the file changed since it was written.
+    """
+    try:
+        with open(rollup_path(path), 'r') as file:
+            data = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if data.get('source_mtime_ns') != os.stat(path).st_mtime_ns:
+        return None
+    return DateRollup.from_dict(data)
@@ -0,0 +1,223 @@
+import os
+import sqlite3
+import threading
+import time
+from instrumentation import count
+
+# The raw audio feature fields stored for each track, so the composite formula can change without a refetch
+FEATURE_FIELDS = (
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature'
+)
+
+# The directory the cache is stored in, overridable with the SPOTIFY_FEATURE_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.environ.get('SPOTIFY_FEATURE_CACHE_DIR', '.feature_cache')
+
+# The maximum number of tracks kept in the cache before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = 1000000
+
+# SQLite limits the number of parameters in one statement, so large lookups are split into chunks
+_SQL_CHUNK_SIZE = 500
+
+# The number of tracks read at a time when scanning the whole cache
+_SCAN_CHUNK_SIZE = 50000
+
+
+def _chunks(values, size):
+    """
+    Splits a list into consecutive chunks of at most the given size.
+    """
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class FeatureCache:
+    """
+    A persistent SQLite cache of raw audio features keyed by track ID.
+
+    A track's audio features never change, so once fetched they can be reused by every
+    playlist that contains the track. The least recently used tracks are evicted once the
+    cache holds more than max_entries tracks.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Initializes a FeatureCache instance, creating the cache database if needed.
+
+        Args:
+            cache_dir (str): The directory the cache database is stored in.
+            max_entries (int): The maximum number of tracks kept in the cache.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'audio_features.sqlite3')
+        self.max_entries = max_entries
+        self.hits = 0    # Number of track lookups answered by the cache
+        self.misses = 0  # Number of track lookups that had to go to the API
+
+        # The cache may be shared by threads fetching playlist pages concurrently
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        columns = ', '.join(f'{field} REAL' for field in FEATURE_FIELDS)
+        with self._connection:
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS features (track_id TEXT PRIMARY KEY, {columns}, last_used REAL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS features_last_used ON features (last_used)')
+            # Counters kept with the cache, e.g. the generation increased by every change to its tracks
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+
+    def generation(self):
+        """
+        Returns a counter that increases whenever tracks are added to, replaced in or removed from the cache.
+
+        Unlike the number of cached tracks it also changes when a full cache evicts tracks to make
+        room for new ones, so anything built from the cache can tell whether it is out of date.
+
+        Returns:
+            int: The generation, 0 for a cache that has never changed.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _bump_generation(self):
+        """
+        Increases the generation; called in the transaction that changes the cached tracks.
+        """
+        self._connection.execute(
+            "INSERT INTO meta VALUES ('generation', 1) ON CONFLICT(name) DO UPDATE SET value = value + 1"
+        )
+
+    def get_many(self, track_ids):
+        """
+        Looks up the audio features of many tracks.
+
+        Args:
+            track_ids (list): The IDs of the tracks to look up.
+        Returns:
+            dict: A dictionary mapping each cached track ID to its audio features.
+        """
+        unique_ids = list(dict.fromkeys(track_ids))
+        found = {}
+        columns = ', '.join(FEATURE_FIELDS)
+
+        with self._lock, self._connection:
+            for chunk in _chunks(unique_ids, _SQL_CHUNK_SIZE):
+                placeholders = ', '.join('?' * len(chunk))
+                rows = self._connection.execute(
+                    f'SELECT track_id, {columns} FROM features WHERE track_id IN ({placeholders})', chunk
+                ).fetchall()
+                for row in rows:
+                    # Leave out missing fields so callers fall back to their own defaults
+                    found[row[0]] = {field: value for field, value in zip(FEATURE_FIELDS, row[1:]) if value is not None}
+
+                # Mark the found tracks as recently used so they are evicted last
+                self._connection.executemany(
+                    'UPDATE features SET last_used = ? WHERE track_id = ?',
+                    [(time.time(), row[0]) for row in rows]
+                )
+
+            self.hits += len(found)
+            self.misses += len(unique_ids) - len(found)
+        count('cache.hits', len(found))
+        count('cache.misses', len(unique_ids) - len(found))
+
+        return found
+
+    def iter_features(self, chunk_size=_SCAN_CHUNK_SIZE):
+        """
+        Reads every cached track in chunks, in track ID order.
+
+        The lock is only held while a chunk is read, so exports can keep writing during a long
+        scan. Scanned tracks are not marked as recently used, so a scan does not affect eviction.
+
+        Args:
+            chunk_size (int): The number of tracks read at a time.
+        Yields:
+            tuple: The track IDs of a chunk, and their raw values in FEATURE_FIELDS order (None if missing).
+        """
+        columns = ', '.join(FEATURE_FIELDS)
+        last_id = ''
+        while True:
+            # Seek past the last ID rather than using OFFSET, so each chunk is an index lookup
+            with self._lock:
+                rows = self._connection.execute(
+                    f'SELECT track_id, {columns} FROM features WHERE track_id > ? ORDER BY track_id LIMIT ?',
+                    (last_id, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[0] for row in rows], [row[1:] for row in rows]
+
+    def put_many(self, features):
+        """
+        Stores the audio features of many tracks, evicting the least recently used tracks if the cache is full.
+
+        Args:
+            features (dict): A dictionary mapping track IDs to their audio features.
+        """
+        now = time.time()
+        rows = [
+            (track_id, *[track_features.get(field) for field in FEATURE_FIELDS], now)
+            for track_id, track_features in features.items() if track_features
+        ]
+        if not rows:
+            return
+
+        placeholders = ', '.join('?' * (len(FEATURE_FIELDS) + 2))
+        with self._lock, self._connection:
+            self._connection.executemany(f'INSERT OR REPLACE INTO features VALUES ({placeholders})', rows)
+            self._bump_generation()
+
+            # Evict the least recently used tracks beyond the size bound
+            excess = self._connection.execute('SELECT COUNT(*) FROM features').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    'DELETE FROM features WHERE track_id IN '
+                    '(SELECT track_id FROM features ORDER BY last_used LIMIT ?)', (excess,)
+                )
+
+    def invalidate(self, track_ids=None):
+        """
+        Removes tracks from the cache so their audio features are fetched again.
+
+        Args:
+            track_ids (list): The IDs of the tracks to remove, or None to clear the whole cache.
+        Returns:
+            int: The number of tracks removed.
+        """
+        with self._lock, self._connection:
+            if track_ids is None:
+                removed = self._connection.execute('DELETE FROM features').rowcount
+            else:
+                removed = 0
+                for chunk in _chunks(list(track_ids), _SQL_CHUNK_SIZE):
+                    placeholders = ', '.join('?' * len(chunk))
+                    removed += self._connection.execute(
+                        f'DELETE FROM features WHERE track_id IN ({placeholders})', chunk
+                    ).rowcount
+            if removed:
+                self._bump_generation()
+            return removed
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the current size of the cache.
+
+        Returns:
+            dict: The number of hits, misses and cached tracks.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+    def close(self):
+        """
+        Closes the connection to the cache database.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# The version of the report layout, increased whenever a field changes meaning
+REPORT_VERSION = 1
+
+# The number of functions listed in the report when profiling
+DEFAULT_PROFILE_TOP = 30
+
+
+class Instrumentation:
+    """
+    Collects the timings of each stage of a run, counters and errors, for a JSON report.
+
+    Stages are timed with the stage() context manager. A stage entered by several threads at
+    once (such as concurrent page fetches) adds up the time of each thread, so its seconds can
+    exceed the run's duration. Counters are plain named totals: API calls by endpoint, retries,
+    cache hits and rows processed. Recording is cheap and thread safe, so it is always on.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty Instrumentation instance.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Discards everything recorded so far and restarts the run's clock.
+        """
+        with self._lock:
+            self.stages = {}           # Stage name -> calls, total seconds and longest call
+            self.counters = Counter()
+            self.errors = []           # Stage, error type and message of each failure
+            self.started_at = time.time()
+            self._start = time.perf_counter()
+        self._profiler = None
+        self._profile_path = None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the code inside the with block as one call of a stage, recording any error it raises.
+
+        Args:
+            name (str): The name of the stage, e.g. 'storage.write'.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_error(name, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                stage['calls'] += 1
+                stage['seconds'] += elapsed
+                stage['max_seconds'] = max(stage['max_seconds'], elapsed)
+
+    def count(self, name, value=1):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The name of the counter, e.g. 'api.audio_features'.
+            value (int): The amount to add.
+        """
+        with self._lock:
+            self.counters[name] += value
+
+    def record_error(self, stage, error):
+        """
+        Records a failure, so it appears in the report as well as wherever it is printed.
+
+        Args:
+            stage (str): The stage or command that failed.
+            error (Exception): The error raised.
+        """
+        with self._lock:
+            # An error passing through nested stages is only recorded by the innermost one
+            if self.errors and self.errors[-1]['error_id'] == id(error):
+                return
+            self.errors.append({
+                'stage': stage, 'type': type(error).__name__, 'message': str(error), 'error_id': id(error)
+            })
+            self.counters['errors'] += 1
+
+    def start_profile(self, path=None):
+        """
+        Starts profiling the calling thread with cProfile.
+
+        Args:
+            path (str): A file to save the raw profile to when profiling stops, for tools such as snakeviz.
+        """
+        import cProfile
+        self._profiler = cProfile.Profile()
+        self._profile_path = path
+        self._profiler.enable()
+
+    def stop_profile(self, top=DEFAULT_PROFILE_TOP):
+        """
+        Stops profiling and summarises the functions that took the most time.
+
+        Args:
+            top (int): The number of functions to list.
+        Returns:
+            list: The function, number of calls, own time and cumulative time of each, or None if not profiling.
+        """
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        import pstats
+
+        if self._profile_path:
+            self._profiler.dump_stats(self._profile_path)
+
+        stats = pstats.Stats(self._profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+        self._profiler = None
+        return [
+            {
+                'function': f'{os.path.basename(filename)}:{line}({function})',
+                'calls': calls,
+                'seconds': round(own_time, 6),
+                'cumulative_seconds': round(cumulative_time, 6)
+            }
+            for (filename, line, function), (_, calls, own_time, cumulative_time, _) in rows
+        ]
+
+    def report(self, extra=None):
+        """
+        Builds the report of everything recorded since the last reset.
+
+        Args:
+            extra (dict): Further fields to include, e.g. the command that was run.
+        Returns:
+            dict: The report, ready to be written as JSON.
+        """
+        profile = self.stop_profile()
+        with self._lock:
+            report = {
+                'version': REPORT_VERSION,
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started_at)),
+                'duration_seconds': round(time.perf_counter() - self._start, 6),
+                'stages': {
+                    name: {key: round(value, 6) if isinstance(value, float) else value for key, value in stage.items()}
+                    for name, stage in sorted(self.stages.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+                'errors': [{key: value for key, value in error.items() if key != 'error_id'} for error in self.errors]
+            }
+        if profile is not None:
+            report['profile'] = profile
+        report.update(extra or {})
+        return report
+
+    def write_report(self, path, extra=None):
+        """
+        Writes the report to a JSON file.
+
+        Args:
+            path (str): The path of the file.
+            extra (dict): Further fields to include.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.report(extra), file, indent=2)
+
+
+# The instrumentation every module records into
+INSTRUMENTATION = Instrumentation()
+
+# Shortcuts to the shared instrumentation
+stage = INSTRUMENTATION.stage
+count = INSTRUMENTATION.count
+record_error = INSTRUMENTATION.record_error
@@ -0,0 +1,355 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from spotipy.exceptions import SpotifyException
+
+
+def make_track_item(track_id, name, artists, added_at):
+    """
+    Builds a playlist item in the shape returned by the 'playlist_tracks' endpoint.
+
+    Args:
+        track_id (str): The ID of the track.
+        name (str): The name of the track.
+        artists (list): The names of the track's artists.
+        added_at (str): The ISO 8601 timestamp the track was added to the playlist.
+    Returns:
+        dict: A playlist item containing the track and the date it was added.
+    """
+    return {
+        'added_at': added_at,
+        'track': {
+            'id': track_id,
+            'name': name,
+            'artists': [{'id': f'artist-{artist}', 'name': artist} for artist in artists]
+        }
+    }
+
+
+class MockSpotify:
+    """
+    An in-memory stand-in for spotipy.Spotify that serves the endpoints used by this project
+    and counts every request made, so the number of API calls can be checked offline.
+
+    It can also inject 429 (rate limited) and 503 (server error) responses every few
+    requests to exercise retry handling.
+    """
+
+    def __init__(self, playlists=None, features=None, username='mock_user',
+                 throttle_every=0, retry_after=1, server_error_every=0):
+        """
+        Initializes a MockSpotify instance with the data it should serve.
+
+        Args:
+            playlists (dict): A dictionary of playlist IDs to a dict with a 'name' and a list of 'items'.
+            features (dict): A dictionary of track IDs to their audio features.
+            username (str): The user that owns the mock playlists.
+            throttle_every (int): Reject every nth request with a 429 response, 0 to never throttle.
+            retry_after (int): The Retry-After header (seconds) sent with injected 429 responses.
+            server_error_every (int): Fail every nth request with a 503 response, 0 to never fail.
+        """
+        self.playlists = playlists if playlists is not None else {}
+        self.features = features if features is not None else {}
+        self.username = username
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.server_error_every = server_error_every
+        self.request_counts = Counter()  # Number of requests made to each endpoint
+        self.injected_errors = Counter()  # Number of injected error responses by status code
+
+    @property
+    def total_requests(self):
+        """
+        The total number of requests made to every endpoint.
+        """
+        return sum(self.request_counts.values())
+
+    def reset_counts(self):
+        """
+        Resets the request counters.
+        """
+        self.request_counts.clear()
+
+    def current_user(self):
+        self._request('current_user')
+        return {'id': self.username, 'display_name': self.username}
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self._request('current_user_playlists')
+        playlists = [
+            {'id': playlist_id, 'name': playlist['name'], 'owner': {'id': self.username}}
+            for playlist_id, playlist in self.playlists.items()
+        ]
+        return self._page(playlists, limit, offset)
+
+    def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0, market=None, additional_types=('track',)):
+        self._request('playlist_tracks')
+        if limit > 100:
+            raise ValueError('playlist_tracks accepts at most 100 items per request')
+        return self._page(self._playlist(playlist_id)['items'], limit, offset)
+
+    def playlist(self, playlist_id, fields=None, market=None, additional_types=('track',)):
+        self._request('playlist')
+        playlist = self._playlist(playlist_id)
+        return {
+            'id': playlist_id,
+            'name': playlist['name'],
+            'snapshot_id': playlist.get('snapshot_id', '0'),
+            'tracks': {'total': len(playlist['items'])}
+        }
+
+    def audio_features(self, tracks=[]):
+        self._request('audio_features')
+        # spotipy accepts either a single ID or a list of IDs
+        track_ids = [tracks] if isinstance(tracks, str) else list(tracks)
+        if len(track_ids) > 100:
+            raise ValueError('audio_features accepts at most 100 IDs per request')
+        return [self.features.get(track_id) for track_id in track_ids]
+
+    def user_playlist_create(self, user, name, public=True, collaborative=False, description=''):
+        self._request('user_playlist_create')
+        playlist_id = f'mock_playlist_{len(self.playlists)}'
+        self.playlists[playlist_id] = {'name': name, 'items': self._make_items([])}
+        return {'id': playlist_id, 'name': name}
+
+    def playlist_change_details(self, playlist_id, name=None, public=None, collaborative=None, description=None):
+        self._request('playlist_change_details')
+        if name is not None:
+            self.playlists[playlist_id]['name'] = name
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self._request('playlist_add_items')
+        if len(items) > 100:
+            raise ValueError('playlist_add_items accepts at most 100 items per request')
+        new_items = self._make_items(items)
+        playlist = self.playlists[playlist_id]
+        if position is None:
+            playlist['items'].extend(new_items)
+        else:
+            playlist['items'][position:position] = new_items
+        return {'snapshot_id': self._bump_snapshot(playlist)}
+
+    def playlist_replace_items(self, playlist_id, items):
+        self._request('playlist_replace_items')
+        if len(items) > 100:
+            raise ValueError('playlist_replace_items accepts at most 100 items per request')
+        playlist = self.playlists[playlist_id]
+        playlist['items'] = self._make_items(items)
+        return {'snapshot_id': self._bump_snapshot(playlist)}
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        self._request('playlist_reorder_items')
+        playlist = self.playlists[playlist_id]
+        items = playlist['items']
+        block = items[range_start:range_start + range_length]
+        remaining = items[:range_start] + items[range_start + range_length:]
+        # insert_before refers to positions before the block is taken out
+        insert_at = insert_before if insert_before <= range_start else insert_before - range_length
+        playlist['items'] = remaining[:insert_at] + block + remaining[insert_at:]
+        return {'snapshot_id': self._bump_snapshot(playlist)}
+
+    def _playlist(self, playlist_id):
+        """
+        Returns a playlist, raising the 404 response spotipy raises for a playlist that does not exist.
+        """
+        if playlist_id not in self.playlists:
+            raise SpotifyException(404, -1, f'playlists/{playlist_id}: Not found.')
+        return self.playlists[playlist_id]
+
+    def _make_items(self, track_ids):
+        """
+        Builds the playlist items stored for tracks added to a playlist.
+        """
+        return [make_track_item(track_id, track_id, [], None) for track_id in track_ids]
+
+    def _bump_snapshot(self, playlist):
+        """
+        Gives a changed playlist a new snapshot ID.
+        """
+        playlist['snapshot_id'] = str(int(playlist.get('snapshot_id', '0')) + 1)
+        return playlist['snapshot_id']
+
+    def _request(self, endpoint):
+        """
+        Counts a request and raises an injected error response when one is due.
+        """
+        self.request_counts[endpoint] += 1
+        count = self.total_requests
+
+        if self.throttle_every and count % self.throttle_every == 0:
+            self.injected_errors[429] += 1
+            raise SpotifyException(429, -1, f'{endpoint}: rate limited',
+                                   headers={'Retry-After': str(self.retry_after)})
+        if self.server_error_every and count % self.server_error_every == 0:
+            self.injected_errors[503] += 1
+            raise SpotifyException(503, -1, f'{endpoint}: service unavailable')
+
+    def _page(self, items, limit, offset):
+        """
+        Returns a paging object for a slice of items, mirroring the Spotify API.
+        """
+        return {
+            'items': items[offset:offset + limit],
+            'limit': limit,
+            'offset': offset,
+            'total': len(items),
+            'next': None if offset + limit >= len(items) else f'offset={offset + limit}'
+        }
+
+
+def _track_id(uri):
+    """
+    Returns the track ID of a track URI sent to the playlist item endpoints.
+    """
+    return uri.split(':')[-1]
+
+
+class _FakeSpotifyHandler(BaseHTTPRequestHandler):
+    """
+    Passes each HTTP request to the FakeSpotifyServer that owns the server.
+    """
+    # Keep-alive connections, so clients can pool them as they would with the real API
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length)) if length else None
+        status, body, headers = self.server.fake.handle(
+            self.command, self.path, payload, self.headers.get('Authorization')
+        )
+
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = _respond
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+class FakeSpotifyServer:
+    """
+    Serves a MockSpotify over HTTP on localhost, in the shape of the Spotify Web API.
+
+    Real HTTP clients (spotipy.Spotify or AsyncSpotify with their prefix set to the server's
+    url) can then be run and benchmarked offline. Each response can be delayed to simulate
+    network latency; requests are served concurrently, but the MockSpotify is only accessed
+    by one request at a time.
+    """
+
+    def __init__(self, spotify, latency=0.0, port=0):
+        """
+        Initializes a FakeSpotifyServer instance bound to localhost.
+
+        Args:
+            spotify (MockSpotify): The mock API the requests are served from.
+            latency (float): The time (seconds) each response is delayed by.
+            port (int): The port to listen on, 0 for any free port.
+        """
+        self.spotify = spotify
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _FakeSpotifyHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}/v1/'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Starts serving requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the server and closes its socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def handle(self, method, path, payload, authorization):
+        """
+        Serves one request from the MockSpotify.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path and query string.
+            payload (dict): The decoded JSON body, if any.
+            authorization (str): The Authorization header.
+        Returns:
+            tuple: The status code, the JSON body (or None) and any extra headers.
+        """
+        url = urlsplit(path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part][1:]  # Drop the 'v1' prefix
+
+        if not authorization or not authorization.startswith('Bearer '):
+            return 401, {'error': {'status': 401, 'message': 'No token provided'}}, {}
+
+        try:
+            with self._lock:
+                body = self._dispatch(method, parts, query, payload or {})
+            status, headers = 200, {}
+        except SpotifyException as e:
+            status, headers = e.http_status, dict(e.headers or {})
+            body = {'error': {'status': e.http_status, 'message': e.msg}}
+        except (KeyError, ValueError) as e:
+            status, headers = (404 if isinstance(e, KeyError) else 400), {}
+            body = {'error': {'status': status, 'message': str(e)}}
+
+        if self.latency:
+            time.sleep(self.latency)
+        return status, body, headers
+
+    def _dispatch(self, method, parts, query, payload):
+        """
+        Calls the MockSpotify method of an endpoint, raising KeyError for unknown endpoints.
+        """
+        sp = self.spotify
+        limit, offset = query.get('limit'), int(query.get('offset', 0))
+
+        if method == 'GET' and parts == ['me']:
+            return sp.current_user()
+        if method == 'GET' and parts == ['me', 'playlists']:
+            return sp.current_user_playlists(int(limit or 50), offset)
+        if method == 'GET' and parts == ['audio-features']:
+            return {'audio_features': sp.audio_features(query.get('ids', '').split(','))}
+        if method == 'POST' and len(parts) == 3 and parts[0] == 'users' and parts[2] == 'playlists':
+            return sp.user_playlist_create(parts[1], payload['name'], payload.get('public', True),
+                                           payload.get('collaborative', False), payload.get('description', ''))
+
+        if parts[:1] == ['playlists'] and len(parts) == 2 and method == 'GET':
+            return sp.playlist(parts[1], query.get('fields'))
+        if parts[:1] == ['playlists'] and len(parts) == 3 and parts[2] == 'tracks':
+            playlist_id = parts[1]
+            if method == 'GET':
+                return sp.playlist_tracks(playlist_id, query.get('fields'), int(limit or 100), offset)
+            if method == 'POST':
+                position = int(query['position']) if 'position' in query else payload.get('position')
+                return sp.playlist_add_items(playlist_id, [_track_id(uri) for uri in payload['uris']], position)
+            if method == 'PUT' and 'uris' in payload:
+                return sp.playlist_replace_items(playlist_id, [_track_id(uri) for uri in payload['uris']])
+            if method == 'PUT':
+                return sp.playlist_reorder_items(playlist_id, payload['range_start'], payload['insert_before'],
+                                                 payload.get('range_length', 1), payload.get('snapshot_id'))
+
+        raise KeyError(f"Unknown endpoint {method} /{'/'.join(parts)}")
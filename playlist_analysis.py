@@ -1,37 +1,179 @@
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.dates import DateFormatter
+import hashlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from date_rollup import LEVELS, DateRollup
+from instrumentation import stage
+from playlist_stats import PlaylistStats
+from playlist_storage import (
+    DEFAULT_PLAYLIST_PATH, LEGACY_CSV_PATH, export_csv, load_artist_index, load_playlist, load_playlist_rollup,
+    load_playlist_stats, save_playlist
+)
 
-def added_at_graph(df):
-    df['DateAdded'] = pd.to_datetime(df['DateAdded'])
-    
-    # Calculate the number of bars for each frequency (months, weeks, and days)
-    songs_added_count_days = df.groupby(pd.Grouper(key='DateAdded', freq='1D')).size()
+# Series longer than this are downsampled before plotting
+DEFAULT_MAX_POINTS = 2000
+
+# The number of artists given their own wedge in the pie chart; the rest are grouped as 'Other'
+DEFAULT_TOP_ARTISTS = 20
+
+# The x-axis date format of graphs of each date added level
+DATE_FORMATS = {'day': '%d-%b-%Y', 'week': '%d-%b-%Y', 'month': '%b-%Y', 'year': '%Y'}
+
+# The width in days of the bars of each date added level; months and years differ in length by a few days at most
+BAR_WIDTHS = {'day': 0.8, 'week': 6, 'month': 25, 'year': 300}
+
+
+def downsample_min_max(x, y, max_points=DEFAULT_MAX_POINTS):
+    """
+    Reduces a series to at most max_points points, keeping the minimum and maximum of each bucket.
+
+    The points are split into max_points / 2 equal buckets and only each bucket's lowest and
+    highest points are kept, in their original order, so peaks and dips stay visible.
+
+    Args:
+        x (np.ndarray): The x values of the series.
+        y (np.ndarray): The y values of the series.
+        max_points (int): The maximum number of points to keep.
+    Returns:
+        tuple: The downsampled x and y values.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if len(y) <= max_points:
+        return x, y
+
+    # Pad the series to a whole number of equal buckets and find each bucket's extremes
+    bucket_size = -(-len(y) // (max_points // 2))
+    bucket_count = -(-len(y) // bucket_size)
+    padded = np.full(bucket_count * bucket_size, np.nan)
+    padded[:len(y)] = y
+    buckets = padded.reshape(bucket_count, bucket_size)
+
+    offsets = np.arange(bucket_count) * bucket_size
+    lowest = offsets + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+    highest = offsets + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+
+    keep = np.unique(np.concatenate([lowest, highest]))
+    keep = keep[keep < len(y)]
+    return x[keep], y[keep]
+
+
+def top_artist_counts(artist_counts, top_n=DEFAULT_TOP_ARTISTS):
+    """
+    Keeps the track counts of the top_n artists, grouping every other artist as 'Other'.
 
-    # Calculate the cumulative sum of songs added
-    cumulative_songs_added = songs_added_count_days.cumsum()
+    Args:
+        artist_counts (pd.Series): The number of tracks of each artist, largest first.
+        top_n (int): The number of artists counted on their own.
+    Returns:
+        pd.Series: The track counts, largest first, with 'Other' last.
+    """
+    artist_counts = artist_counts[artist_counts > 0]  # Unused categories of a categorical column
+    if len(artist_counts) <= top_n:
+        return artist_counts
+
+    top_counts = artist_counts.iloc[:top_n].copy()
+    top_counts.index = top_counts.index.astype(object)
+    top_counts['Other'] = artist_counts.iloc[top_n:].sum()
+    return top_counts
+
+
+def finish_figure(plt, output_path):
+    """
+    Shows the current figure, or saves it to a file and closes it when an output path is given.
+
+    Args:
+        plt (module): matplotlib.pyplot.
+        output_path (str): The image file to write (its extension picks the format, e.g. .png or .svg),
+            or None to show the figure.
+    """
+    plt.tight_layout()  # Adjust the layout to prevent overlapping elements
+    if output_path is None:
+        plt.show()  # Show the plot
+    else:
+        plt.savefig(output_path)
+        plt.close()  # Free the figure, as a rendering process may draw many
+
+
+def added_at_graph(df=None, output_path=None, max_points=DEFAULT_MAX_POINTS, level='day', rollup=None):
+    """
+    Plots the cumulative number of tracks added over time.
+
+    Args:
+        df (pd.DataFrame): The playlist data, only read when no rollup is given.
+        output_path (str): The image file to write, or None to show the graph.
+        max_points (int): The maximum number of points plotted.
+        level (str): The resolution of the curve, one of LEVELS.
+        rollup (DateRollup): The date added rollup of the playlist, counted from df if None.
+    """
+    # matplotlib is only imported when a graph is drawn, as it is slow to import
+    import matplotlib.pyplot as plt
+    from matplotlib.dates import DateFormatter
+
+    # The rollup already holds the number of songs added in each period
+    if rollup is None:
+        rollup = DateRollup.from_dataframe(df[['DateAdded']])
+    cumulative_songs_added = rollup.cumulative(level)
+    dates, totals = downsample_min_max(cumulative_songs_added.index, cumulative_songs_added.values, max_points)
 
     plt.figure(figsize=(12, 6))
-    plt.plot(cumulative_songs_added.index, cumulative_songs_added.values)  # Plot the cumulative line graph
+    plt.plot(dates, totals)  # Plot the cumulative line graph
     
-    plt.xlabel('Date Added (Days)')
+    plt.xlabel(f'Date Added ({level.title()}s)')
     plt.ylabel('Cumulative Number of Songs Added')
     plt.title('Cumulative Songs Added Over Time')
     
     # Format x-axis labels with the chosen frequency format using DateFormatter
-    plt.gca().xaxis.set_major_formatter(DateFormatter('%d-%b-%Y'))
+    plt.gca().xaxis.set_major_formatter(DateFormatter(DATE_FORMATS[level]))
     
     plt.xticks(rotation=45)  # Rotate x-axis labels for better readability
     plt.grid(True)  # Add grid lines to the plot
     
-    plt.tight_layout()  # Adjust the layout to prevent overlapping elements
-    plt.show()  # Show the plot
+    finish_figure(plt, output_path)
+
+def artist_timeline_graph(rollup, artist, level='month', output_path=None):
+    """
+    Plots the number of an artist's tracks added in each period.
+
+    Args:
+        rollup (DateRollup): The date added rollup of the playlist.
+        artist (str): The Spotify ID or name of the artist.
+        level (str): The resolution of the timeline, one of LEVELS.
+        output_path (str): The image file to write, or None to show the graph.
+    Returns:
+        bool: False if the playlist has no tracks by the artist, so nothing was plotted.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.dates import DateFormatter
+
+    timeline = rollup.artist_timeline(artist, level)
+    if not timeline.sum():
+        return False
+
+    plt.figure(figsize=(12, 6))
+    plt.bar(timeline.index, timeline.values, width=BAR_WIDTHS[level])  # One bar per period
+
+    plt.xlabel(f'Date Added ({level.title()}s)')
+    plt.ylabel('Number of Songs Added')
+    plt.title(f'Songs by {artist} Added Over Time')
+    plt.gca().xaxis.set_major_formatter(DateFormatter(DATE_FORMATS[level]))
+    plt.xticks(rotation=45)
+    plt.grid(True, axis='y')
+
+    finish_figure(plt, output_path)
+    return True
+
+def composite_graph(df, output_path=None, max_points=DEFAULT_MAX_POINTS):
+    import matplotlib.pyplot as plt
+
+    song_numbers, composite = downsample_min_max(np.arange(1, df.shape[0] + 1), df['Composite Value'], max_points)
 
-def composite_graph(df):
     plt.figure(figsize=(10, 6))
-    # Plot the line graph
-    plt.plot(range(1, df.shape[0] + 1), df['Composite Value'], marker='o', linestyle='-', color='b')
+    # Plot the line graph; a marker per song is only drawn while the songs are few enough to see
+    marker = 'o' if len(song_numbers) == df.shape[0] and df.shape[0] <= max_points // 10 else None
+    plt.plot(song_numbers, composite, marker=marker, linestyle='-', color='b')
 
     # Add labels and title
     plt.xlabel('Song Number')
@@ -39,12 +181,20 @@ def composite_graph(df):
     plt.title('Composite Value vs. Song Number')
 
     plt.grid(True)
-    plt.tight_layout()
-    plt.show()
+    finish_figure(plt, output_path)
+
+def artist_pie_chart(df, output_path=None, top_n=DEFAULT_TOP_ARTISTS, artists=None):
+    import matplotlib.pyplot as plt
+
+    # Count the tracks of each credited artist, so a collaboration counts towards each of its artists;
+    # without an artist index each combination of artists counts as one
+    if artists is not None:
+        artist_counts = artists.artist_counts(df['ID'])
+    else:
+        artist_counts = df['Artist'].value_counts()
 
-def artist_pie_chart(df):
-    # Group by artist and count the occurrences
-    artist_counts = df['Artist'].value_counts()
+    # Keep the long tail as a single 'Other' wedge
+    artist_counts = top_artist_counts(artist_counts, top_n)
 
     # Plotting
     plt.figure(figsize=(10, 8))
@@ -52,51 +202,163 @@ def artist_pie_chart(df):
     plt.title('Artist Distribution')
     plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
 
-    plt.tight_layout()
-    plt.show()
+    finish_figure(plt, output_path)
+
+
+def playlist_name(path):
+    """
+    Returns the name a playlist file's charts and reports are given: the file name without its extension.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name == 'tracks':
+        # Partitions of the consolidated store are named after their playlist_id=<id> directory
+        name = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return name
+
+
+def playlist_names(paths):
+    """
+    Returns a name for each of several playlist files that none of the others is given.
+
+    Files are named by playlist_name; files that would share a name, such as 'a/mix.csv' and
+    'b/mix.csv', have a short hash of their absolute path appended, so their charts and
+    rearranged copies do not overwrite each other.
+
+    Args:
+        paths (list): The paths of the playlist files.
+    Returns:
+        list: The name of each file, in order.
+    """
+    names = [playlist_name(path) for path in paths]
+    counts = Counter(names)
+    return [
+        f"{name}-{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]}" if counts[name] > 1 else name
+        for name, path in zip(names, paths)
+    ]
+
+
+def render_playlist_charts(path, output_dir, file_format='png', df=None, name=None):
+    """
+    Renders the charts of a playlist file to image files without a display.
+
+    Args:
+        path (str): The path of the playlist file.
+        output_dir (str): The directory to write the images to.
+        file_format (str): The image format, e.g. 'png' or 'svg'.
+        df (pd.DataFrame): The playlist data if already loaded, with at least the ID and Composite Value columns.
+        name (str): The name the images are given, playlist_name(path) if None.
+    Returns:
+        list: The paths of the images written.
+    """
+    # The Agg backend draws to files only, so no display is needed and nothing blocks
+    import matplotlib
+    matplotlib.use('Agg')
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = name or playlist_name(path)
+
+    if df is None:
+        df = load_playlist(path, ['ID', 'Composite Value'])
+    charts = [
+        (partial(added_at_graph, rollup=load_playlist_rollup(path)), f'{name}_added.{file_format}'),
+        (composite_graph, f'{name}_composite.{file_format}'),
+        (partial(artist_pie_chart, artists=load_artist_index(path)), f'{name}_artists.{file_format}')
+    ]
+
+    written = []
+    for chart, filename in charts:
+        output_path = os.path.join(output_dir, filename)
+        chart(df, output_path)
+        written.append(output_path)
+    return written
+
+
+def render_many(paths, output_dir, file_format='png', workers=None):
+    """
+    Renders the charts of many playlist files in a pool of processes.
+
+    Args:
+        paths (list): The paths of the playlist files.
+        output_dir (str): The directory to write the images to.
+        file_format (str): The image format, e.g. 'png' or 'svg'.
+        workers (int): The number of processes, the number of CPUs if None.
+    Returns:
+        list: The paths of every image written.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            render_playlist_charts, paths, [output_dir] * len(paths), [file_format] * len(paths),
+            [None] * len(paths), playlist_names(paths)
+        )
+        return [output_path for written in results for output_path in written]
 
 def analyze_dataframe(df):
-    # Display general information about the DataFrame
-    print("DataFrame Info:")
-    print(df.info())
-    print("\n")
-
-    # Display basic statistics about the composite value column
-    print("\nComposite Value Statistics:")
-    print(df['Composite Value'].describe())
-    print("\n")
-
-    # Display the number of unique songs and artists
-    num_unique_songs = df['Name'].nunique()
-    num_unique_artists = df['Artist'].nunique()
-    print(f"\nNumber of Unique Songs: {num_unique_songs}")
-    print(f"Number of Unique Artists: {num_unique_artists}")
-    print("\n")
-
-    # Display the earliest and latest dates in the 'Date Added' column
-    earliest_date = df['Date Added'].min()
-    latest_date = df['Date Added'].max()
-    print(f"\nEarliest Date Added: {earliest_date}")
-    print(f"Latest Date Added: {latest_date}")
-    print("\n")
-
-    # Display the song with the highest and lowest composite value
-    max_composite_song = df.loc[df['Composite Value'].idxmax()]
-    min_composite_song = df.loc[df['Composite Value'].idxmin()]
-    print(f"\nSong with Highest Composite Value:")
-    print(max_composite_song[['Name', 'Artist', 'Composite Value']])
-    print(f"\nSong with Lowest Composite Value:")
-    print(min_composite_song[['Name', 'Artist', 'Composite Value']])
-    print("\n")
-
-    # Composite value statistics
-    composite_mean = df['Composite Value'].mean()
-    composite_median = df['Composite Value'].median()
-    composite_std = df['Composite Value'].std()
-    print(f"Composite Value Mean: {composite_mean:.3f}")
-    print(f"Composite Value Median: {composite_median:.3f}")
-    print(f"Composite Value Standard Deviation: {composite_std:.3f}")
-    print("\n")
+    """
+    Displays the summary statistics of playlist data.
+
+    The statistics are computed in one pass; playlist files already have them in their
+    sidecar, which load_playlist_stats reads without loading any tracks.
+
+    Args:
+        df (pd.DataFrame): The playlist data.
+    """
+    PlaylistStats.from_dataframe(df).report()
+
+def piecewise_shape(points):
+    """
+    Creates a shape curve that linearly interpolates between the given points.
+
+    Args:
+        points (list): (x, y) pairs with x increasing from 0 to 1.
+    Returns:
+        callable: A curve taking an array of x values (0 - 1) and returning their y values.
+    """
+    xs, ys = zip(*points)
+    return lambda x_over_t: np.interp(x_over_t, xs, ys)
+
+
+# Raises every x value to a power with Python's scalar pow(), as the original shape equations did.
+# np.power can differ from it by one unit in the last place, which swaps near-ties of the
+# symmetric parabolas and so changes the permutation.
+scalar_pow = np.frompyfunc(pow, 2, 1)
+
+
+def pow_curve(x_over_t, exponent):
+    """
+    Returns x to the given power as floats, with the same bits as the original scalar pow().
+    """
+    return np.asarray(scalar_pow(x_over_t, exponent), dtype=float)
+
+
+# The shapes a playlist can be rearranged into, keyed by their menu number.
+# Each curve takes an array of track positions scaled to 0 - 1 and returns the target value at each.
+SHAPES = {
+    1: ('positive straight line', lambda x: x),
+    2: ('negative straight line', lambda x: (-x) + 1),
+    3: ('positive parabola', lambda x: 4 * pow_curve(x, 2) - 4 * x + 1),
+    4: ('negative parabola', lambda x: -4 * pow_curve(x, 2) + 4 * x),
+    5: ('positive cubic', lambda x: 9 * pow_curve(x, 3) - (27/2) * pow_curve(x, 2) + (11/2) * x),
+    6: ('negative cubic', lambda x: -9 * pow_curve(x, 3) + (27/2) * pow_curve(x, 2) - (11/2) * x + 1),
+    7: ('sine wave', lambda x: np.sin(2 * np.pi * x)),
+    8: ('step up', lambda x: (x > 0.5).astype(float)),
+    9: ('build and cool down', piecewise_shape([(0, 0.2), (0.7, 1), (1, 0.4)]))
+}
+
+
+def register_shape(description, curve):
+    """
+    Adds a new shape to the SHAPES table.
+
+    Args:
+        description (str): The name of the shape shown in the menu.
+        curve (callable): A curve taking an array of x values (0 - 1) and returning their y values.
+    Returns:
+        int: The equation number of the new shape.
+    """
+    equation_number = max(SHAPES) + 1
+    SHAPES[equation_number] = (description, curve)
+    return equation_number
+
 
 def choose_equation():
     """
@@ -107,17 +369,12 @@ def choose_equation():
     """
     print(
         "Pick Equation" +
-        "\n1 - positive straight line" +
-        "\n2 - negative straight line" +
-        "\n3 - positive parabola" +
-        "\n4 - negative parabola" +
-        "\n5 - positive cubic" +
-        "\n6 - negative cubic"
+        "".join(f"\n{number} - {description}" for number, (description, _) in SHAPES.items())
     )
     while True:
         try:
             user_input = int(input("Enter Your Choice: "))
-            if user_input > 0 and user_input < 7:
+            if user_input in SHAPES:
                 return user_input
             else:
                 print("Invalid Input")
@@ -127,76 +384,85 @@ def choose_equation():
 
 
 
+def choose_level():
+    """
+    Prompts the user to choose the resolution of a date added graph.
+
+    Returns:
+        str: The selected level, one of LEVELS.
+    """
+    print("Pick Resolution" + "".join(f"\n{number} - {level.title()}s" for number, level in enumerate(LEVELS, 1)))
+    while True:
+        try:
+            user_input = int(input("Enter Your Choice: "))
+            if 1 <= user_input <= len(LEVELS):
+                return LEVELS[user_input - 1]
+            else:
+                print("Invalid Input")
+
+        except ValueError:
+            print("Invalid Input")
+
+
 def rearrange_to_shape(df, equation_number):
     """
     Rearranges the rows of the DataFrame based on the provided equation number.
+
+    The target curve is evaluated at every position, then the composite values are matched
+    to it by rank: the track with the nth smallest composite value moves to the position with
+    the nth smallest target value. Ties keep their original order, and missing composite
+    values are treated as the largest.
     
     Args:
         df (pd.DataFrame): The DataFrame containing song data.
-        equation_number (int): The equation number for shaping the data.
+        equation_number (int): The equation number for shaping the data (a key of SHAPES).
         
     Returns:
         pd.DataFrame: The DataFrame with rows rearranged.
     """
-    def equation_y(x, equation_number, t):
-        """
-        Calculates the y value using the specified equation number.
-        
-        Args:
-            x (float): The x value.
-            equation_number (int): The equation number.
-            t (int): The number of playlist tracks.
-            
-        Returns:
-            float: The calculated y value.
-        """
-        x_over_t = x / t
-        if equation_number == 1:
-            return x_over_t
-        elif equation_number == 2:
-            return (-x_over_t) + 1
-        elif equation_number == 3:
-            return 4 * pow(x_over_t, 2) - 4 * x_over_t + 1
-        elif equation_number == 4:
-            return -4 * pow(x_over_t, 2) + 4 * x_over_t
-        elif equation_number == 5:
-            return 9 * pow(x_over_t, 3) - (27/2) * pow(x_over_t, 2) + (11/2) * x_over_t
-        else:  # (equation_number == 6):
-            return -9 * pow(x_over_t, 3) + (27/2) * pow(x_over_t, 2) - (11/2) * x_over_t + 1
-    
-    # Generate values for the equation
-    a = [equation_y(x + 1, equation_number, len(df)) for x in df['Composite Value'].index]
-    b = df['Composite Value'].values
+    with stage('rearrange'):
+        track_count = len(df)
+
+        # Evaluate the target curve at every track position (1 - n) scaled to 0 - 1
+        x_over_t = np.arange(1, track_count + 1) / track_count
+        a = SHAPES[equation_number][1](x_over_t)
+        b = df['Composite Value'].to_numpy(dtype=float)
 
-    # Step 1: Sort list a in increasing order while keeping track of original positions
-    a_with_original_positions = [(value, index) for index, value in enumerate(a)]
-    sorted_a = sorted(a_with_original_positions)
-    a_original_position = [index for _, index in sorted_a]
+        # Rank both lists; a stable sort breaks ties by original position
+        a_original_position = np.argsort(a, kind='stable')
+        b_original_position = np.argsort(b, kind='stable')
 
-    # Step 2: Sort list b in increasing order while keeping track of original positions
-    b_with_original_positions = [(value, index) for index, value in enumerate(b)]
-    sorted_b = sorted(b_with_original_positions)
-    b_original_position = [index for _, index in sorted_b]
+        # Place the nth smallest composite value at the position of the nth smallest target value
+        targeted_positions = np.empty(track_count, dtype=np.intp)
+        targeted_positions[a_original_position] = b_original_position
 
-    # Step 3: Match elements in sorted list b to their corresponding elements in sorted list a
-    # Step 4: Sort new list using index of list a and create the target positions list
+        # Use the best permutation to reorder your data
+        reordered_df = df.iloc[targeted_positions]
 
-    a_with_original_position_and_b_original_position = list(zip(a_original_position, b_original_position))
-    b_in_original_positions_with_target = sorted(a_with_original_position_and_b_original_position)
-    targeted_positions = [target for _, target in b_in_original_positions_with_target]
+        return reordered_df
 
-    # Use the best permutation to reorder your data
-    reordered_df = df.iloc[targeted_positions]
 
-    return reordered_df
+# The columns each analysis option reads from the playlist file, None for every column
+# The date added options read the rollup sidecar instead
+ANALYSIS_COLUMNS = {
+    2: ['Composite Value'],
+    3: None,  # Rearranging rewrites the whole file
+    5: ['ID'],
+    7: ['ID']
+}
 
+# The number of artist pairs listed by the collaborations option
+DEFAULT_TOP_COLLABORATIONS = 20
 
-def choose_analysis(df):
+
+def choose_analysis(path):
     """
-    Presents a menu for various analysis options on the playlist DataFrame.
+    Presents a menu for various analysis options on the playlist file.
+
+    Each option loads only the columns it needs from the file.
     
     Args:
-        df (pd.DataFrame): The DataFrame containing playlist data.
+        path (str): The path of the playlist file.
     """
     while True:
         print(
@@ -206,13 +472,18 @@ def choose_analysis(df):
             "\n2 - Display composite 'uplifting' graph" +
             "\n3 - Rearrange playlist csv in an 'uplifting' shape" +
             "\n4 - Display dataframe stats"
-            "\n5 - Display Artist pie chart"
+            "\n5 - Display Artist pie chart" +
+            "\n6 - Export playlist file to CSV" +
+            "\n7 - Display top artist collaborations" +
+            "\n8 - Display when an artist's songs were added"
         )
         try:
             user_input = int(input("Enter Your Choice: "))
+            if user_input in ANALYSIS_COLUMNS:
+                df = load_playlist(path, ANALYSIS_COLUMNS[user_input])  # Read the columns the option needs
             # Display date added graph
             if user_input == 1:
-                added_at_graph(df)
+                added_at_graph(level=choose_level(), rollup=load_playlist_rollup(path))
             # Display composite 'uplifting' graph
             elif user_input == 2:
                 composite_graph(df)
@@ -220,11 +491,27 @@ def choose_analysis(df):
             elif user_input == 3:
                 equation_number = choose_equation()  # Call function to choose equation
                 df = rearrange_to_shape(df, equation_number)  # Rearrange DataFrame
-                df.to_csv('playlist.csv', index=False)  # Save rearranged DataFrame to CSV
+                save_playlist(df, path)  # Save rearranged DataFrame to the playlist file
             elif user_input == 4:
-                analyze_dataframe(df)  # Analyze and display DataFrame stats
+                load_playlist_stats(path).report()  # Display the stats precomputed when the file was written
             elif user_input == 5:
-                artist_pie_chart(df)  # Display Artist pie chart
+                artist_pie_chart(df, artists=load_artist_index(path))  # Display Artist pie chart
+            # Export playlist file to CSV
+            elif user_input == 6:
+                if path == LEGACY_CSV_PATH:
+                    print(f"The playlist file is already '{LEGACY_CSV_PATH}'")
+                else:
+                    export_csv(path, LEGACY_CSV_PATH)
+                    print(f"Playlist file exported to '{LEGACY_CSV_PATH}'")
+            # Display the artists credited together most often
+            elif user_input == 7:
+                collaborations = load_artist_index(path).co_occurrence(df['ID'], DEFAULT_TOP_COLLABORATIONS)
+                print(collaborations.to_string(index=False) if len(collaborations) else "No collaborations found")
+            # Display an artist's addition timeline
+            elif user_input == 8:
+                artist = input("Enter the artist's name or Spotify ID: ").strip()
+                if not artist_timeline_graph(load_playlist_rollup(path), artist, choose_level()):
+                    print(f"No songs by '{artist}' found")
             # Exit the console
             elif user_input == 0:
                 return
@@ -238,22 +525,18 @@ def choose_analysis(df):
 
 
 class PlaylistAnalyser:
-    def analyse(self):
+    def analyse(self, path=None):
         """
-        Initiates the analysis process for a playlist CSV file.
+        Initiates the analysis process for a playlist file.
+
+        Args:
+            path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
         """
+        path = path or DEFAULT_PLAYLIST_PATH
         try:
-            df = pd.read_csv('playlist.csv',  parse_dates=['DateAdded'])  # Read the CSV file into a DataFrame
+            load_playlist(path, columns=['ID'])  # Check the playlist file exists, importing a legacy CSV if needed
         except FileNotFoundError:
-            print(f"File '{'playlist.csv'}' not found.\nCreate a Playlist CSV File first")
+            print(f"File '{path}' not found.\nCreate a Playlist CSV File first")
             return
         
-        choose_analysis(df)  # Call the choose_analysis function with the DataFrame
-
-        
-        
-        
-        
-        
-
-        
+        choose_analysis(path)  # Call the choose_analysis function with the playlist file
@@ -1,7 +1,30 @@
-import os
-import spotipy
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+from artist_index import ArtistIndex
+from composite import composite_values
+from date_rollup import DateRollup, read_rollup
+from instrumentation import count, stage
+from playlist_stats import PlaylistStats, read_stats
+from playlist_storage import DEFAULT_PLAYLIST_PATH, PlaylistWriter, load_playlist, save_playlist
+from track_table import TrackTable
+
+# The maximum number of track IDs the 'audio_features' endpoint accepts per request
+AUDIO_FEATURES_BATCH_SIZE = 100
+
+# The maximum number of tracks the 'playlist_tracks' endpoint returns per request
+PAGE_SIZE = 100
+
+# The fields requested for each page of playlist tracks, including the playlist's total track count
+PLAYLIST_TRACK_FIELDS = 'items(track(name, artists, id), added_at), total'
+
+# The maximum number of playlists the 'current_user_playlists' endpoint returns per request
+USER_PLAYLISTS_PAGE_SIZE = 50
+
+# The number of playlist pages fetched at the same time from the menu
+DEFAULT_PAGE_CONCURRENCY = 4
 
 
 def get_selected_playlist(playlists):
@@ -38,6 +61,33 @@ def get_selected_playlist(playlists):
             print("Invalid input. Please enter a valid number.")
 
 
+def get_user_playlists(spotify_object, owned_only=False):
+    """
+    Retrieves every playlist in the user's Spotify library, paging past the first 50.
+
+    Args:
+        spotify_object (spotipy.Spotify): An authenticated Spotify API object.
+        owned_only (bool): Whether to leave out playlists the user follows but does not own.
+    Returns:
+        list: The playlist objects returned by the 'current_user_playlists' endpoint.
+    """
+    playlists = []
+    offset = 0
+    owner_id = spotify_object.current_user()['id'] if owned_only else None
+
+    while True:
+        results = spotify_object.current_user_playlists(limit=USER_PLAYLISTS_PAGE_SIZE, offset=offset)
+        playlists.extend(
+            playlist for playlist in results['items']
+            if owner_id is None or playlist['owner']['id'] == owner_id
+        )
+
+        # Stop once the last page has been read
+        if not results.get('next'):
+            return playlists
+        offset += USER_PLAYLISTS_PAGE_SIZE
+
+
 def choose_playlist(spotify_object):
     """
     Allows the user to choose a playlist from their Spotify account for analysis.
@@ -47,12 +97,12 @@ def choose_playlist(spotify_object):
     Returns:
         str: The ID of the selected playlist for analysis.
     """
-    # Retrieve the user's playlists from their Spotify account
-    user_playlists = spotify_object.current_user_playlists()
+    # Retrieve every one of the user's playlists from their Spotify account
+    user_playlists = get_user_playlists(spotify_object)
     playlists = {}
     
     # Create a dictionary of playlist names and IDs
-    for playlist in user_playlists['items']:
+    for playlist in user_playlists:
         playlists[playlist['name']] = playlist['id']
 
     # Get the index of the selected playlist based on user input
@@ -65,128 +115,384 @@ def choose_playlist(spotify_object):
     return selected_playlist_id  # Return the ID of the selected playlist
 
 
-def get_feature_composite_value(spotify, track_id):
-    try:
-        # Make an API call to get the track features using the 'audio_features' endpoint of the Spotify API
-        track_features = spotify.audio_features(track_id)
-        
-        # Check if track_features is not empty and contains at least one element
-        if track_features and len(track_features) > 0:
-            track_features = track_features[0]
-            
-            # Retrieve specific audio features from the track_features dictionary using get()
-            energy = track_features.get('energy', 1) # least 0.0 - most 1.0
-            danceability = track_features.get('danceability', 1) # least 0.0 - most 1.0
-            tempo = track_features.get('tempo', 1) # bpm
-            tempo = max(60, min(tempo, 140)) - 60
-            tempo /= 80
-            loudness = track_features.get('loudness', 1) # least -60db - most 0db
-            loudness += 60
-            loudness /= 60
-            valence = track_features.get('valence', 1) # least 0.0 - most 1.0
-
-            #power function
-            #weighting
-            #harmonic/ geometric mean
-            composite_value = energy * danceability * tempo * loudness * valence
-            composite_value = np.around(composite_value, 3 - int(np.floor(np.log10(abs(composite_value)))) - 1)
-            
-            # Return the extracted audio features
-            return composite_value
-        else:
-            # If track_features is empty or has no elements, return None for all audio features
+def get_audio_features(sp, track_ids, cache=None):
+    """
+    Retrieves the audio features of many tracks using as few API calls as possible.
+
+    Tracks found in the feature cache are not requested again. The 'audio_features' endpoint
+    accepts at most 100 IDs per request, so the remaining IDs are de-duplicated and requested
+    in batches of that size.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        track_ids (list): The IDs of the tracks to retrieve features for.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+    Returns:
+        dict: A dictionary mapping each track ID to its audio features, or None if it has none.
+    """
+    # Remove duplicate and missing IDs (e.g. local files) while keeping the original order
+    unique_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+    features = cache.get_many(unique_ids) if cache is not None else {}
+
+    # Only request the tracks that were not found in the cache
+    missing_ids = [track_id for track_id in unique_ids if track_id not in features]
+    fetched = {}
+
+    for start in range(0, len(missing_ids), AUDIO_FEATURES_BATCH_SIZE):
+        batch = missing_ids[start:start + AUDIO_FEATURES_BATCH_SIZE]
+        # One API call resolves up to 100 tracks, returned in the same order as requested.
+        # Errors are not swallowed here: a failed batch would otherwise be written as missing values.
+        with stage('api.audio_features'):
+            batch_features = sp.audio_features(batch) or []
+        count('tracks.features_fetched', len(batch))
+
+        for idx, track_id in enumerate(batch):
+            fetched[track_id] = batch_features[idx] if idx < len(batch_features) else None
+
+    if cache is not None:
+        cache.put_many(fetched)
+    features.update(fetched)
+
+    return features
+
+
+def get_composite_values(sp, track_ids, cache=None):
+    """
+    Calculates the composite value of many tracks with batched audio feature requests.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        track_ids (list): The IDs of the tracks to calculate composite values for.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+    Returns:
+        list: The composite values in the same order as track_ids, None where a track has no features.
+    """
+    features = get_audio_features(sp, track_ids, cache)
+
+    # Build one table of the tracks that have features and compute their composites in a single pass
+    with_features = [idx for idx, track_id in enumerate(track_ids) if features.get(track_id)]
+    values = [None] * len(track_ids)
+    if with_features:
+        with stage('composite'):
+            table = pd.DataFrame([features[track_ids[idx]] for idx in with_features])
+            for idx, value in zip(with_features, composite_values(table)):
+                values[idx] = None if np.isnan(value) else value
+
+    for track_id, value in zip(track_ids, values):
+        if value is None:
+            # Keep the same message as the per-track lookup for tracks with no features
             print(f"Track with ID {track_id} has no track features")
-            return None
-    except Exception as e:
-        # Handle exceptions that may occur during the API call
-        print(f"Error fetching features for track with ID {track_id}: {e}")
-        return None
 
+    return values
 
-def get_playlist_tracks(sp, playlist_id):
+
+def get_track_page(sp, playlist_id, offset, cache=None, with_composite=True):
+    """
+    Retrieves one page of tracks from a playlist and resolves their composite values.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist to retrieve tracks from.
+        offset (int): The index of the first track on the page.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        with_composite (bool): Whether to resolve the composite values of the tracks.
+    Returns:
+        tuple: The tracks on the page as a TrackTable and the total number of tracks in the playlist.
+    """
+    # Retrieve tracks from the specified playlist using the Spotify API with pagination
+    with stage('api.playlist_tracks'):
+        results = sp.playlist_tracks(playlist_id, fields=PLAYLIST_TRACK_FIELDS, offset=offset, limit=PAGE_SIZE)
+
+    # Extract the typed columns of every track on the page in one pass
+    page = TrackTable.from_items(results['items'])
+    count('tracks.paged', len(page))
+    if not with_composite:
+        return page, results.get('total')
+
+    # Resolve the composite values of the whole page with batched feature requests
+    page.set_composites(get_composite_values(sp, page.track_ids(), cache))
+
+    return page, results.get('total')
+
+
+def iter_playlist_pages(sp, playlist_id, cache=None, concurrency=1, with_composite=True):
+    """
+    Yields the pages of track details of a playlist in playlist order.
+
+    The first page tells us the total number of tracks, so the remaining pages are known up
+    front and no request is wasted on an empty page. With a concurrency above 1 the remaining
+    pages are fetched by a bounded thread pool and yielded in their original order; at most
+    2 x concurrency pages are fetched ahead of the one being consumed.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist to retrieve tracks from.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        concurrency (int): The maximum number of pages fetched at the same time.
+        with_composite (bool): Whether to resolve the composite values of the tracks.
+    Yields:
+        TrackTable: The tracks of each page.
+    """
+    page, total = get_track_page(sp, playlist_id, 0, cache, with_composite)
+    if not page:
+        return
+    yield page
+
+    if total is None:
+        # The total was not returned, so walk the pages until an empty one comes back
+        offset = PAGE_SIZE
+        while True:
+            page, _ = get_track_page(sp, playlist_id, offset, cache, with_composite)
+            if not page:
+                return
+            yield page
+            offset += PAGE_SIZE
+
+    offsets = range(PAGE_SIZE, total, PAGE_SIZE)
+
+    if concurrency <= 1:
+        for offset in offsets:
+            yield get_track_page(sp, playlist_id, offset, cache, with_composite)[0]
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Keep a bounded window of pages in flight so memory does not grow with the playlist
+        pending = deque()
+        for offset in offsets:
+            pending.append(executor.submit(get_track_page, sp, playlist_id, offset, cache, with_composite))
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft().result()[0]
+
+        while pending:
+            yield pending.popleft().result()[0]
+
+
+def get_playlist_tracks(sp, playlist_id, cache=None, concurrency=1):
     """
     Retrieves all tracks from a specified Spotify playlist and extracts relevant information.
     
+    Audio features are requested once per page of tracks rather than once per track.
+
     Args:
         sp (spotipy.Spotify): An authenticated Spotify API object.
         playlist_id (str): The ID of the playlist to retrieve tracks from.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        concurrency (int): The maximum number of pages fetched at the same time.
         
     Returns:
-        list: A list of dictionaries containing track details (Name, Artist, DateAdded, Energy, Danceability, Tempo, Loudness, Valence).
+        TrackTable: The track details (Name, Artist, ID, DateAdded, Composite Value) of every track.
     """
-    tracks = []  # Initialize an empty list to store track information
-    offset = 0   # Initialize the starting offset for pagination
-    limit = 100  # Set the maximum number of tracks to retrieve per API call
-    
-    while True:
-        # Retrieve tracks from the specified playlist using the Spotify API with pagination
-        results = sp.playlist_tracks(playlist_id, fields='items(track(name, artists, id), added_at)', offset=offset, limit=limit)
-        
-        # Break the loop if there are no more tracks (i.e., the 'items' list is empty)
-        if not results['items']:
-            break
-        
-        # Extract relevant information for each track
-        for item in results['items']:
-            track = item['track']
-            
-            # Create a dictionary containing track information
-            track_data = {
-                'Name': track['name'],
-                'Artist': ', '.join([artist['name'] for artist in track['artists']]),
-                'ID': track['id'],
-                'DateAdded': item['added_at'],
-                'Composite Value': get_feature_composite_value(sp, track['id'])
-            }
-            
-            # Add track data to the list of tracks
-            tracks.append(track_data)
-        
-        offset += limit  # Increment the offset to fetch the next set of tracks in the next iteration
-        
-    return tracks  # Return the list of track details
+    # Combine the pages of typed columns into one table
+    return TrackTable.concat(list(iter_playlist_pages(sp, playlist_id, cache, concurrency)))
 
 
 
 
-def create_csv(sp, playlist_id):
+def create_csv(sp, playlist_id, cache=None, concurrency=1):
     """
-    Creates a CSV file containing track details from a specified Spotify playlist.
+    Creates the playlist file containing track details from a specified Spotify playlist.
     
     Args:
         sp (spotipy.Spotify): An authenticated Spotify API object.
-        playlist_id (str): The ID of the playlist to retrieve tracks from and create the CSV file.
+        playlist_id (str): The ID of the playlist to retrieve tracks from and create the playlist file.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        concurrency (int): The maximum number of pages fetched at the same time.
     """
-    # Retrieve tracks from the specified playlist using the get_playlist_tracks function
-    tracks = get_playlist_tracks(sp, playlist_id)
-    
-    # Create a DataFrame from the track details
-    df = pd.DataFrame(tracks)
+    create_csv_at(sp, playlist_id, DEFAULT_PLAYLIST_PATH, cache, concurrency)
+
+
+def create_csv_at(sp, playlist_id, path, cache=None, concurrency=1):
+    """
+    Creates a playlist file at the given path containing track details from a specified Spotify playlist.
+
+    The format of the file (CSV, Parquet or Feather) is chosen by its extension. Tracks are
+    written page by page rather than collected first. The playlist's snapshot ID is recorded
+    with the file, so the next sync_csv of the same playlist only fetches what changed.
     
-    # Write the DataFrame to a CSV file named 'playlist.csv'
-    df.to_csv('playlist.csv', index=False)
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist to retrieve tracks from and create the playlist file.
+        path (str): The path of the playlist file to create.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        concurrency (int): The maximum number of pages fetched at the same time.
+    """
+    # The snapshot is read before paging, so changes made during the export are picked up by the next sync
+    snapshot_id = sp.playlist(playlist_id, fields='snapshot_id').get('snapshot_id')
+
+    # Write each page of tracks to the playlist file as soon as it arrives, so at most one page
+    # is held, or 2 x concurrency pages in flight when fetched concurrently, plus the artist index
+    # the writer keeps until it closes. A failed run leaves any existing file as it was and keeps
+    # the pages written so far in a '.partial' file
+    with PlaylistWriter(path) as writer:
+        for page in iter_playlist_pages(sp, playlist_id, cache, concurrency):
+            writer.write(page)
+    write_sync_state(path, playlist_id, snapshot_id)
     
-    # Print a message to indicate successful creation of the CSV file
-    print("Playlist CSV file created")
+    # Print a message to indicate successful creation of the playlist file
+    print(f"Playlist file '{path}' created with {writer.rows_written} tracks")
+
+    if cache is not None:
+        # Report how many tracks were served by the feature cache
+        print(f"Feature cache: {cache.hits} hits, {cache.misses} misses")
+
+
+def read_sync_state(path):
+    """
+    Reads the playlist ID and snapshot ID recorded by the last sync of a playlist file.
+
+    Args:
+        path (str): The path of the playlist file.
+    Returns:
+        dict: The recorded 'playlist_id' and 'snapshot_id', empty if the file was never synced.
+    """
+    try:
+        with open(f"{path}.sync.json", 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_sync_state(path, playlist_id, snapshot_id):
+    """
+    Records the playlist ID and snapshot ID a playlist file was synced to.
+
+    Args:
+        path (str): The path of the playlist file.
+        playlist_id (str): The ID of the synced playlist.
+        snapshot_id (str): The snapshot ID of the playlist at the time of the sync.
+    """
+    with open(f"{path}.sync.json", 'w') as file:
+        json.dump({'playlist_id': playlist_id, 'snapshot_id': snapshot_id}, file)
+
+
+def sync_csv(sp, playlist_id, path=None, cache=None, concurrency=1):
+    """
+    Brings an existing playlist file up to date with a Spotify playlist.
+
+    Tracks are matched to the existing rows by ID and DateAdded, so only tracks added since the
+    last run have their audio features fetched and removed tracks are dropped. If the playlist's
+    snapshot ID has not changed since the last sync, nothing is fetched at all. The file is
+    rewritten atomically in playlist order, exactly as create_csv would write it.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist to sync.
+        path (str): The path of the playlist file to sync, DEFAULT_PLAYLIST_PATH if None.
+        cache (FeatureCache): An optional cache of previously fetched audio features.
+        concurrency (int): The maximum number of pages fetched at the same time.
+    """
+    path = path or DEFAULT_PLAYLIST_PATH
+    snapshot_id = sp.playlist(playlist_id, fields='snapshot_id').get('snapshot_id')
+
+    try:
+        existing = load_playlist(path, columns=['ID', 'DateAdded', 'Composite Value'])
+    except FileNotFoundError:
+        existing = None
+
+    if existing is None or read_sync_state(path).get('playlist_id') != playlist_id:
+        # Nothing to diff against, so fall back to a full export, which records the snapshot itself
+        create_csv_at(sp, playlist_id, path, cache, concurrency)
+        return
+
+    if snapshot_id is not None and read_sync_state(path).get('snapshot_id') == snapshot_id:
+        print("Playlist file is already up to date")
+        return
+
+    # Index the composite values already in the file by track ID and date added
+    known_values = dict(zip(zip(existing['ID'], existing['DateAdded']), existing['Composite Value']))
+
+    # Page through the playlist without fetching any audio features
+    tracks = TrackTable.concat(list(iter_playlist_pages(sp, playlist_id, cache, concurrency, with_composite=False)))
+    track_ids = tracks.track_ids()
+    track_dates = tracks.to_dataframe(['DateAdded'])['DateAdded']
+
+    # Reuse the composite values of known tracks and collect the new ones
+    composites = [None] * len(tracks)
+    new_positions = []
+    for position, key in enumerate(zip(track_ids, track_dates)):
+        if key in known_values:
+            composites[position] = known_values.pop(key)
+        else:
+            new_positions.append(position)
+
+    # Only the new tracks need their audio features fetched
+    composite_values = get_composite_values(sp, [track_ids[position] for position in new_positions], cache)
+    for position, composite_value in zip(new_positions, composite_values):
+        composites[position] = composite_value
+    tracks.set_composites(composites)
+
+    artists = ArtistIndex()
+    artists.add_table(tracks)
+
+    # If tracks were only added after the existing ones, extend the existing statistics and rollup with the new tracks
+    stats = rollup = None
+    kept = len(tracks) - len(new_positions)
+    existing_stats = read_stats(path)
+    existing_rollup = read_rollup(path)
+    if not known_values and track_ids[:kept] == existing['ID'].tolist():
+        new_df = tracks.take(range(kept, len(tracks))).to_dataframe()
+        if existing_stats is not None:
+            stats = existing_stats.merge(PlaylistStats.from_dataframe(new_df, artists, exact=False))
+        if existing_rollup is not None:
+            rollup = existing_rollup.merge(DateRollup.from_dataframe(new_df, artists))
+
+    save_playlist(tracks.to_dataframe(), path, stats, artists, rollup)
+    write_sync_state(path, playlist_id, snapshot_id)
+
+    # Any known tracks left over are no longer in the playlist
+    print(f"Playlist file synced: {len(new_positions)} tracks added, {len(known_values)} tracks removed")
 
 
 
 class PlaylistCSVManager:
-    def __init__(self, spotifyObject):
+    def __init__(self, spotifyObject, cache=None, concurrency=DEFAULT_PAGE_CONCURRENCY):
         """
         Initializes a PlaylistCSVManager instance with a Spotify API object.
         
         Args:
             spotifyObject (spotipy.Spotify): An authenticated Spotify API object.
+            cache (FeatureCache): An optional cache of previously fetched audio features.
+            concurrency (int): The maximum number of playlist pages fetched at the same time.
         """
         self.spotifyObject = spotifyObject  # Store the Spotify API object in the instance
+        self.cache = cache  # Store the audio feature cache in the instance
+        self.concurrency = concurrency  # Store the page fetching concurrency in the instance
     
     def create_playlist_csv(self):
         """
-        Creates a CSV file containing track details from a user-selected playlist.
+        Creates the playlist file containing track details from a user-selected playlist.
         """
         # Call the choose_playlist function to allow the user to pick a playlist
         selected_playlist_id = choose_playlist(self.spotifyObject)
         
         # Call the create_csv function to create the CSV file using the selected playlist ID
-        create_csv(self.spotifyObject, selected_playlist_id)
+        create_csv(self.spotifyObject, selected_playlist_id, self.cache, self.concurrency)
+
+    def clear_feature_cache(self):
+        """
+        Removes every track from the audio feature cache so features are fetched again.
+        """
+        if self.cache is None:
+            print("No audio feature cache configured")
+            return
+
+        removed = self.cache.invalidate()
+        print(f"Removed {removed} tracks from the audio feature cache")
+
+    def sync_playlist_csv(self):
+        """
+        Brings the playlist file up to date with a user-selected playlist, fetching only new tracks.
+        """
+        # Call the choose_playlist function to allow the user to pick a playlist
+        selected_playlist_id = choose_playlist(self.spotifyObject)
+
+        # Call the sync_csv function to update the CSV file using the selected playlist ID
+        sync_csv(self.spotifyObject, selected_playlist_id, DEFAULT_PLAYLIST_PATH, self.cache, self.concurrency)
+
+    def export_all_playlists(self):
+        """
+        Exports every playlist the user owns into the consolidated playlist store.
+        """
+        # Imported here as bulk_export builds on the functions in this module
+        from bulk_export import bulk_export
+        bulk_export(self.spotifyObject, cache=self.cache, concurrency=self.concurrency)
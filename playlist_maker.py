@@ -1,47 +1,372 @@
-import pandas as pd
-import spotipy
+import os
+import json
+import hashlib
+from spotipy.exceptions import SpotifyException
+from feature_cache import FeatureCache
+from playlist_csv_manager import choose_playlist, iter_playlist_pages
+from playlist_storage import DEFAULT_PLAYLIST_PATH, load_tracks
+from similarity_index import DEFAULT_SIMILAR_SIZE, load_similarity_index
 
-def csv_playlist(sp):
+# The maximum number of tracks the playlist add, replace and reorder endpoints accept per request
+PLAYLIST_ITEMS_BATCH_SIZE = 100
+
+# The file recording the progress of a publish, so an interrupted run can resume
+CHECKPOINT_PATH = 'publish_checkpoint.json'
+
+
+def read_checkpoint(checkpoint_path):
     """
-    Create a new Spotify playlist and add songs from a CSV file.
-    
+    Reads the progress of an interrupted publish.
+
+    Args:
+        checkpoint_path (str): The path of the checkpoint file.
+    Returns:
+        dict: The checkpoint, empty if there is no interrupted publish.
+    """
+    try:
+        with open(checkpoint_path, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    """
+    Records the progress of a publish atomically.
+
+    Args:
+        checkpoint_path (str): The path of the checkpoint file.
+        checkpoint (dict): The playlist ID, track fingerprint and number of tracks added so far.
+    """
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(temp_path, checkpoint_path)
+
+
+def tracks_fingerprint(track_ids):
+    """
+    Identifies a list of tracks, so a checkpoint is only resumed for the same tracks in the same order.
+    """
+    return hashlib.sha1('\n'.join(track_ids).encode()).hexdigest()
+
+
+def get_playlist_track_ids(sp, playlist_id):
+    """
+    Retrieves the IDs of every track in a playlist, in playlist order.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist.
+    Returns:
+        list: The track IDs.
+    """
+    return [
+        track_id
+        for page in iter_playlist_pages(sp, playlist_id, with_composite=False)
+        for track_id in page.track_ids()
+    ]
+
+
+def add_tracks_in_chunks(sp, playlist_id, track_ids, start=0, on_chunk=None):
+    """
+    Appends tracks to a playlist in order, at most 100 per request.
+
+    Each chunk is appended only after the previous one has been added, since appends land at
+    the end of the playlist and their order must be preserved.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist.
+        track_ids (list): The IDs of the tracks to add.
+        start (int): The index of the first track to add, to skip tracks added by an earlier run.
+        on_chunk (callable): Called with the number of tracks added so far after each chunk.
+    """
+    for offset in range(start, len(track_ids), PLAYLIST_ITEMS_BATCH_SIZE):
+        chunk = track_ids[offset:offset + PLAYLIST_ITEMS_BATCH_SIZE]
+        sp.playlist_add_items(playlist_id, chunk)
+        if on_chunk is not None:
+            on_chunk(offset + len(chunk))
+
+
+def publish_playlist(sp, playlist_name, track_ids, checkpoint_path=CHECKPOINT_PATH):
+    """
+    Creates a new playlist containing the given tracks, resuming an interrupted run if there is one.
+
+    Progress is checkpointed after every chunk. On resume the playlist's own track count is used
+    to find where to continue, so a chunk added just before an interruption is never added twice.
+    A resumed playlist is renamed if a different name is given, and a new playlist is created if
+    the interrupted one has been deleted since.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_name (str): The name of the new playlist.
+        track_ids (list): The IDs of the tracks to add, in order.
+        checkpoint_path (str): The path of the checkpoint file.
+    Returns:
+        str: The ID of the playlist.
+    """
+    fingerprint = tracks_fingerprint(track_ids)
+    checkpoint = read_checkpoint(checkpoint_path)
+
+    added = None
+    if checkpoint.get('fingerprint') == fingerprint:
+        try:
+            added = sp.playlist(checkpoint['playlist_id'], fields='tracks.total')['tracks']['total']
+        except SpotifyException as e:
+            if e.http_status != 404:
+                raise
+            print(f"Playlist \"{checkpoint['name']}\" of the interrupted publish no longer exists, starting again")
+
+    if added is not None:
+        # Resume the interrupted publish of the same tracks
+        playlist_id = checkpoint['playlist_id']
+        if checkpoint['name'] != playlist_name:
+            sp.playlist_change_details(playlist_id, name=playlist_name)
+            checkpoint['name'] = playlist_name
+            write_checkpoint(checkpoint_path, checkpoint)
+        print(f"Resuming publish of playlist \"{playlist_name}\" after {added} tracks")
+    else:
+        # Create a new playlist
+        playlist_id = sp.user_playlist_create(sp.current_user()['id'], playlist_name, public=True)['id']
+        added = 0
+        checkpoint = {'playlist_id': playlist_id, 'name': playlist_name, 'fingerprint': fingerprint, 'added': 0}
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    def record_progress(added):
+        checkpoint['added'] = added
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    # Add songs to the new playlist
+    add_tracks_in_chunks(sp, playlist_id, track_ids, added, record_progress)
+
+    # The publish is complete, so there is nothing left to resume
+    os.remove(checkpoint_path)
+    return playlist_id
+
+
+def plan_reorder_moves(current, target, max_moves=None):
+    """
+    Plans the reorder requests that turn one ordering of tracks into another.
+
+    Walking the target order, each misplaced track is moved into place together with the run of
+    tracks that already follow it in the target order, so blocks move in a single request.
+
+    Args:
+        current (list): The track IDs in their current order.
+        target (list): The same track IDs in the desired order.
+        max_moves (int): Stop planning once more moves than this are needed.
+    Returns:
+        list: (range_start, insert_before, range_length) moves, or None if more than max_moves are needed.
+    """
+    current = list(current)
+    moves = []
+    position = 0
+
+    while position < len(target):
+        if current[position] == target[position]:
+            position += 1
+            continue
+
+        # Find the misplaced track and the run of tracks after it that are also in target order
+        range_start = current.index(target[position], position + 1)
+        range_length = 1
+        while (range_start + range_length < len(current) and position + range_length < len(target)
+               and current[range_start + range_length] == target[position + range_length]):
+            range_length += 1
+
+        moves.append((range_start, position, range_length))
+        if max_moves is not None and len(moves) > max_moves:
+            return None
+
+        # Apply the move: the block is taken out and inserted before the current position
+        block = current[range_start:range_start + range_length]
+        del current[range_start:range_start + range_length]
+        current[position:position] = block
+        position += range_length
+
+    return moves
+
+
+def reorder_playlist(sp, playlist_id, track_ids):
+    """
+    Changes the order of an existing playlist in place to match the given tracks.
+
+    If the playlist holds the same tracks, the fewer of reorder requests and replace requests is
+    used; otherwise the playlist's tracks are replaced, 100 per request.
+
+    Tracks without an ID, such as local files, cannot be added back once replaced. They stay at
+    their positions while the other tracks are reordered around them, and a playlist holding
+    them is never replaced.
+
     Args:
         sp (spotipy.Spotify): An authenticated Spotify API object.
+        playlist_id (str): The ID of the playlist to reorder.
+        track_ids (list): The IDs of the tracks in the desired order.
+    Returns:
+        int: The number of requests made to change the playlist.
+    Raises:
+        ValueError: If the playlist holds tracks without an ID and other tracks than track_ids.
+    """
+    current = get_playlist_track_ids(sp, playlist_id)
+    local_count = current.count(None)
+
+    # Replacing costs one request per 100 tracks
+    replace_requests = max(1, -(-len(track_ids) // PLAYLIST_ITEMS_BATCH_SIZE))
+
+    moves = None
+    if sorted(track_id for track_id in current if track_id is not None) == sorted(track_ids):
+        # Each track without an ID gets a placeholder of its own, at the same position in the target
+        current = [('local', position) if track_id is None else track_id for position, track_id in enumerate(current)]
+        remaining = iter(track_ids)
+        target = [track_id if isinstance(track_id, tuple) else next(remaining) for track_id in current]
+        moves = plan_reorder_moves(current, target, max_moves=None if local_count else replace_requests)
+    elif local_count:
+        raise ValueError(f"The playlist holds {local_count} tracks without an ID, such as local files, which "
+                         "replacing its tracks would remove; publish the playlist file as a new playlist instead")
+
+    if moves is not None:
+        snapshot_id = None
+        for range_start, insert_before, range_length in moves:
+            snapshot_id = sp.playlist_reorder_items(
+                playlist_id, range_start, insert_before, range_length=range_length, snapshot_id=snapshot_id
+            )['snapshot_id']
+        return len(moves)
+
+    # Replace the first 100 tracks, which removes the rest, then append the remaining chunks
+    sp.playlist_replace_items(playlist_id, track_ids[:PLAYLIST_ITEMS_BATCH_SIZE])
+    add_tracks_in_chunks(sp, playlist_id, track_ids, PLAYLIST_ITEMS_BATCH_SIZE)
+    return replace_requests
+
+
+def load_track_ids():
+    """
+    Reads the track IDs of the playlist file, leaving out tracks without an ID such as local files.
+
+    Returns:
+        list: The track IDs in file order, or None if the playlist file does not exist.
     """
     try:
-        df = pd.read_csv('playlist.csv', parse_dates=['DateAdded'])  # Read the CSV file into a DataFrame
+        tracks = load_tracks(columns=['ID'])  # Read only the track IDs of the playlist file
     except FileNotFoundError:
-        print(f"File 'playlist.csv' not found.\nCreate a Playlist CSV File first")
+        print(f"File '{DEFAULT_PLAYLIST_PATH}' not found.\nCreate a Playlist CSV File first")
+        return None
+    return [track_id for track_id in tracks.track_ids() if track_id]
+
+
+def csv_playlist(sp):
+    """
+    Create a new Spotify playlist and add songs from the playlist file.
+
+    An interrupted run is resumed without adding any track twice.
+    
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+    """
+    track_ids = load_track_ids()
+    if track_ids is None:
         return
     
-    playlist_name = input('Enter the name of the new playlist: ')
-    # Create a new playlist
-    playlist = sp.user_playlist_create(sp.username, playlist_name, public=True)
+    checkpoint = read_checkpoint(CHECKPOINT_PATH)
+    if checkpoint.get('fingerprint') == tracks_fingerprint(track_ids):
+        # The name was chosen by the interrupted run
+        playlist_name = checkpoint['name']
+    else:
+        playlist_name = input('Enter the name of the new playlist: ')
 
-    # Add songs to the new playlist
-    sp.playlist_add_items(playlist['id'], df['ID'].tolist())
+    publish_playlist(sp, playlist_name, track_ids)
 
     print(f'Playlist "{playlist_name}" created and songs added successfully!')
 
 
-def choose_make_playlist(sp):
+def reorder_existing_playlist(sp):
+    """
+    Reorder one of the user's playlists in place to match the order of the playlist file.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+    """
+    track_ids = load_track_ids()
+    if track_ids is None:
+        return
+
+    playlist_id = choose_playlist(sp)
+    try:
+        requests_made = reorder_playlist(sp, playlist_id, track_ids)
+    except ValueError as e:
+        print(e)
+        return
+
+    print(f'Playlist reordered with {requests_made} requests')
+
+
+def similar_track_ids(cache, seed_ids, size=DEFAULT_SIMILAR_SIZE, rebuild_index=False):
+    """
+    Chooses tracks with audio features like those of the seed tracks, from every exported track.
+
+    Args:
+        cache (FeatureCache): The cache of audio features of every exported track.
+        seed_ids (list): The IDs of the seed tracks, in playlist order.
+        size (int): The number of tracks to choose.
+        rebuild_index (bool): Whether to rebuild the similarity index even if it looks current.
+    Returns:
+        list: The IDs of the chosen tracks, ordered to follow the seed tracks.
+    """
+    index = load_similarity_index(cache, rebuild=rebuild_index)
+    return index.similar_tracks(seed_ids, size)
+
+
+def similar_playlist(sp, cache):
+    """
+    Create a new Spotify playlist of tracks like the ones in the playlist file.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated Spotify API object.
+        cache (FeatureCache): The cache of audio features of every exported track.
+    """
+    track_ids = load_track_ids()
+    if track_ids is None:
+        return
+
+    size = input(f'Enter the number of tracks (default {DEFAULT_SIMILAR_SIZE}): ').strip()
+    similar_ids = similar_track_ids(cache, track_ids, int(size) if size else DEFAULT_SIMILAR_SIZE)
+    if not similar_ids:
+        print("None of the playlist's tracks have cached audio features.\nCreate a Playlist CSV File first")
+        return
+
+    playlist_name = input('Enter the name of the new playlist: ')
+    publish_playlist(sp, playlist_name, similar_ids)
+
+    print(f'Playlist "{playlist_name}" created with {len(similar_ids)} similar songs!')
+
+
+def choose_make_playlist(sp, cache=None):
     """
     Display a menu for choosing actions related to playlist creation from a CSV file.
     
     Args:
         sp (spotipy.Spotify): An authenticated Spotify API object.
+        cache (FeatureCache): The audio feature cache similar tracks are found in, the default cache if None.
     """
     while True:
         print(
             "Pick Function" +
             "\n0 - Exit to main menu" +
-            "\n1 - Make Playlist from CSV file"
+            "\n1 - Make Playlist from CSV file" +
+            "\n2 - Reorder existing Playlist to match CSV file" +
+            "\n3 - Make Playlist like the CSV file"
         )
         try:
             user_input = int(input("Enter Your Choice: "))
             # Make Playlist from CSV file
             if user_input == 1:
                 csv_playlist(sp)
+            # Reorder existing Playlist to match CSV file
+            elif user_input == 2:
+                reorder_existing_playlist(sp)
+            # Make Playlist like the CSV file
+            elif user_input == 3:
+                similar_playlist(sp, cache if cache is not None else FeatureCache())
             # Exit the console
             elif user_input == 0:
                 return
@@ -53,17 +378,19 @@ def choose_make_playlist(sp):
 
 
 class PlaylistMaker:
-    def __init__(self, spotifyObject):
+    def __init__(self, spotifyObject, featureCache=None):
         """
         Initializes a PlaylistMaker instance with a Spotify API object.
         
         Args:
             spotifyObject (spotipy.Spotify): An authenticated Spotify API object.
+            featureCache (FeatureCache): The audio feature cache similar tracks are found in.
         """
         self.spotifyObject = spotifyObject  # Store the Spotify API object in the instance
+        self.featureCache = featureCache
 
     def make_playlist(self):
         """
         Calls the choose_make_playlist function to initiate the process of creating a playlist from a CSV file.
         """
-        choose_make_playlist(self.spotifyObject)  # Call the choose_make_playlist function with the stored Spotify API object
+        choose_make_playlist(self.spotifyObject, self.featureCache)  # Call the choose_make_playlist function with the stored Spotify API object
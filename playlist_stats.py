@@ -0,0 +1,473 @@
+import os
+import json
+import base64
+import numpy as np
+import pandas as pd
+from artist_index import split_artists
+
+# The number of index bits of the count-distinct sketches; 2^14 registers give about 0.8% error
+SKETCH_PRECISION = 14
+
+# The number of equal-width bins over 0.0 - 1.0 used to estimate composite value quantiles
+HISTOGRAM_BINS = 10000
+
+# The standard error of a count-distinct sketch's estimate, relative to the true count
+SKETCH_ERROR = 1.04 / np.sqrt(1 << SKETCH_PRECISION)
+
+# The quantiles of the composite values recorded exactly when every track is at hand
+EXACT_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def stats_path(path):
+    """
+    Returns the path of the summary statistics sidecar of a playlist file.
+    """
+    return f"{path}.stats.json"
+
+
+def hash_values(values):
+    """
+    Returns stable 64-bit hashes of the non-missing values of a Series, the same in every process.
+    """
+    return pd.util.hash_pandas_object(values.dropna().astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+def round_estimate(estimate):
+    """
+    Rounds a count-distinct estimate to the precision of its sketch, two standard errors.
+
+    Args:
+        estimate (int): The estimated count.
+    Returns:
+        int: The estimate rounded to the power of ten below its margin of error.
+    """
+    margin = 2 * SKETCH_ERROR * estimate
+    if margin < 1:
+        return estimate
+    step = 10 ** int(np.floor(np.log10(margin)))
+    return int(round(estimate / step) * step)
+
+
+def credited_artists(df, artists=None):
+    """
+    Returns the lookup key of every credited artist of playlist data, or None if it has no artists.
+
+    Args:
+        df (pd.DataFrame): The playlist data.
+        artists (ArtistIndex): The artists of the tracks, or None to split the joined Artist column.
+    """
+    if artists is not None and 'ID' in df:
+        return artists.artist_ids_of(df['ID'])
+    if 'Artist' in df:
+        return split_artists(df['Artist'])
+    return None
+
+
+def exact_summary(composite_values, unique_names, unique_artists):
+    """
+    Returns the figures PlaylistStats records exactly when every track is at hand.
+
+    Args:
+        composite_values (np.ndarray): The composite value of every track; missing values are ignored.
+        unique_names (int): The number of distinct track names.
+        unique_artists (int): The number of distinct credited artists.
+    Returns:
+        dict: The quartiles of the composite values, keyed by quantile, and the distinct counts.
+    """
+    values = np.asarray(composite_values, dtype=float)
+    values = values[~np.isnan(values)]
+    return {
+        # Linear interpolation between the two closest values, as pandas computes quantiles
+        'quantiles': {str(q): float(np.quantile(values, q)) for q in EXACT_QUANTILES} if len(values) else {},
+        'unique_names': int(unique_names),
+        'unique_artists': int(unique_artists)
+    }
+
+
+def exact_summary_of(df, artists=None):
+    """
+    Returns the exact figures of playlist data, see exact_summary.
+
+    Args:
+        df (pd.DataFrame): The playlist data.
+        artists (ArtistIndex): The artists of the tracks, or None to split the joined Artist column.
+    """
+    credited = credited_artists(df, artists)
+    return exact_summary(
+        df['Composite Value'].astype(float).to_numpy() if 'Composite Value' in df else [],
+        df['Name'].nunique() if 'Name' in df else 0,
+        credited.nunique() if credited is not None else 0
+    )
+
+
+def _bit_length(values):
+    """
+    Returns the number of bits needed to represent each value of a uint64 array.
+    """
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        # Binary search for the highest set bit, halving the remaining width each step
+        mask = values >= (np.uint64(1) << np.uint64(shift))
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+class CountDistinctSketch:
+    """
+    A HyperLogLog sketch estimating the number of distinct values seen.
+
+    Sketches of different batches merge by taking the register-wise maximum, so distinct counts
+    can be updated incrementally and combined across playlists without the original values.
+    """
+
+    def __init__(self, registers=None, precision=SKETCH_PRECISION):
+        """
+        Initializes a CountDistinctSketch instance.
+
+        Args:
+            registers (np.ndarray): The registers of an existing sketch, or None for an empty one.
+            precision (int): The number of hash bits used to pick a register.
+        """
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        """
+        Adds the non-missing values of a Series to the sketch.
+
+        Args:
+            values (pd.Series): The values to add.
+        """
+        hashes = hash_values(values)
+        if not len(hashes):
+            return
+
+        remaining_bits = 64 - self.precision
+        register_index = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << remaining_bits) - 1)
+
+        # The rank is the position of the first set bit of the remaining hash bits
+        rank = (remaining_bits - _bit_length(remainder) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, register_index, rank)
+
+    def merge(self, other):
+        """
+        Returns a sketch of the values seen by this sketch and another.
+        """
+        return CountDistinctSketch(np.maximum(self.registers, other.registers), self.precision)
+
+    def estimate(self):
+        """
+        Estimates the number of distinct values seen.
+
+        Returns:
+            int: The estimated count.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(float)))
+
+        # Small counts are estimated more accurately from the number of empty registers
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': base64.b64encode(self.registers.tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data):
+        registers = np.frombuffer(base64.b64decode(data['registers']), dtype=np.uint8).copy()
+        return cls(registers, data['precision'])
+
+
+class PlaylistStats:
+    """
+    Summary statistics of playlist data that can be computed in one pass and merged.
+
+    Counts, mean and variance of the composite values are merged exactly (Chan's parallel
+    algorithm); quantiles come from a fixed histogram and distinct counts from HyperLogLog
+    sketches, both of which also merge, so appending tracks or combining playlists never
+    needs the original rows.
+
+    Statistics computed from every track at once also record the exact quartiles and distinct
+    counts, which are reported instead of the estimates. Merged statistics only have the
+    estimates, unless the exact figures are recomputed from the merged tracks.
+    """
+
+    def __init__(self):
+        self.rows = 0                    # Number of tracks
+        self.composite_count = 0         # Number of tracks with a composite value
+        self.composite_mean = 0.0
+        self.composite_m2 = 0.0          # Sum of squared differences from the mean
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.highest = None              # Name, Artist and Composite Value of the highest track
+        self.lowest = None               # Name, Artist and Composite Value of the lowest track
+        self.earliest_date = None
+        self.latest_date = None
+        self.names = CountDistinctSketch()
+        self.artists = CountDistinctSketch()
+        self.exact = None                # The exact figures of exact_summary, or None if only estimates are known
+
+    @classmethod
+    def from_dataframe(cls, df, artists=None, exact=True):
+        """
+        Computes the statistics of playlist data in one pass over each column.
+
+        Args:
+            df (pd.DataFrame): The playlist data; columns it lacks are left out of the statistics.
+            artists (ArtistIndex): The artists of the tracks, or None to split the joined Artist column.
+            exact (bool): Also record the exact quartiles and distinct counts, which is wasted work
+                for a batch that is only merged into other statistics.
+        Returns:
+            PlaylistStats: The statistics.
+        """
+        stats = cls()
+        stats.rows = len(df)
+
+        if 'Composite Value' in df:
+            composite = df['Composite Value'].astype(float)
+            values = composite.dropna().to_numpy()
+            stats.composite_count = len(values)
+            if len(values):
+                stats.composite_mean = float(values.mean())
+                stats.composite_m2 = float(np.sum((values - stats.composite_mean) ** 2))
+                bins = np.clip((values * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+                stats.histogram = np.bincount(bins, minlength=HISTOGRAM_BINS).astype(np.int64)
+                stats.highest = stats._track(df, composite.idxmax())
+                stats.lowest = stats._track(df, composite.idxmin())
+
+        if 'DateAdded' in df and df['DateAdded'].notna().any():
+            dates = pd.to_datetime(df['DateAdded'], utc=True)
+            stats.earliest_date = dates.min()
+            stats.latest_date = dates.max()
+
+        if 'Name' in df:
+            stats.names.add(df['Name'])
+        # Each credited artist is counted on its own, not each combination of artists
+        credited = credited_artists(df, artists)
+        if credited is not None:
+            stats.artists.add(credited)
+
+        if exact:
+            stats.exact = exact_summary(
+                df['Composite Value'].astype(float).to_numpy() if 'Composite Value' in df else [],
+                df['Name'].nunique() if 'Name' in df else 0,
+                credited.nunique() if credited is not None else 0
+            )
+        return stats
+
+    @staticmethod
+    def _track(df, index):
+        """
+        Returns the Name, Artist and Composite Value of one track.
+        """
+        row = df.loc[index]
+        return {column: (row[column] if column in df else None) for column in ['Name', 'Artist']} | {
+            'Composite Value': float(row['Composite Value'])
+        }
+
+    def merge(self, other):
+        """
+        Returns the statistics of the tracks of both this and another set of statistics.
+
+        The mean and standard deviation stay exact; the quartiles and distinct counts of the
+        result are estimates.
+        """
+        merged = PlaylistStats()
+        merged.rows = self.rows + other.rows
+
+        # Combine the means and squared differences exactly
+        merged.composite_count = self.composite_count + other.composite_count
+        if merged.composite_count:
+            delta = other.composite_mean - self.composite_mean
+            merged.composite_mean = self.composite_mean + delta * other.composite_count / merged.composite_count
+            merged.composite_m2 = (self.composite_m2 + other.composite_m2
+                                   + delta ** 2 * self.composite_count * other.composite_count / merged.composite_count)
+        merged.histogram = self.histogram + other.histogram
+
+        # Ties keep the track seen first, like idxmax and idxmin
+        merged.highest = max((track for track in (self.highest, other.highest) if track),
+                             key=lambda track: track['Composite Value'], default=None)
+        merged.lowest = min((track for track in (self.lowest, other.lowest) if track),
+                            key=lambda track: track['Composite Value'], default=None)
+
+        dates = [date for date in (self.earliest_date, other.earliest_date) if date is not None]
+        merged.earliest_date = min(dates) if dates else None
+        dates = [date for date in (self.latest_date, other.latest_date) if date is not None]
+        merged.latest_date = max(dates) if dates else None
+
+        merged.names = self.names.merge(other.names)
+        merged.artists = self.artists.merge(other.artists)
+        return merged
+
+    @property
+    def composite_std(self):
+        # The sample standard deviation, as pandas computes it
+        return float(np.sqrt(self.composite_m2 / (self.composite_count - 1))) if self.composite_count > 1 else float('nan')
+
+    def composite_quantile(self, q):
+        """
+        Returns a quantile of the composite values.
+
+        The quartiles are exact when the exact figures are known. Otherwise the quantile is
+        estimated from the histogram: the middle of the bin holding the closest track's value,
+        so within half a bin width (0.00005) of that value, although the exact quantile may
+        lie between it and the next track's value.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+        Returns:
+            float: The quantile, NaN if there are no composite values.
+        """
+        if not self.composite_count:
+            return float('nan')
+        if self.exact is not None and str(q) in self.exact['quantiles']:
+            return self.exact['quantiles'][str(q)]
+        cumulative = np.cumsum(self.histogram)
+        bin_index = int(np.searchsorted(cumulative, q * (self.composite_count - 1) + 1))
+        return (bin_index + 0.5) / HISTOGRAM_BINS
+
+    def unique_names(self):
+        """
+        Returns the number of distinct track names, exact if known and estimated otherwise.
+        """
+        return self.exact['unique_names'] if self.exact is not None else self.names.estimate()
+
+    def unique_artists(self):
+        """
+        Returns the number of distinct credited artists, exact if known and estimated otherwise.
+        """
+        return self.exact['unique_artists'] if self.exact is not None else self.artists.estimate()
+
+    def report(self):
+        """
+        Prints the statistics in the layout of the analysis menu.
+
+        Estimated figures are labelled as estimates and rounded to the precision they have.
+        """
+        estimated = self.exact is None
+        print(f"Number of Tracks: {self.rows}")
+        print("\n")
+
+        print("\nComposite Value Statistics:")
+        print(f"count    {self.composite_count}")
+        print(f"mean     {self.composite_mean:.6f}")
+        print(f"std      {self.composite_std:.6f}")
+        print(f"min      {self.lowest['Composite Value'] if self.lowest else float('nan'):.6f}")
+        for label, q in (('25%', 0.25), ('50%', 0.5), ('75%', 0.75)):
+            # A histogram bin is 0.0001 wide, so estimates are good to four decimals
+            value = self.composite_quantile(q)
+            print(f"{label:<8} {value:.4f} (estimate)" if estimated else f"{label:<8} {value:.6f}")
+        print(f"max      {self.highest['Composite Value'] if self.highest else float('nan'):.6f}")
+        print("\n")
+
+        for label, count in (('\nNumber of Unique Songs', self.unique_names()),
+                             ('Number of Unique Artists', self.unique_artists())):
+            if estimated:
+                print(f"{label}: about {round_estimate(count)} (estimate, to within {2 * SKETCH_ERROR:.1%})")
+            else:
+                print(f"{label}: {count}")
+        print("\n")
+
+        print(f"\nEarliest Date Added: {self.earliest_date}")
+        print(f"Latest Date Added: {self.latest_date}")
+        print("\n")
+
+        for label, track in (('Highest', self.highest), ('Lowest', self.lowest)):
+            print(f"\nSong with {label} Composite Value:")
+            if track:
+                for column, value in track.items():
+                    print(f"{column:<16} {value}")
+        print("\n")
+
+        print(f"Composite Value Mean: {self.composite_mean:.3f}")
+        print(f"Composite Value Median: {self.composite_quantile(0.5):.3f}{' (estimate)' if estimated else ''}")
+        print(f"Composite Value Standard Deviation: {self.composite_std:.3f}")
+        print("\n")
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.histogram)
+        return {
+            'rows': self.rows,
+            'composite_count': self.composite_count,
+            'composite_mean': self.composite_mean,
+            'composite_m2': self.composite_m2,
+            # Only the non-empty bins are stored, as [bin, count] pairs
+            'histogram': [[int(idx), int(self.histogram[idx])] for idx in nonzero],
+            'highest': _json_track(self.highest),
+            'lowest': _json_track(self.lowest),
+            'earliest_date': self.earliest_date.isoformat() if self.earliest_date is not None else None,
+            'latest_date': self.latest_date.isoformat() if self.latest_date is not None else None,
+            'names': self.names.to_dict(),
+            'artists': self.artists.to_dict(),
+            'exact': self.exact
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.rows = data['rows']
+        stats.composite_count = data['composite_count']
+        stats.composite_mean = data['composite_mean']
+        stats.composite_m2 = data['composite_m2']
+        for idx, count in data['histogram']:
+            stats.histogram[idx] = count
+        stats.highest = data['highest']
+        stats.lowest = data['lowest']
+        stats.earliest_date = pd.Timestamp(data['earliest_date']) if data['earliest_date'] else None
+        stats.latest_date = pd.Timestamp(data['latest_date']) if data['latest_date'] else None
+        stats.names = CountDistinctSketch.from_dict(data['names'])
+        stats.artists = CountDistinctSketch.from_dict(data['artists'])
+        # Sidecars written before exact figures were recorded only have the estimates
+        stats.exact = data.get('exact')
+        return stats
+
+
+def _json_track(track):
+    """
+    Converts a track's details to JSON-compatible values.
+    """
+    if track is None:
+        return None
+    return {column: (None if pd.isna(value) else (str(value) if column != 'Composite Value' else float(value)))
+            for column, value in track.items()}
+
+
+def write_stats(stats, path):
+    """
+    Writes the statistics sidecar of a playlist file, recording the file's modification time.
+
+    Args:
+        stats (PlaylistStats): The statistics of the playlist file.
+        path (str): The path of the playlist file.
+    """
+    data = stats.to_dict()
+    data['source_mtime_ns'] = os.stat(path).st_mtime_ns
+    temp_path = f"{stats_path(path)}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, stats_path(path))
+
+
+def read_stats(path):
+    """
+    Reads the statistics sidecar of a playlist file if it is up to date with the file.
+
+    Args:
+        path (str): The path of the playlist file.
+    Returns:
+        PlaylistStats: The statistics, or None if there is no sidecar or the file changed since it was written.
+    """
+    try:
+        with open(stats_path(path), 'r') as file:
+            data = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if data.get('source_mtime_ns') != os.stat(path).st_mtime_ns:
+        return None
+    return PlaylistStats.from_dict(data)
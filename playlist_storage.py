@@ -0,0 +1,618 @@
+import os
+import numpy as np
+import pandas as pd
+from artist_index import ArtistIndex
+from date_rollup import DateRollup, read_rollup, write_rollup
+from instrumentation import count, stage
+from playlist_stats import PlaylistStats, exact_summary, exact_summary_of, hash_values, read_stats, write_stats
+from track_table import TRACK_COLUMNS, TrackTable
+
+# The columns of a playlist file, in order
+PLAYLIST_COLUMNS = TRACK_COLUMNS
+
+# The storage format used for each file extension
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.feather': 'feather'}
+
+# The CSV file written by earlier versions, imported automatically when no other playlist file exists
+LEGACY_CSV_PATH = 'playlist.csv'
+
+# The suffix of the file an export writes to until it finishes, kept readable if the export fails
+PARTIAL_SUFFIX = '.partial'
+
+
+def columnar_available():
+    """
+    Checks whether pyarrow, which Parquet and Feather files need, is installed.
+
+    Returns:
+        bool: True if Parquet and Feather files can be read and written.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Parquet keeps typed columns and is read column by column; fall back to CSV without pyarrow
+DEFAULT_PLAYLIST_PATH = 'playlist.parquet' if columnar_available() else LEGACY_CSV_PATH
+
+
+def get_format(path):
+    """
+    Returns the storage format of a playlist file from its extension.
+
+    The '.partial' file of an unfinished export has the format of the file it was written for.
+
+    Args:
+        path (str): The path of the playlist file.
+    Returns:
+        str: 'csv', 'parquet' or 'feather'.
+    Raises:
+        ValueError: If the extension is not a supported format.
+    """
+    if path.endswith(PARTIAL_SUFFIX):
+        path = path[:-len(PARTIAL_SUFFIX)]
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported playlist file '{path}', expected one of {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+
+def normalise_types(df):
+    """
+    Converts the playlist columns present in a DataFrame to their storage types.
+
+    Artist is categorical because artists repeat across tracks, and DateAdded is a UTC datetime.
+
+    Args:
+        df (pd.DataFrame): The playlist DataFrame.
+    Returns:
+        pd.DataFrame: The DataFrame with typed columns.
+    """
+    df = df.copy()
+    if 'Name' in df:
+        df['Name'] = df['Name'].astype(object)
+    if 'Artist' in df and not isinstance(df['Artist'].dtype, pd.CategoricalDtype):
+        df['Artist'] = df['Artist'].astype('category')
+    if 'ID' in df:
+        df['ID'] = df['ID'].astype(object)
+    if 'DateAdded' in df:
+        df['DateAdded'] = pd.to_datetime(df['DateAdded'], utc=True)
+    if 'Composite Value' in df:
+        df['Composite Value'] = pd.to_numeric(df['Composite Value'], errors='coerce').astype(float)
+    return df
+
+
+def read_playlist_file(path, columns=None):
+    """
+    Reads a playlist file in any supported format.
+
+    Args:
+        path (str): The path of the playlist file.
+        columns (list): The columns to read, or None for every column.
+    Returns:
+        pd.DataFrame: The playlist data with typed columns.
+    """
+    file_format = get_format(path)
+
+    with stage(f'storage.read.{file_format}'):
+        if file_format == 'parquet':
+            df = pd.read_parquet(path, columns=columns)
+        elif file_format == 'feather':
+            df = pd.read_feather(path, columns=columns)
+        else:
+            df = pd.read_csv(path, usecols=columns, dtype={'Artist': 'category'})
+
+    with stage('dataframe.normalise'):
+        df = normalise_types(df)
+    count('rows.read', len(df))
+    return df
+
+
+def load_playlist(path=None, columns=None):
+    """
+    Loads playlist data, reading only the requested columns.
+
+    If the default playlist file does not exist but a 'playlist.csv' from an earlier version
+    does, the CSV is imported into it first; other paths are never imported into.
+
+    Args:
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+        columns (list): The columns to read, or None for every column.
+    Returns:
+        pd.DataFrame: The playlist data with typed columns.
+    Raises:
+        FileNotFoundError: If the playlist file does not exist, and for the default file no legacy CSV either.
+    """
+    path = path or DEFAULT_PLAYLIST_PATH
+
+    if path == DEFAULT_PLAYLIST_PATH and not os.path.exists(path) and os.path.exists(LEGACY_CSV_PATH):
+        print(f"Importing '{LEGACY_CSV_PATH}' into '{path}'")
+        import_csv(LEGACY_CSV_PATH, path)
+
+    df = read_playlist_file(path, columns)
+    return df
+
+
+def save_table(df, path):
+    """
+    Saves a table atomically in the format given by the path's extension, so an interrupted save
+    never leaves a partial file behind.
+
+    Args:
+        df (pd.DataFrame): The table to save.
+        path (str): The path of the file.
+    """
+    file_format = get_format(path)
+
+    # Write to a temporary file in the same directory, then swap it into place in one step
+    temp_path = f"{path}.tmp"
+    with stage(f'storage.write.{file_format}'):
+        if file_format == 'parquet':
+            df.to_parquet(temp_path, index=False)
+        elif file_format == 'feather':
+            df.to_feather(temp_path)
+        else:
+            df.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+
+
+def read_table(path):
+    """
+    Reads a table saved by save_table.
+    """
+    file_format = get_format(path)
+    if file_format == 'parquet':
+        return pd.read_parquet(path)
+    if file_format == 'feather':
+        return pd.read_feather(path)
+    return pd.read_csv(path)
+
+
+def save_playlist(df, path=None, stats=None, artists=None, rollup=None):
+    """
+    Saves playlist data atomically, so an interrupted save never leaves a partial file behind.
+
+    The summary statistics and date added rollup of the data are written to sidecars next to
+    the file, and so is the artist index if one is given.
+
+    Args:
+        df (pd.DataFrame): The playlist data to save.
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+        stats (PlaylistStats): The statistics of the data if already known, computed from df if None;
+            their exact quartiles and distinct counts are computed from df if they only have estimates.
+        artists (ArtistIndex): The artists of the tracks, or None to keep the file's existing artist index.
+        rollup (DateRollup): The date added rollup of the data if already known, computed from df if None.
+    """
+    path = path or DEFAULT_PLAYLIST_PATH
+    with stage('dataframe.normalise'):
+        df = normalise_types(df).reset_index(drop=True)
+    save_table(df, path)
+    count('rows.written', len(df))
+
+    if artists is not None:
+        save_artist_index(artists, path)
+    else:
+        artists = read_artist_index(path)
+    with stage('stats'):
+        if stats is None:
+            stats = PlaylistStats.from_dataframe(df, artists)
+        elif stats.exact is None:
+            stats.exact = exact_summary_of(df, artists)
+        write_stats(stats, path)
+    with stage('rollup'):
+        write_rollup(rollup if rollup is not None else DateRollup.from_dataframe(df, artists), path)
+
+
+def artist_index_paths(path):
+    """
+    Returns the paths of the artist dictionary and edge table saved next to a playlist file.
+    """
+    extension = os.path.splitext(path)[1]
+    return f"{path}.artists{extension}", f"{path}.artist_edges{extension}"
+
+
+def save_artist_index(artists, path):
+    """
+    Saves the artist index of a playlist file next to it.
+
+    Args:
+        artists (ArtistIndex): The artists of the playlist's tracks.
+        path (str): The path of the playlist file.
+    """
+    artists_path, edges_path = artist_index_paths(path)
+    artist_table, edge_table = artists.to_frames()
+    save_table(edge_table, edges_path)
+    save_table(artist_table, artists_path)
+
+
+def read_artist_index(path):
+    """
+    Reads the artist index saved next to a playlist file.
+
+    Args:
+        path (str): The path of the playlist file.
+    Returns:
+        ArtistIndex: The index, or None if the playlist file has none.
+    """
+    artists_path, edges_path = artist_index_paths(path)
+    if not (os.path.exists(artists_path) and os.path.exists(edges_path)):
+        return None
+    return ArtistIndex.from_frames(read_table(artists_path), read_table(edges_path))
+
+
+def load_artist_index(path=None):
+    """
+    Loads the artist index of a playlist file.
+
+    Files written before artist indexes existed have one built from their joined Artist
+    column, interned by name, and saved for next time.
+
+    Args:
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+    Returns:
+        ArtistIndex: The artists of the playlist's tracks.
+    """
+    path = path or DEFAULT_PLAYLIST_PATH
+    artists = read_artist_index(path) if os.path.exists(path) else None
+    if artists is None:
+        artists = ArtistIndex.from_dataframe(load_playlist(path, columns=['ID', 'Artist']))
+        save_artist_index(artists, path)
+    return artists
+
+
+def load_tracks(path=None, columns=None):
+    """
+    Loads playlist data as a TrackTable, e.g. to publish it.
+
+    Args:
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+        columns (list): The columns to read, or None for every column.
+    Returns:
+        TrackTable: The tracks, with missing values for the columns not read.
+    """
+    return TrackTable.from_dataframe(load_playlist(path, columns))
+
+
+def load_playlist_stats(path=None):
+    """
+    Loads the summary statistics of a playlist file from its sidecar.
+
+    If the sidecar is missing or older than the file, the statistics are computed from the
+    file once and the sidecar is rewritten.
+
+    Args:
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+    Returns:
+        PlaylistStats: The statistics of the playlist file.
+    Raises:
+        FileNotFoundError: If neither the playlist file nor a legacy CSV exists.
+    """
+    path = path or DEFAULT_PLAYLIST_PATH
+    if os.path.exists(path):
+        stats = read_stats(path)
+        if stats is not None:
+            return stats
+
+    df = load_playlist(path, columns=['Name', 'Artist', 'ID', 'DateAdded', 'Composite Value'])
+    stats = PlaylistStats.from_dataframe(df, load_artist_index(path))
+    write_stats(stats, path)
+    return stats
+
+
+def load_playlist_rollup(path=None):
+    """
+    Loads the date added rollup of a playlist file from its sidecar.
+
+    If the sidecar is missing or older than the file, the rollup is computed from the file
+    once and the sidecar is rewritten.
+
+    Args:
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+    Returns:
+        DateRollup: The rollup of the playlist file.
+    Raises:
+        FileNotFoundError: If neither the playlist file nor a legacy CSV exists.
+    """
+    path = path or DEFAULT_PLAYLIST_PATH
+    if os.path.exists(path):
+        rollup = read_rollup(path)
+        if rollup is not None:
+            return rollup
+
+    df = load_playlist(path, columns=['ID', 'DateAdded'])
+    rollup = DateRollup.from_dataframe(df, load_artist_index(path))
+    write_rollup(rollup, path)
+    return rollup
+
+
+def import_csv(csv_path, path=None):
+    """
+    Imports a playlist CSV file into a playlist file of another format.
+
+    Args:
+        csv_path (str): The path of the CSV file to import.
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+    """
+    save_playlist(read_playlist_file(csv_path), path)
+
+
+def export_csv(path=None, csv_path=LEGACY_CSV_PATH):
+    """
+    Exports a playlist file of any format to a CSV file.
+
+    Args:
+        path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+        csv_path (str): The path of the CSV file to write.
+    """
+    save_playlist(load_playlist(path), csv_path)
+
+
+class PlaylistWriter:
+    """
+    Writes playlist data to a file in batches, so the whole playlist never has to be held in memory.
+
+    CSV batches are appended as they arrive. Parquet batches become row groups and Feather
+    batches become record batches; their footer is written when the writer is closed. Batches
+    go to a '.partial' file next to the playlist file, which only replaces it when the with
+    block finishes without an error. If the block fails, the '.partial' file is finished and
+    kept, readable with load_playlist, and the existing playlist file is left as it was.
+
+    Only one batch of tracks is held at a time. The artist index and the daily counts of every
+    batch are kept until the writer is closed: the daily counts grow with the number of days
+    tracks were added on, but the artist index holds each track's ID and artist keys, about
+    200 bytes per track. Each track's composite value and name hash are kept as well, 16 bytes
+    per track, so the statistics record the exact quartiles and distinct counts.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initializes a PlaylistWriter instance.
+
+        Args:
+            path (str): The path of the playlist file, DEFAULT_PLAYLIST_PATH if None.
+        """
+        self.path = path or DEFAULT_PLAYLIST_PATH
+        self.format = get_format(self.path)
+        self.partial_path = self.path + PARTIAL_SUFFIX  # The file batches are written to until the writer is closed
+        self.rows_written = 0
+        self.stats = PlaylistStats()  # The statistics of the batches written so far
+        self._artists = []  # The artist index of each batch, combined when the writer is closed
+        self._rollups = []  # The date added rollup of each batch, combined when the writer is closed
+        self._composites = []  # The composite values of each batch, for the exact quartiles
+        self._name_hashes = []  # The hashed track names of each batch, for the exact number of unique songs
+        self._writer = None  # The pyarrow writer of a Parquet or Feather file, opened with the first batch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def write(self, tracks):
+        """
+        Writes a batch of tracks to the file.
+
+        Args:
+            tracks (TrackTable): The tracks of the batch; their credited artists are added to the
+                artist index. A list of track details, one dictionary per track, is also accepted.
+        """
+        if not len(tracks):
+            return
+        if not isinstance(tracks, TrackTable):
+            tracks = TrackTable.from_rows(tracks)
+        with stage('dataframe.build'):
+            # The table's columns already have their storage types
+            df = tracks.to_dataframe()
+
+        with stage(f'storage.write.{self.format}'):
+            if self.format == 'csv':
+                # The header is only written with the first batch
+                first_batch = self.rows_written == 0
+                df.to_csv(self.partial_path, mode='w' if first_batch else 'a', header=first_batch, index=False)
+            else:
+                self._write_arrow(df)
+
+        self.rows_written += len(df)
+        count('rows.written', len(df))
+
+        # The batch's statistics and rollup only look up the batch's own artists, so each batch
+        # costs the same however many tracks were written before it
+        artists = ArtistIndex()
+        artists.add_table(tracks)
+        if len(artists):
+            self._artists.append(artists)
+        with stage('stats'):
+            self.stats = self.stats.merge(PlaylistStats.from_dataframe(df, artists if len(artists) else None, exact=False))
+            self._composites.append(df['Composite Value'].to_numpy(dtype=float))
+            self._name_hashes.append(hash_values(df['Name']))
+        with stage('rollup'):
+            self._rollups.append(DateRollup.from_dataframe(df, artists if len(artists) else None))
+
+    def _write_arrow(self, df):
+        """
+        Writes a batch to a Parquet or Feather file through pyarrow.
+        """
+        import pyarrow as pa
+
+        # A fixed schema keeps every batch compatible; Artist is stored as plain strings because each
+        # batch would otherwise get its own dictionary, and becomes categorical again on load
+        schema = pa.schema([
+            ('Name', pa.string()),
+            ('Artist', pa.string()),
+            ('ID', pa.string()),
+            ('DateAdded', pa.timestamp('ns', tz='UTC')),
+            ('Composite Value', pa.float64())
+        ])
+        df['Artist'] = df['Artist'].astype(object)
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+        if self._writer is None:
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.partial_path, schema)
+            else:
+                self._writer = pa.ipc.new_file(self.partial_path, schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        """
+        Finishes the file, moves it over the playlist file and writes its sidecars; an empty
+        playlist file is written if no tracks were written.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.rows_written == 0:
+            save_playlist(pd.DataFrame(columns=PLAYLIST_COLUMNS), self.path)
+            return
+        os.replace(self.partial_path, self.path)
+        artists = ArtistIndex.concat(self._artists)
+        if self._artists:
+            save_artist_index(artists, self.path)
+        self.stats.exact = exact_summary(np.concatenate(self._composites),
+                                         len(np.unique(np.concatenate(self._name_hashes))), len(artists))
+        write_stats(self.stats, self.path)
+        write_rollup(DateRollup.concat(self._rollups), self.path)
+
+    def abort(self):
+        """
+        Finishes the batches written so far as the '.partial' file, leaving any existing playlist file untouched.
+        """
+        if self._writer is not None:
+            # Closing writes the footer, without which a Parquet or Feather file cannot be read
+            self._writer.close()
+            self._writer = None
+        if self.rows_written:
+            print(f"Export stopped after {self.rows_written} tracks; they were kept in '{self.partial_path}'")
+
+
+# The directory of the consolidated store that bulk exports write to
+DEFAULT_STORE_PATH = 'playlists'
+
+# The extension of the files in the consolidated store, matching the default playlist file format
+STORE_EXTENSION = os.path.splitext(DEFAULT_PLAYLIST_PATH)[1]
+
+
+def partition_path(root, playlist_id):
+    """
+    Returns the path of one playlist's partition in the consolidated store.
+
+    Partitions use the 'playlist_id=<id>' directory layout, so the store can also be read
+    as a partitioned dataset by pyarrow.
+
+    Args:
+        root (str): The directory of the store.
+        playlist_id (str): The ID of the playlist.
+    Returns:
+        str: The path of the partition's data file.
+    """
+    return os.path.join(root, f'playlist_id={playlist_id}', f'tracks{STORE_EXTENSION}')
+
+
+def list_partitions(root=DEFAULT_STORE_PATH):
+    """
+    Lists the playlists stored in the consolidated store.
+
+    Args:
+        root (str): The directory of the store.
+    Returns:
+        list: The IDs of the stored playlists.
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name.split('=', 1)[1] for name in os.listdir(root)
+        if name.startswith('playlist_id=') and os.path.exists(partition_path(root, name.split('=', 1)[1]))
+    )
+
+
+def save_partition(df, playlist_id, root=DEFAULT_STORE_PATH, artists=None):
+    """
+    Saves one playlist's tracks as a partition of the consolidated store, replacing any previous export.
+
+    Args:
+        df (pd.DataFrame): The playlist data to save.
+        playlist_id (str): The ID of the playlist.
+        root (str): The directory of the store.
+        artists (ArtistIndex): The artists of the playlist's tracks, if known.
+    """
+    path = partition_path(root, playlist_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_playlist(df, path, artists=artists)
+
+
+def load_store(root=DEFAULT_STORE_PATH, playlist_ids=None, columns=None):
+    """
+    Loads playlists from the consolidated store into one DataFrame.
+
+    Args:
+        root (str): The directory of the store.
+        playlist_ids (list): The IDs of the playlists to load, or None for every stored playlist.
+        columns (list): The columns to read, or None for every column.
+    Returns:
+        pd.DataFrame: The playlist data with a categorical PlaylistID column identifying each row's playlist.
+    """
+    playlist_ids = list_partitions(root) if playlist_ids is None else playlist_ids
+    frames = [
+        read_playlist_file(partition_path(root, playlist_id), columns).assign(PlaylistID=playlist_id)
+        for playlist_id in playlist_ids
+    ]
+    if not frames:
+        return pd.DataFrame(columns=(columns or PLAYLIST_COLUMNS) + ['PlaylistID'])
+
+    df = pd.concat(frames, ignore_index=True)
+    df['PlaylistID'] = df['PlaylistID'].astype('category')
+    if 'Artist' in df:
+        # Categories differ between partitions, so concat falls back to object
+        df['Artist'] = df['Artist'].astype('category')
+    return df
+
+
+def load_store_stats(root=DEFAULT_STORE_PATH, playlist_ids=None):
+    """
+    Combines the summary statistics of playlists in the consolidated store without reading their tracks.
+
+    Args:
+        root (str): The directory of the store.
+        playlist_ids (list): The IDs of the playlists to include, or None for every stored playlist.
+    Returns:
+        PlaylistStats: The statistics of every track of the playlists.
+    """
+    playlist_ids = list_partitions(root) if playlist_ids is None else playlist_ids
+    stats = PlaylistStats()
+    for playlist_id in playlist_ids:
+        stats = stats.merge(load_playlist_stats(partition_path(root, playlist_id)))
+    return stats
+
+
+def load_store_artists(root=DEFAULT_STORE_PATH, playlist_ids=None):
+    """
+    Combines the artist indexes of playlists in the consolidated store.
+
+    Args:
+        root (str): The directory of the store.
+        playlist_ids (list): The IDs of the playlists to include, or None for every stored playlist.
+    Returns:
+        ArtistIndex: The artists of every track of the playlists, one key per artist across the store.
+    """
+    playlist_ids = list_partitions(root) if playlist_ids is None else playlist_ids
+    return ArtistIndex.concat([load_artist_index(partition_path(root, playlist_id)) for playlist_id in playlist_ids])
+
+
+def load_store_rollup(root=DEFAULT_STORE_PATH, playlist_ids=None):
+    """
+    Combines the date added rollups of playlists in the consolidated store without reading their tracks.
+
+    Args:
+        root (str): The directory of the store.
+        playlist_ids (list): The IDs of the playlists to include, or None for every stored playlist.
+    Returns:
+        DateRollup: The additions of every track of the playlists, counted once per playlist.
+    """
+    playlist_ids = list_partitions(root) if playlist_ids is None else playlist_ids
+    return DateRollup.concat([load_playlist_rollup(partition_path(root, playlist_id)) for playlist_id in playlist_ids])
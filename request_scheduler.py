@@ -0,0 +1,247 @@
+import random
+import threading
+import time
+import requests
+from spotipy.exceptions import SpotifyException
+from instrumentation import count
+
+# The default sustained request rate (requests per second) and burst size of the token bucket
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 20
+
+# The default number of times a throttled or failed request is retried before giving up
+DEFAULT_MAX_RETRIES = 6
+
+# The base and maximum delay (seconds) of the jittered exponential backoff
+DEFAULT_BASE_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+
+# spotipy retries 429 and 5xx responses itself and drops the Retry-After header when it gives up.
+# Passing these options to spotipy.Spotify leaves status retries to the scheduler: the forcelist must
+# not be empty (spotipy would fall back to its defaults), so it only names a status Spotify never sends.
+SPOTIPY_RETRY_OPTIONS = {'status_retries': 0, 'status_forcelist': (599,)}
+
+# Tolerance for floating point error when the bucket is refilled to exactly one token
+_TOKEN_EPSILON = 1e-9
+
+
+def get_retry_after(error):
+    """
+    Reads the Retry-After header of a throttled request.
+
+    Args:
+        error (SpotifyException): The exception raised for the throttled request.
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    headers = getattr(error, 'headers', None) or {}
+    # Header names are case-insensitive, but a plain dict may be used by fakes and older spotipy versions
+    value = headers.get('Retry-After', headers.get('retry-after'))
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """
+    Decides whether a failed request should be retried.
+
+    Args:
+        error (Exception): The exception raised by the request.
+    Returns:
+        bool: True for throttling (429), server errors (5xx) and connection failures.
+    """
+    if isinstance(error, SpotifyException):
+        return error.http_status == 429 or 500 <= error.http_status < 600
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class RequestScheduler:
+    """
+    Schedules Spotify API requests through a shared token bucket.
+
+    Requests wait for a token before they are sent, so bursts are smoothed to the configured
+    rate. A 429 response pauses every request for the time given by its Retry-After header,
+    and server errors are retried with jittered exponential backoff. The scheduler is thread
+    safe so it can be shared by concurrent page fetches.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 base_backoff=DEFAULT_BASE_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+                 sleep=time.sleep, clock=time.monotonic):
+        """
+        Initializes a RequestScheduler instance.
+
+        Args:
+            rate (float): The sustained number of requests per second.
+            burst (int): The maximum number of requests sent back to back.
+            max_retries (int): The number of times a failed request is retried.
+            base_backoff (float): The base delay (seconds) of the exponential backoff.
+            max_backoff (float): The maximum delay (seconds) of the exponential backoff.
+            sleep (callable): The function used to wait, replaceable for testing.
+            clock (callable): The monotonic clock used to refill the bucket, replaceable for testing.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)           # Tokens currently available in the bucket
+        self._last_refill = clock()           # When the bucket was last refilled
+        self._paused_until = 0.0              # Requests wait until this time after a 429
+
+        self.metrics = {
+            'requests': 0,          # Requests sent, including retries
+            'retries': 0,           # Requests that were retried
+            'throttled': 0,         # 429 responses received
+            'server_errors': 0,     # 5xx responses and connection failures received
+            'failures': 0,          # Requests that failed after all retries
+            'rate_limit_wait': 0.0, # Seconds spent waiting for a token or a Retry-After pause
+            'backoff_wait': 0.0     # Seconds spent in exponential backoff
+        }
+
+    def stats(self):
+        """
+        Returns a copy of the scheduler's metrics.
+
+        Returns:
+            dict: The request, retry and wait time counters.
+        """
+        with self._lock:
+            return dict(self.metrics)
+
+    def reserve(self):
+        """
+        Takes a token if one is available, without waiting, so non-blocking clients can share the bucket.
+
+        Returns:
+            float: 0.0 if a token was taken, otherwise the number of seconds to wait before trying again.
+        """
+        with self._lock:
+            now = self._clock()
+
+            # Refill the bucket for the time passed since the last refill
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            if now < self._paused_until:
+                wait = self._paused_until - now
+            elif self._tokens >= 1 - _TOKEN_EPSILON:
+                self._tokens = max(0.0, self._tokens - 1)
+                self.metrics['requests'] += 1
+                count('api.requests')
+                return 0.0
+            else:
+                wait = (1 - self._tokens) / self.rate
+
+            self.metrics['rate_limit_wait'] += wait
+            return wait
+
+    def pause(self, seconds):
+        """
+        Pauses every request sharing the scheduler, e.g. for the Retry-After time of a 429 response.
+
+        Args:
+            seconds (float): The time to pause for, from now.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def _acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            self._sleep(wait)
+
+    def _backoff(self, attempt):
+        """
+        Returns a jittered exponential backoff delay for the given attempt.
+        """
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls a Spotify API function through the scheduler.
+
+        Args:
+            func (callable): The API function to call.
+            *args: Positional arguments passed to the function.
+            **kwargs: Keyword arguments passed to the function.
+        Returns:
+            The result of the API function.
+        Raises:
+            Exception: The last error if the request still fails after all retries.
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    if is_retryable(e):
+                        with self._lock:
+                            self.metrics['failures'] += 1
+                        count('api.failures')
+                    raise
+
+                retry_after = get_retry_after(e) if getattr(e, 'http_status', None) == 429 else None
+                with self._lock:
+                    self.metrics['retries'] += 1
+                    if getattr(e, 'http_status', None) == 429:
+                        self.metrics['throttled'] += 1
+                    else:
+                        self.metrics['server_errors'] += 1
+                if retry_after is not None:
+                    # Pause every request sharing the scheduler, not only this one
+                    self.pause(retry_after)
+                count('api.retries')
+                count('api.throttled' if getattr(e, 'http_status', None) == 429 else 'api.server_errors')
+
+                if retry_after is None:
+                    delay = self._backoff(attempt)
+                    with self._lock:
+                        self.metrics['backoff_wait'] += delay
+                    self._sleep(delay)
+
+                attempt += 1
+
+
+class ScheduledSpotify:
+    """
+    Wraps a Spotify API object so that every API method call goes through a RequestScheduler.
+
+    It can be passed anywhere a spotipy.Spotify is expected; attributes that are not methods
+    are returned unchanged.
+    """
+
+    def __init__(self, spotify, scheduler=None):
+        """
+        Initializes a ScheduledSpotify instance.
+
+        Args:
+            spotify (spotipy.Spotify): The Spotify API object to wrap.
+            scheduler (RequestScheduler): The scheduler shared by the calls, a new one if None.
+        """
+        self.spotify = spotify
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.spotify, name)
+        if not callable(attribute):
+            return attribute
+
+        def scheduled(*args, **kwargs):
+            count(f'api.calls.{name}')
+            return self.scheduler.call(attribute, *args, **kwargs)
+
+        return scheduled
@@ -0,0 +1,436 @@
+import time
+import numpy as np
+import pandas as pd
+from composite import COMPOSITE_FEATURES, normalise_features
+from feature_cache import FEATURE_FIELDS
+from instrumentation import count, stage
+from playlist_analysis import SHAPES
+
+# The features a target curve can be given for; every one is scaled to 0 - 1 before matching.
+# 'composite' is the playlist's own 'Composite Value' column, so it needs no audio features.
+RESHAPE_FEATURES = (
+    'composite', 'energy', 'danceability', 'tempo', 'loudness', 'valence',
+    'acousticness', 'instrumentalness', 'liveness', 'speechiness'
+)
+
+# The ways the starting order can be found, selectable by name in reshape_playlist
+METHODS = ('auto', 'hungarian', 'greedy')
+
+# Playlists up to this many tracks are solved exactly with scipy's assignment solver, which
+# needs a full tracks x positions cost matrix (8 bytes per cell) and cubic time
+HUNGARIAN_LIMIT = 2000
+
+# The seconds spent reshaping a playlist by default, most of it improving the order by swaps
+DEFAULT_TIME_BUDGET = 2.0
+
+# The number of swaps tried at once by the local search
+SWAP_BATCH_SIZE = 4096
+
+# The farthest apart two positions swapped to smooth transitions can be
+NEIGHBOUR_WINDOW = 16
+
+# The local search stops early after this many batches in a row without an improving swap
+PATIENCE = 50
+
+# Tempo jumps are measured on the same 80 bpm scale the normalised tempo feature uses
+TEMPO_JUMP_SCALE = 80
+
+
+def scipy_available():
+    """
+    Checks whether scipy, which the exact assignment solver needs, is installed.
+
+    Returns:
+        bool: True if the 'hungarian' method can be used.
+    """
+    try:
+        import scipy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def camelot_numbers(keys, modes):
+    """
+    Returns the position of each key on the Camelot wheel (1 - 12), NaN for unknown keys.
+
+    Neighbouring numbers are a fifth apart and a minor key shares its number with its
+    relative major, so keys with the same number, or one apart in the same mode, mix well.
+
+    Args:
+        keys (np.ndarray): The pitch class of each track's key (0 = C), -1 or NaN if unknown.
+        modes (np.ndarray): 1 for major and 0 for minor.
+    Returns:
+        np.ndarray: The Camelot number of each key.
+    """
+    keys = np.asarray(keys, dtype=float)
+    modes = np.asarray(modes, dtype=float)
+
+    # A minor key sits with the major key three semitones above it
+    pitch = np.where(modes == 0, keys + 3, keys)
+    numbers = (7 * pitch + 7) % 12 + 1
+    return np.where(keys >= 0, numbers, np.nan)
+
+
+def key_distance(numbers_a, modes_a, numbers_b, modes_b):
+    """
+    Measures how badly the keys of consecutive tracks clash, from 0 (same key) to 1.
+
+    The distance is the number of steps around the Camelot wheel plus half a step for a
+    change between major and minor. Unknown keys never clash.
+
+    Returns:
+        np.ndarray: The distance of each pair of keys.
+    """
+    steps = np.abs(numbers_a - numbers_b)
+    steps = np.minimum(steps, 12 - steps)
+    distance = (steps + 0.5 * (modes_a != modes_b)) / 6.5
+    return np.nan_to_num(distance)
+
+
+def reshape_features(df, features=None):
+    """
+    Builds the normalised features of every track of a playlist, in playlist order.
+
+    Args:
+        df (pd.DataFrame): The playlist data; its 'Composite Value' column gives the 'composite' feature.
+        features (dict): Raw audio features by track ID, e.g. from FeatureCache.get_many; tracks
+            without any are left as NaN.
+    Returns:
+        pd.DataFrame: One column per feature in RESHAPE_FEATURES, plus the raw 'bpm', 'key' and 'mode'.
+    """
+    features = features or {}
+    raw = pd.DataFrame([features.get(track_id) or {} for track_id in df['ID']], columns=list(FEATURE_FIELDS))
+    raw = raw.apply(pd.to_numeric, errors='coerce')
+
+    # The composite features have their own scales; the others are already in range
+    table = normalise_features(raw)
+    for feature in RESHAPE_FEATURES:
+        if feature not in COMPOSITE_FEATURES and feature != 'composite':
+            table[feature] = raw[feature].astype(float)
+
+    if 'Composite Value' in df:
+        table['composite'] = pd.to_numeric(df['Composite Value'], errors='coerce').to_numpy(dtype=float)
+    else:
+        table['composite'] = np.nan
+
+    table['bpm'] = raw['tempo']
+    table['key'] = raw['key']
+    table['mode'] = raw['mode']
+    return table
+
+
+def load_reshape_features(df, cache, get_client=None):
+    """
+    Looks up the audio features of a playlist's tracks, fetching any the cache is missing.
+
+    Args:
+        df (pd.DataFrame): The playlist data.
+        cache (FeatureCache): The cache of previously fetched audio features.
+        get_client (callable): Returns a client to fetch uncached features with, called only if
+            some are missing, so a fully cached playlist needs no login; only cached features are used if None.
+    Returns:
+        pd.DataFrame: The features of each track, as returned by reshape_features.
+    """
+    track_ids = df['ID'].dropna().tolist()
+    features = cache.get_many(track_ids)
+
+    missing_ids = [track_id for track_id in track_ids if track_id not in features]
+    if missing_ids and get_client is not None:
+        from playlist_csv_manager import get_audio_features
+        features.update(get_audio_features(get_client(), missing_ids, cache))
+
+    return reshape_features(df, features)
+
+
+def target_curve(target):
+    """
+    Returns the curve of a target, given as a shape number from SHAPES or as a curve.
+
+    Raises:
+        ValueError: If the shape number is unknown.
+    """
+    if callable(target):
+        return target
+    if target not in SHAPES:
+        raise ValueError(f"Unknown shape {target}, choose one of {sorted(SHAPES)}")
+    return SHAPES[target][1]
+
+
+class ReshapeProblem:
+    """
+    The cost of every order of a playlist, for fitting several features to target curves at once.
+
+    A track at a position costs the weighted squared distance between its features and the
+    targets there. Consecutive tracks add a transition cost: their tempo jump and how badly
+    their keys clash, each scaled by its smoothness weight. Costs of single swaps are computed
+    for thousands of candidate swaps at once, so the order can be improved in vectorized batches.
+    """
+
+    def __init__(self, table, targets, weights=None, tempo_smoothness=0.0, key_smoothness=0.0):
+        """
+        Initializes a ReshapeProblem instance.
+
+        Args:
+            table (pd.DataFrame): The features of each track, as returned by reshape_features.
+            targets (dict): The target of each feature in RESHAPE_FEATURES: a shape number or a curve
+                taking positions scaled to 0 - 1.
+            weights (dict): The weight of each feature's target, 1 for any left out.
+            tempo_smoothness (float): The cost of a tempo jump of 80 bpm between neighbours.
+            key_smoothness (float): The cost of the worst key clash between neighbours.
+        Raises:
+            ValueError: If there are no targets or a target is for an unknown feature.
+        """
+        if not targets:
+            raise ValueError("At least one target curve is needed")
+        unknown = [feature for feature in targets if feature not in RESHAPE_FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown features {unknown}, choose from {list(RESHAPE_FEATURES)}")
+
+        self.features = list(targets)
+        self.track_count = len(table)
+        weights = weights or {}
+        scale = np.sqrt([float(weights.get(feature, 1)) for feature in self.features])
+
+        # Evaluate each target curve at every position (1 - n) scaled to 0 - 1
+        x_over_t = np.arange(1, self.track_count + 1) / max(self.track_count, 1)
+        targets_matrix = np.column_stack([
+            np.broadcast_to(np.asarray(target_curve(targets[feature])(x_over_t), dtype=float), x_over_t.shape)
+            for feature in self.features
+        ])
+
+        # Tracks missing a feature are given its average, so they fit anywhere equally well
+        values = table[self.features].to_numpy(dtype=float)
+        averages = np.nan_to_num(np.nanmean(np.where(np.isnan(values).all(axis=0), 0.5, values), axis=0), nan=0.5)
+        values = np.where(np.isnan(values), averages, values)
+
+        # Scaling both sides by the root of the weights makes the squared distance weighted
+        self.targets = targets_matrix * scale
+        self.values = values * scale
+
+        self.tempo_smoothness = tempo_smoothness
+        self.key_smoothness = key_smoothness
+        self.tempo = table['bpm'].to_numpy(dtype=float) / TEMPO_JUMP_SCALE
+        self.modes = table['mode'].fillna(1).to_numpy(dtype=float)
+        self.camelot = camelot_numbers(table['key'].to_numpy(dtype=float), self.modes)
+
+    @property
+    def smooth(self):
+        return bool(self.tempo_smoothness or self.key_smoothness)
+
+    def assignment_cost(self, tracks, positions):
+        """
+        Returns the cost of each track at the matching position.
+        """
+        return np.square(self.values[tracks] - self.targets[positions]).sum(axis=1)
+
+    def transition_cost(self, before, after):
+        """
+        Returns the cost of each track in before being followed by the matching track in after.
+        """
+        cost = np.zeros(len(before))
+        if self.tempo_smoothness:
+            cost += self.tempo_smoothness * np.nan_to_num(np.abs(self.tempo[before] - self.tempo[after]))
+        if self.key_smoothness:
+            cost += self.key_smoothness * key_distance(
+                self.camelot[before], self.modes[before], self.camelot[after], self.modes[after]
+            )
+        return cost
+
+    def total_cost(self, order):
+        """
+        Returns the cost of a whole order, given as the track at each position.
+        """
+        cost = self.assignment_cost(order, np.arange(len(order))).sum()
+        if self.smooth and len(order) > 1:
+            cost += self.transition_cost(order[:-1], order[1:]).sum()
+        return float(cost)
+
+    def projection_order(self):
+        """
+        Finds a good order quickly by matching tracks to positions by rank along one direction.
+
+        Tracks and targets are projected onto the direction in which the targets vary most, and
+        the nth lowest track goes to the nth lowest position, as rearrange_to_shape matches the
+        composite value. This is the exact answer for a single feature.
+
+        Returns:
+            np.ndarray: The track at each position.
+        """
+        if self.track_count < 2:
+            return np.arange(self.track_count)
+
+        centred = self.targets - self.targets.mean(axis=0)
+        if np.allclose(centred, 0):
+            direction = np.ones(len(self.features))
+        else:
+            direction = np.linalg.svd(centred, full_matrices=False)[2][0]
+
+        order = np.empty(self.track_count, dtype=np.intp)
+        order[np.argsort(self.targets @ direction, kind='stable')] = np.argsort(self.values @ direction, kind='stable')
+        return order
+
+    def assignment_order(self):
+        """
+        Finds the order with the lowest assignment cost, ignoring transitions, with scipy.
+
+        Returns:
+            np.ndarray: The track at each position.
+        """
+        from scipy.optimize import linear_sum_assignment
+
+        # |v - t|^2 = |v|^2 + |t|^2 - 2 v.t for every track and position at once
+        cost = (np.square(self.values).sum(axis=1)[:, None] + np.square(self.targets).sum(axis=1)[None, :]
+                - 2 * self.values @ self.targets.T)
+        tracks, positions = linear_sum_assignment(cost)
+
+        order = np.empty(self.track_count, dtype=np.intp)
+        order[positions] = tracks
+        return order
+
+    def swap_deltas(self, order, first, second):
+        """
+        Returns how much swapping the tracks at each pair of positions would change the cost.
+
+        Args:
+            order (np.ndarray): The track at each position.
+            first (np.ndarray): The first position of each swap.
+            second (np.ndarray): The second position of each swap, at least two after the first.
+        Returns:
+            np.ndarray: The change in cost of each swap; negative swaps improve the order.
+        """
+        a, b = order[first], order[second]
+        delta = (self.assignment_cost(b, first) + self.assignment_cost(a, second)
+                 - self.assignment_cost(a, first) - self.assignment_cost(b, second))
+        if not self.smooth:
+            return delta
+
+        # The positions are not adjacent, so each swap changes the four transitions around them
+        last = len(order) - 1
+        before_first = order[np.maximum(first - 1, 0)]
+        after_first = order[first + 1]
+        before_second = order[second - 1]
+        after_second = order[np.minimum(second + 1, last)]
+        has_before = first > 0
+        has_after = second < last
+
+        old = (np.where(has_before, self.transition_cost(before_first, a), 0) + self.transition_cost(a, after_first)
+               + self.transition_cost(before_second, b) + np.where(has_after, self.transition_cost(b, after_second), 0))
+        new = (np.where(has_before, self.transition_cost(before_first, b), 0) + self.transition_cost(b, after_first)
+               + self.transition_cost(before_second, a) + np.where(has_after, self.transition_cost(a, after_second), 0))
+        return delta + new - old
+
+    def improve(self, order, deadline, rng):
+        """
+        Improves an order in place by swapping pairs of tracks until the deadline or no swap helps.
+
+        Each batch tries SWAP_BATCH_SIZE random swaps, half between any two positions and half
+        between nearby ones, then applies the improving swaps from best to worst, skipping any
+        that touch a position next to one already swapped, since its cost would have changed.
+
+        Args:
+            order (np.ndarray): The track at each position.
+            deadline (float): The time.perf_counter() value to stop at.
+            rng (np.random.Generator): The random generator choosing the swaps.
+        Returns:
+            tuple: The number of batches tried and of swaps made.
+        """
+        track_count = len(order)
+        if track_count < 3:
+            return 0, 0
+
+        batch_size = min(SWAP_BATCH_SIZE, track_count)
+        window = max(2, min(NEIGHBOUR_WINDOW, track_count - 1))
+        batches = swaps = idle = 0
+
+        while idle < PATIENCE and time.perf_counter() < deadline:
+            batches += 1
+            first = rng.integers(0, track_count, batch_size)
+            nearby = first + rng.integers(2, window + 1, batch_size)
+            anywhere = rng.integers(0, track_count, batch_size)
+            second = np.where(rng.random(batch_size) < 0.5, nearby, anywhere)
+
+            # Adjacent swaps change three transitions rather than four, so they are left out
+            valid = (second < track_count) & (np.abs(second - first) >= 2)
+            first, second = np.minimum(first, second)[valid], np.maximum(first, second)[valid]
+
+            delta = self.swap_deltas(order, first, second)
+            improving = np.flatnonzero(delta < -1e-12)
+            if not len(improving):
+                idle += 1
+                continue
+            idle = 0
+
+            # Positions are offset by one so the neighbours of position 0 can be marked too
+            touched = np.zeros(track_count + 2, dtype=bool)
+            for swap in improving[np.argsort(delta[improving])]:
+                i, j = first[swap], second[swap]
+                if touched[i:i + 3].any() or touched[j:j + 3].any():
+                    continue
+                touched[i:i + 3] = True
+                touched[j:j + 3] = True
+                order[i], order[j] = order[j], order[i]
+                swaps += 1
+
+        return batches, swaps
+
+
+def reshape_playlist(df, table, targets, weights=None, tempo_smoothness=0.0, key_smoothness=0.0,
+                     method='auto', time_budget=DEFAULT_TIME_BUDGET, seed=0):
+    """
+    Rearranges a playlist so several of its features follow target curves at once.
+
+    A starting order is found with scipy's exact assignment solver ('hungarian') or by matching
+    ranks along the targets' main direction ('greedy'), which takes milliseconds for any size;
+    'auto' uses the exact solver for playlists of up to HUNGARIAN_LIMIT tracks when scipy is
+    installed. The order is then improved by batches of swaps, which also smooth the transitions,
+    until the time budget is spent or no swap helps.
+
+    Args:
+        df (pd.DataFrame): The playlist data.
+        table (pd.DataFrame): The features of each track of df, as returned by reshape_features.
+        targets (dict): The target of each feature, e.g. {'energy': 9, 'tempo': 1}; see ReshapeProblem.
+        weights (dict): The weight of each feature's target, 1 for any left out.
+        tempo_smoothness (float): The cost of a tempo jump of 80 bpm between neighbours.
+        key_smoothness (float): The cost of the worst key clash between neighbours.
+        method (str): One of METHODS.
+        time_budget (float): The seconds to spend in total; 0 only finds the starting order.
+        seed (int): The seed of the random swaps, so the same inputs give the same order.
+    Returns:
+        tuple: The reordered DataFrame and a dictionary describing the search.
+    Raises:
+        ValueError: If the method is unknown, or is 'hungarian' and scipy is not installed or the playlist is too long.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', choose one of {list(METHODS)}")
+    if method == 'hungarian' and not scipy_available():
+        raise ValueError("The 'hungarian' method needs scipy (pip install scipy)")
+    if method == 'hungarian' and len(df) > HUNGARIAN_LIMIT:
+        raise ValueError(f"The 'hungarian' method is limited to {HUNGARIAN_LIMIT} tracks, use 'greedy'")
+
+    with stage('reshape'):
+        start = time.perf_counter()
+        problem = ReshapeProblem(table, targets, weights, tempo_smoothness, key_smoothness)
+
+        # Rank matching is already exact for one feature, so the solver is only worth it for several
+        if method == 'auto':
+            exact = scipy_available() and len(problem.features) > 1 and len(df) <= HUNGARIAN_LIMIT
+            method = 'hungarian' if exact else 'greedy'
+        order = problem.assignment_order() if method == 'hungarian' else problem.projection_order()
+        initial_cost = problem.total_cost(order)
+
+        rng = np.random.default_rng(seed)
+        batches, swaps = problem.improve(order, start + time_budget, rng)
+        count('reshape.swaps', swaps)
+
+        summary = {
+            'method': method,
+            'tracks': len(df),
+            'features': problem.features,
+            'initial_cost': initial_cost,
+            'cost': problem.total_cost(order),
+            'batches': batches,
+            'swaps': swaps,
+            'seconds': time.perf_counter() - start
+        }
+        return df.iloc[order], summary
@@ -0,0 +1,342 @@
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from composite import COMPOSITE_FEATURES, normalise_features
+from feature_cache import FEATURE_FIELDS
+from instrumentation import count, stage
+
+# The audio features a track's vector is made of, each scaled to 0 - 1 so they count equally
+SIMILARITY_FEATURES = (
+    'danceability', 'energy', 'valence', 'tempo', 'loudness',
+    'acousticness', 'instrumentalness', 'liveness', 'speechiness'
+)
+
+# The directory the index is stored in, overridable with the SPOTIFY_SIMILARITY_INDEX_DIR environment variable
+DEFAULT_INDEX_DIR = os.environ.get('SPOTIFY_SIMILARITY_INDEX_DIR', '.similarity_index')
+
+# The version of the index files, increased whenever their layout changes so old indexes are rebuilt
+INDEX_VERSION = 1
+
+# Track IDs are stored as fixed width bytes of this length, the length of every Spotify ID
+TRACK_ID_LENGTH = 22
+
+# Distances are computed for at most this many query and track pairs at once: the distance
+# matrix of a block is 16 MB, and about 64 MB with the temporaries of computing and merging it
+BLOCK_PAIRS = 2 ** 22
+
+# Blocks hold at most this many tracks, so the vectors copied for a block stay under 10 MB
+# however few queries there are
+MAX_BLOCK_ROWS = 2 ** 18
+
+# The number of tracks in a playlist made like another, by default
+DEFAULT_SIMILAR_SIZE = 50
+
+# Longer seed playlists are represented by this many of their tracks, spread evenly through them
+MAX_SEED_TRACKS = 64
+
+
+def feature_vectors(raw):
+    """
+    Turns raw audio features into the float32 vectors the index compares.
+
+    Tempo and loudness are scaled as for the composite value; the other features are already in
+    range. A missing feature is given the middle of its range, except the composite features of
+    a track that has other features, which count as their composite default.
+
+    Args:
+        raw (pd.DataFrame): One row of raw audio features per track.
+    Returns:
+        np.ndarray: One row of len(SIMILARITY_FEATURES) values per track.
+    """
+    raw = raw.apply(pd.to_numeric, errors='coerce')
+    normalised = normalise_features(raw)
+    columns = [
+        normalised[feature] if feature in COMPOSITE_FEATURES else raw[feature].astype(float)
+        for feature in SIMILARITY_FEATURES
+    ]
+    return np.nan_to_num(np.column_stack(columns), nan=0.5).astype(np.float32)
+
+
+def index_paths(path):
+    """
+    Returns the paths of the files of an index: its metadata, track IDs, vectors and squared norms.
+    """
+    return {name: os.path.join(path, file_name) for name, file_name in
+            [('meta', 'index.json'), ('ids', 'ids.npy'), ('vectors', 'vectors.npy'), ('norms', 'norms.npy')]}
+
+
+def read_index_meta(path=DEFAULT_INDEX_DIR):
+    """
+    Reads the metadata of an index.
+
+    Returns:
+        dict: The metadata, or None if there is no index of the current version.
+    """
+    try:
+        with open(index_paths(path)['meta'], 'r') as file:
+            meta = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if meta.get('version') != INDEX_VERSION or meta.get('features') != list(SIMILARITY_FEATURES):
+        return None
+    return meta
+
+
+def build_similarity_index(cache, path=DEFAULT_INDEX_DIR):
+    """
+    Builds the index of every track in the feature cache and saves it.
+
+    The cache is read in chunks and each chunk is written straight into memory-mapped files,
+    so building over millions of tracks needs little memory. Tracks are stored in track ID
+    order, which lets seed tracks be found by binary search.
+
+    Args:
+        cache (FeatureCache): The cache of audio features of every exported track.
+        path (str): The directory to save the index to.
+    Returns:
+        SimilarityIndex: The new index.
+    """
+    with stage('similarity.build'):
+        os.makedirs(path, exist_ok=True)
+        paths = index_paths(path)
+        # Read before scanning, so tracks cached during the build make the next load rebuild
+        generation = cache.generation()
+        capacity = len(cache)
+
+        # Write to temporary files so a reader never sees half an index
+        ids = np.lib.format.open_memmap(f"{paths['ids']}.tmp", mode='w+', dtype=f'S{TRACK_ID_LENGTH}', shape=(capacity,))
+        vectors = np.lib.format.open_memmap(f"{paths['vectors']}.tmp", mode='w+', dtype=np.float32,
+                                            shape=(capacity, len(SIMILARITY_FEATURES)))
+        norms = np.lib.format.open_memmap(f"{paths['norms']}.tmp", mode='w+', dtype=np.float32, shape=(capacity,))
+
+        rows = 0
+        for track_ids, values in cache.iter_features():
+            # Tracks cached after the cache was counted are left for the next build
+            take = min(len(track_ids), capacity - rows)
+            if take <= 0:
+                break
+            chunk = feature_vectors(pd.DataFrame(values[:take], columns=list(FEATURE_FIELDS)))
+            ids[rows:rows + take] = track_ids[:take]
+            vectors[rows:rows + take] = chunk
+            norms[rows:rows + take] = np.einsum('ij,ij->i', chunk, chunk)
+            rows += take
+
+        for array in (ids, vectors, norms):
+            array.flush()
+        del ids, vectors, norms
+        for name in ('ids', 'vectors', 'norms'):
+            os.replace(f"{paths[name]}.tmp", paths[name])
+
+        # Tracks evicted while building leave unused rows at the end, which the count excludes
+        meta = {
+            'version': INDEX_VERSION,
+            'features': list(SIMILARITY_FEATURES),
+            'count': rows,
+            'cache_generation': generation,
+            'built_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        with open(f"{paths['meta']}.tmp", 'w') as file:
+            json.dump(meta, file)
+        os.replace(f"{paths['meta']}.tmp", paths['meta'])
+
+    count('similarity.tracks_indexed', rows)
+    return SimilarityIndex.load(path)
+
+
+def load_similarity_index(cache, path=DEFAULT_INDEX_DIR, rebuild=False):
+    """
+    Loads the saved index, building it first if there is none or the cache has changed since it was built.
+
+    The cache's generation is compared rather than its size, which stays the same once a full
+    cache starts evicting tracks for new ones.
+
+    Args:
+        cache (FeatureCache): The cache of audio features the index is built from.
+        path (str): The directory of the index.
+        rebuild (bool): Whether to build the index even if the saved one looks current.
+    Returns:
+        SimilarityIndex: The index.
+    """
+    meta = read_index_meta(path)
+    if rebuild or meta is None or meta.get('cache_generation') != cache.generation():
+        return build_similarity_index(cache, path)
+    return SimilarityIndex.load(path)
+
+
+class SimilarityIndex:
+    """
+    Finds the tracks whose audio features are closest to given tracks, by Euclidean distance.
+
+    Vectors are float32 (36 bytes a track) and memory-mapped, so loading is instant and only
+    the pages a query touches are read. Queries scan the vectors in blocks, computing the
+    distances of a block to every query with one matrix product, |v|^2 + |q|^2 - 2 v.q, and
+    keeping only the nearest so far; with nine features a blocked scan is faster than a tree,
+    whose pruning barely helps in that many dimensions.
+    """
+
+    def __init__(self, ids, vectors, norms):
+        """
+        Initializes a SimilarityIndex instance.
+
+        Args:
+            ids (np.ndarray): The track IDs as fixed width bytes, sorted.
+            vectors (np.ndarray): The feature vector of each track.
+            norms (np.ndarray): The squared length of each vector.
+        """
+        self.ids = ids
+        self.vectors = vectors
+        self.norms = norms
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_DIR):
+        """
+        Opens a saved index without reading its vectors into memory.
+
+        Raises:
+            FileNotFoundError: If there is no index of the current version at the path.
+        """
+        meta = read_index_meta(path)
+        if meta is None:
+            raise FileNotFoundError(f"No similarity index in '{path}'")
+        paths = index_paths(path)
+        rows = meta['count']
+        return cls(*(np.load(paths[name], mmap_mode='r')[:rows] for name in ('ids', 'vectors', 'norms')))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions_of(self, track_ids):
+        """
+        Finds tracks in the index by ID.
+
+        Returns:
+            np.ndarray: The position of each track in the index, -1 if it is not indexed.
+        """
+        keys = np.array(list(track_ids), dtype=f'S{TRACK_ID_LENGTH}')
+        positions = np.searchsorted(self.ids, keys)
+        found = positions < len(self)
+        found[found] = self.ids[positions[found]] == keys[found]
+        return np.where(found, positions, -1)
+
+    def track_ids(self, positions):
+        return [track_id.decode() for track_id in self.ids[positions]]
+
+    def nearest(self, queries, k, exclude=None):
+        """
+        Finds the k tracks nearest to each query vector.
+
+        Args:
+            queries (np.ndarray): One feature vector per query.
+            k (int): The number of tracks to find for each query.
+            exclude (np.ndarray): Positions of tracks never returned, e.g. the seed tracks.
+        Returns:
+            tuple: The positions and the distances of each query's tracks, nearest first, one row
+                per query; rows are padded with infinite distances if too few tracks are left.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        best_positions = np.empty((len(queries), 0), dtype=np.intp)
+        if k <= 0 or not len(queries):
+            return best_positions, best_distances
+
+        exclude = np.unique(exclude) if exclude is not None else np.empty(0, dtype=np.intp)
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+        block_size = max(1, min(MAX_BLOCK_ROWS, BLOCK_PAIRS // len(queries)))
+
+        with stage('similarity.nearest'):
+            for start in range(0, len(self), block_size):
+                stop = min(start + block_size, len(self))
+                distances = (query_norms[:, None] + self.norms[None, start:stop]
+                             - 2 * queries @ np.asarray(self.vectors[start:stop]).T)
+                excluded = exclude[(exclude >= start) & (exclude < stop)] - start
+                distances[:, excluded] = np.inf
+                positions = np.broadcast_to(np.arange(start, stop), distances.shape)
+
+                # Keep the k nearest of the block together with the k nearest so far
+                distances = np.concatenate([best_distances, distances], axis=1)
+                positions = np.concatenate([best_positions, positions], axis=1)
+                if distances.shape[1] > k:
+                    keep = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                    distances = np.take_along_axis(distances, keep, axis=1)
+                    positions = np.take_along_axis(positions, keep, axis=1)
+                best_distances, best_positions = distances, positions
+
+        order = np.argsort(best_distances, axis=1, kind='stable')
+        distances = np.sqrt(np.maximum(np.take_along_axis(best_distances, order, axis=1), 0))
+        count('similarity.queries', len(queries))
+        return np.take_along_axis(best_positions, order, axis=1), distances
+
+    def within(self, query, radius):
+        """
+        Finds every track within a distance of a query vector.
+
+        Args:
+            query (np.ndarray): The feature vector to search around.
+            radius (float): The largest distance to include.
+        Returns:
+            tuple: The positions and distances of the tracks, nearest first.
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query_norm = float(query @ query)
+        block_size = MAX_BLOCK_ROWS
+        found_positions, found_distances = [], []
+
+        with stage('similarity.within'):
+            for start in range(0, len(self), block_size):
+                stop = min(start + block_size, len(self))
+                distances = query_norm + self.norms[start:stop] - 2 * np.asarray(self.vectors[start:stop]) @ query
+                inside = np.flatnonzero(distances <= radius ** 2)
+                found_positions.append(inside + start)
+                found_distances.append(distances[inside])
+
+        positions = np.concatenate(found_positions) if found_positions else np.empty(0, dtype=np.intp)
+        distances = np.sqrt(np.maximum(np.concatenate(found_distances), 0)) if found_distances else np.empty(0)
+        order = np.argsort(distances, kind='stable')
+        count('similarity.queries')
+        return positions[order], distances[order]
+
+    def similar_tracks(self, seed_ids, size=DEFAULT_SIMILAR_SIZE):
+        """
+        Chooses tracks like a seed playlist, for a new playlist.
+
+        Each seed track contributes its nearest tracks; a candidate near several seeds counts
+        its nearest one. The closest candidates are kept and ordered by the position of their
+        nearest seed, so the new playlist follows the flow of the seed playlist.
+
+        Args:
+            seed_ids (list): The IDs of the seed tracks, in playlist order.
+            size (int): The number of tracks to choose.
+        Returns:
+            list: The IDs of the chosen tracks, never including a seed; empty if no seed is indexed.
+        """
+        positions = self.positions_of(seed_ids)
+        seeds = positions[positions >= 0]
+        if not len(seeds) or size <= 0:
+            return []
+
+        # Spread a long playlist's seeds evenly through it, keeping their order
+        if len(seeds) > MAX_SEED_TRACKS:
+            seeds = seeds[np.linspace(0, len(seeds) - 1, MAX_SEED_TRACKS).astype(int)]
+
+        # Seeds near each other share neighbours, so ask for more until there are enough
+        k = -(-size // len(seeds)) * 2
+        while True:
+            neighbours, distances = self.nearest(self.vectors[seeds], k, exclude=positions[positions >= 0])
+            seed_rows = np.broadcast_to(np.arange(len(seeds))[:, None], neighbours.shape)
+            finite = np.isfinite(distances)
+            neighbours, distances, seed_rows = neighbours[finite], distances[finite], seed_rows[finite]
+
+            # Keep each candidate's nearest seed
+            by_distance = np.argsort(distances, kind='stable')
+            _, first = np.unique(neighbours[by_distance], return_index=True)
+            candidates = by_distance[first]
+            if len(candidates) >= size or k >= len(self):
+                break
+            k *= 2
+
+        chosen = candidates[np.argsort(distances[candidates], kind='stable')[:size]]
+        chosen = chosen[np.lexsort((distances[chosen], seed_rows[chosen]))]
+        return self.track_ids(neighbours[chosen])
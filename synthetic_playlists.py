@@ -0,0 +1,230 @@
+import time
+from array import array
+from collections.abc import Mapping, Sequence
+import numpy as np
+import pandas as pd
+from composite import composite_values
+from mock_spotify import MockSpotify, make_track_item
+from playlist_storage import PLAYLIST_COLUMNS
+
+# The length of Spotify IDs; synthetic IDs are the track or artist number in base 36, zero padded
+ID_LENGTH = 22
+
+# The share of tracks credited to a second artist
+DEFAULT_COLLABORATION_RATE = 0.15
+
+# The number of years the synthetic tracks were added over, ending at DEFAULT_END_DATE
+DEFAULT_YEARS = 5
+DEFAULT_END_DATE = '2024-01-01'
+
+
+def synthetic_id(number):
+    """
+    Returns the 22 character ID of a synthetic track or artist.
+    """
+    return np.base_repr(number, 36).lower().rjust(ID_LENGTH, '0')
+
+
+def synthetic_number(synthetic_id):
+    """
+    Returns the number of a synthetic track or artist from its ID.
+    """
+    return int(synthetic_id, 36)
+
+
+class SyntheticLibrary:
+    """
+    A deterministic library of synthetic tracks with realistic audio features and artists.
+
+    Every column is generated with numpy in one pass and playlist items and audio features
+    are only built when requested, so a library of millions of tracks takes a few bytes per
+    track until it is paged through. Artist popularity follows a Zipf-like law, some tracks
+    are collaborations, additions speed up over time and features follow typical distributions
+    of popular music.
+    """
+
+    def __init__(self, track_count, seed=0, artist_count=None, collaboration_rate=DEFAULT_COLLABORATION_RATE,
+                 missing_features_rate=0.0, years=DEFAULT_YEARS, end_date=DEFAULT_END_DATE):
+        """
+        Initializes a SyntheticLibrary instance, generating every track.
+
+        Args:
+            track_count (int): The number of tracks.
+            seed (int): The seed of the random generator; the same seed gives the same library.
+            artist_count (int): The number of artists, one per 15 tracks (at least 20) if None.
+            collaboration_rate (float): The share of tracks credited to a second artist.
+            missing_features_rate (float): The share of tracks without audio features, like local files.
+            years (int): The number of years the tracks were added over.
+            end_date (str): The date the last track was added before.
+        """
+        rng = np.random.default_rng(seed)
+        self.track_count = track_count
+        self.artist_count = artist_count or max(20, track_count // 15)
+
+        # A few artists have many tracks and most have few
+        popularity = 1 / np.arange(1, self.artist_count + 1) ** 1.1
+        self.primary_artist = rng.choice(self.artist_count, size=track_count, p=popularity / popularity.sum())
+        second_artist = rng.choice(self.artist_count, size=track_count, p=popularity / popularity.sum())
+        collaborations = (rng.random(track_count) < collaboration_rate) & (second_artist != self.primary_artist)
+        self.second_artist = np.where(collaborations, second_artist, -1)
+
+        # Additions speed up over time, and are in playlist order
+        end = pd.Timestamp(end_date, tz='UTC').value // 10 ** 9
+        span = years * 365 * 86400
+        self.added_at = np.sort(end - span + (np.sqrt(rng.random(track_count)) * span).astype(np.int64))
+
+        self.features = pd.DataFrame({
+            'danceability': rng.beta(5, 3, track_count),
+            'energy': rng.beta(5, 3, track_count),
+            'key': rng.integers(0, 12, track_count),
+            'loudness': np.clip(-np.abs(rng.normal(7, 3.5, track_count)), -60, 0),
+            'mode': (rng.random(track_count) < 0.65).astype(int),
+            'speechiness': rng.beta(1, 12, track_count),
+            'acousticness': rng.beta(1, 4, track_count),
+            'instrumentalness': rng.beta(0.5, 5, track_count),
+            'liveness': rng.beta(1.5, 8, track_count),
+            'valence': rng.beta(3, 3, track_count),
+            'tempo': np.clip(rng.normal(120, 25, track_count), 50, 210),
+            'duration_ms': np.clip(rng.normal(210000, 45000, track_count), 60000, 600000).astype(int),
+            'time_signature': rng.choice([3, 4, 5], size=track_count, p=[0.08, 0.9, 0.02])
+        })
+        self.has_features = rng.random(track_count) >= missing_features_rate
+
+        # numpy arrays index much faster than DataFrame rows when single tracks are built
+        self._feature_columns = {column: self.features[column].to_numpy() for column in self.features}
+
+    def track_id(self, index):
+        return synthetic_id(index)
+
+    def artists_of(self, index):
+        """
+        Returns the (ID, name) pairs of the artists of a track.
+        """
+        artists = [self.primary_artist[index]]
+        if self.second_artist[index] >= 0:
+            artists.append(self.second_artist[index])
+        return [(synthetic_id(int(artist)), f'Artist {artist}') for artist in artists]
+
+    def item(self, index):
+        """
+        Builds the playlist item of a track, in the shape returned by the 'playlist_tracks' endpoint.
+        """
+        added_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(int(self.added_at[index])))
+        item = make_track_item(self.track_id(index), f'Track {index}', [], added_at)
+        item['track']['artists'] = [{'id': artist_id, 'name': name} for artist_id, name in self.artists_of(index)]
+        return item
+
+    def track_features(self, index):
+        """
+        Builds the audio features of a track as the 'audio_features' endpoint returns them, None if it has none.
+        """
+        if not self.has_features[index]:
+            return None
+        features = {column: values[index].item() for column, values in self._feature_columns.items()}
+        features['id'] = self.track_id(index)
+        return features
+
+    def dataframe(self):
+        """
+        Builds the playlist data of the whole library directly, as an export of it would write.
+
+        Returns:
+            pd.DataFrame: The playlist data with typed columns.
+        """
+        names = np.array([f'Artist {artist}' for artist in range(self.artist_count)], dtype=object)
+        artists = names[self.primary_artist]
+        collaborations = self.second_artist >= 0
+        artists[collaborations] = artists[collaborations] + ', ' + names[self.second_artist[collaborations]]
+
+        composite = composite_values(self.features)
+        composite[~self.has_features] = np.nan
+        return pd.DataFrame({
+            'Name': [f'Track {index}' for index in range(self.track_count)],
+            'Artist': pd.Categorical(artists),
+            'ID': [synthetic_id(index) for index in range(self.track_count)],
+            'DateAdded': pd.to_datetime(self.added_at, unit='s', utc=True),
+            'Composite Value': composite
+        }, columns=PLAYLIST_COLUMNS)
+
+
+class SyntheticItems(Sequence):
+    """
+    The items of a playlist of synthetic tracks, stored as track numbers and built when read.
+    """
+
+    def __init__(self, library, indices):
+        """
+        Initializes a SyntheticItems instance.
+
+        Args:
+            library (SyntheticLibrary): The library the tracks come from.
+            indices (array): The track numbers, in playlist order.
+        """
+        self.library = library
+        self.indices = array('q', indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.library.item(index) for index in self.indices[position]]
+        return self.library.item(self.indices[position])
+
+    def __setitem__(self, position, items):
+        # Only used to insert items added at a position
+        self.indices[position] = items.indices
+
+    def extend(self, items):
+        self.indices.extend(items.indices)
+
+
+class SyntheticFeatures(Mapping):
+    """
+    The audio features of a library's tracks by track ID, built when looked up.
+    """
+
+    def __init__(self, library):
+        self.library = library
+
+    def __getitem__(self, track_id):
+        index = synthetic_number(track_id)
+        if index >= self.library.track_count:
+            raise KeyError(track_id)
+        return self.library.track_features(index)
+
+    def __len__(self):
+        return self.library.track_count
+
+    def __iter__(self):
+        return (self.library.track_id(index) for index in range(self.library.track_count))
+
+
+class SyntheticSpotify(MockSpotify):
+    """
+    A MockSpotify serving playlists of synthetic tracks.
+
+    Playlists, including the ones published to it, hold track numbers rather than items, so
+    millions of tracks can be exported and published without holding millions of dicts.
+    """
+
+    def __init__(self, library, playlist_sizes=None, **kwargs):
+        """
+        Initializes a SyntheticSpotify instance.
+
+        Args:
+            library (SyntheticLibrary): The library the tracks come from.
+            playlist_sizes (list): The number of tracks of each playlist, taken from the start of
+                the library; one playlist of the whole library if None.
+            **kwargs: Options passed to MockSpotify, e.g. throttle_every.
+        """
+        self.library = library
+        playlist_sizes = playlist_sizes or [library.track_count]
+        playlists = {
+            f'synthetic{number}': {'name': f'Synthetic {number}', 'items': SyntheticItems(library, range(size))}
+            for number, size in enumerate(playlist_sizes)
+        }
+        super().__init__(playlists, SyntheticFeatures(library), **kwargs)
+
+    def _make_items(self, track_ids):
+        return SyntheticItems(self.library, (synthetic_number(track_id) for track_id in track_ids))
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from spotipy.exceptions import SpotifyException
+from async_spotify import AsyncSpotify, get_id, get_uri
+from request_scheduler import RequestScheduler
+
+
+class CannedSpotify(AsyncSpotify):
+    """
+    An AsyncSpotify answering every request with the same response, so no session is opened.
+    """
+
+    def __init__(self, response):
+        super().__init__(auth='token')
+        self.response = response
+        self.requests = []
+
+    async def _request(self, method, url, payload=None, **params):
+        self.requests.append((method, url, params))
+        return self.response
+
+
+@pytest.mark.parametrize('value', [
+    '4uLU6hMCjMI75M1A2tKUQC',
+    'spotify:track:4uLU6hMCjMI75M1A2tKUQC',
+    'https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC?si=abc'
+])
+def test_get_id(value):
+    assert get_id('track', value) == '4uLU6hMCjMI75M1A2tKUQC'
+
+
+@pytest.mark.parametrize('value', [
+    'spotify:album:4uLU6hMCjMI75M1A2tKUQC',
+    'https://open.spotify.com/playlist/4uLU6hMCjMI75M1A2tKUQC'
+])
+def test_get_id_rejects_another_kind(value):
+    with pytest.raises(SpotifyException):
+        get_id('track', value)
+
+
+def test_get_uri():
+    assert get_uri('track', '4uLU6hMCjMI75M1A2tKUQC') == 'spotify:track:4uLU6hMCjMI75M1A2tKUQC'
+    assert get_uri('track', 'spotify:track:4uLU6hMCjMI75M1A2tKUQC') == 'spotify:track:4uLU6hMCjMI75M1A2tKUQC'
+
+
+def test_audio_features():
+    sp = CannedSpotify({'audio_features': [{'id': 'a', 'energy': 0.5}, None]})
+
+    assert asyncio.run(sp.audio_features(['a', 'spotify:track:b'])) == [{'id': 'a', 'energy': 0.5}, None]
+    assert sp.requests == [('GET', 'audio-features/', {'ids': 'a,b'})]
+
+
+def test_audio_features_of_an_empty_response():
+    sp = CannedSpotify(None)
+
+    assert asyncio.run(sp.audio_features(['a', 'b'])) == [None, None]
+    assert asyncio.run(sp.audio_features('a')) == [None]
+
+
+def test_requests_take_tokens_from_a_shared_scheduler():
+    scheduler = RequestScheduler(rate=1000.0, burst=2)
+    clients = [AsyncSpotify(auth='token', scheduler=scheduler) for _ in range(2)]
+
+    async def acquire_all():
+        await asyncio.gather(*(client._acquire() for client in clients for _ in range(3)))
+    asyncio.run(acquire_all())
+
+    # Both clients drew from the one bucket, so after its burst of two the others waited
+    stats = scheduler.stats()
+    assert stats['requests'] == 6
+    assert stats['rate_limit_wait'] > 0
+
+
+def test_a_pause_holds_back_requests_of_every_client():
+    scheduler = RequestScheduler()
+    scheduler.pause(0.05)
+
+    async def acquire():
+        start = asyncio.get_running_loop().time()
+        await AsyncSpotify(auth='token', scheduler=scheduler)._acquire()
+        return asyncio.get_running_loop().time() - start
+
+    assert asyncio.run(acquire()) >= 0.04
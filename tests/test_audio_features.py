@@ -0,0 +1,62 @@
+import pytest
+from feature_cache import FeatureCache
+from mock_spotify import MockSpotify
+from playlist_csv_manager import get_audio_features, get_composite_values, get_playlist_tracks
+from synthetic_playlists import SyntheticLibrary, SyntheticSpotify, synthetic_id
+
+
+@pytest.fixture
+def sp():
+    # One playlist of 250 tracks, 5% of them without audio features
+    return SyntheticSpotify(SyntheticLibrary(250, missing_features_rate=0.05))
+
+
+def test_features_are_requested_in_batches_of_100(sp):
+    # MockSpotify raises ValueError if a request holds more than 100 IDs
+    features = get_audio_features(sp, [synthetic_id(index) for index in range(250)])
+
+    assert sp.request_counts['audio_features'] == 3
+    assert len(features) == 250
+    assert features[synthetic_id(7)] == sp.features[synthetic_id(7)]
+
+
+def test_duplicate_and_missing_ids_are_not_requested(sp):
+    track_ids = [synthetic_id(index % 100) for index in range(250)] + [None, '']
+
+    features = get_audio_features(sp, track_ids)
+
+    assert sp.request_counts['audio_features'] == 1
+    assert len(features) == 100
+
+
+def test_tracks_without_features_get_none():
+    sp = MockSpotify(features={'a': {'id': 'a', 'danceability': 0.5, 'energy': 0.5}})
+
+    values = get_composite_values(sp, ['a', 'b'])
+
+    assert sp.request_counts['audio_features'] == 1
+    assert values[0] is not None
+    assert values[1] is None
+
+
+def test_export_makes_one_features_request_per_page(sp):
+    tracks = get_playlist_tracks(sp, 'synthetic0')
+
+    assert len(tracks) == 250
+    assert sp.request_counts['playlist_tracks'] == 3
+    assert sp.request_counts['audio_features'] == 3
+
+
+def test_cached_features_are_not_requested_again(tmp_path):
+    # Tracks without features are not cached, so every track of this library has them
+    sp = SyntheticSpotify(SyntheticLibrary(250))
+    cache = FeatureCache(str(tmp_path))
+    try:
+        get_playlist_tracks(sp, 'synthetic0', cache)
+        sp.reset_counts()
+
+        get_playlist_tracks(sp, 'synthetic0', cache)
+    finally:
+        cache.close()
+
+    assert sp.request_counts['audio_features'] == 0
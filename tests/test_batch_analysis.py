@@ -0,0 +1,69 @@
+import os
+import batch_analysis
+from batch_analysis import analyse_many, analyse_playlist_file, batch_analyse, find_playlist_files
+from playlist_storage import save_playlist
+from synthetic_playlists import SyntheticLibrary
+
+
+def write_playlists(directory, count=3, tracks=200):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(count):
+        path = os.path.join(directory, f'synthetic{number}.csv')
+        save_playlist(SyntheticLibrary(tracks, seed=number).dataframe(), path)
+        paths.append(path)
+    return paths
+
+
+def test_find_playlist_files_skips_sidecars(tmp_path):
+    paths = write_playlists(str(tmp_path))
+    assert find_playlist_files([str(tmp_path)]) == sorted(paths)
+    assert find_playlist_files([str(tmp_path / 'synthetic1.*')]) == [paths[1]]
+
+
+def test_batch_rows_have_statistics_and_no_error(tmp_path):
+    paths = write_playlists(str(tmp_path))
+    report = analyse_many(paths, equation_number=1, workers=2, chunk_size=1)
+
+    assert report['Path'].tolist() == paths
+    assert report['Error'].isna().all(), report['Error'].tolist()
+    assert report['Tracks'].tolist() == [200, 200, 200]
+    assert report['Tracks per Month'].notna().all()
+    # Rearranging into a straight line orders the composite values, so they follow it closely
+    assert (report['Shape Fit'] > 0.9).all()
+
+
+def test_batch_analyse_writes_the_report(tmp_path):
+    write_playlists(str(tmp_path / 'playlists'), count=2)
+    report_path = str(tmp_path / 'report.csv')
+    charts_dir = str(tmp_path / 'charts')
+
+    report = batch_analyse([str(tmp_path / 'playlists')], report_path, charts_dir=charts_dir, workers=1)
+
+    assert os.path.exists(report_path)
+    assert report['Error'].isna().all(), report['Error'].tolist()
+    assert report['Charts'].tolist() == [3, 3]
+
+
+def test_up_to_date_sidecars_are_used_without_loading_tracks(tmp_path, monkeypatch):
+    path = write_playlists(str(tmp_path), count=1)[0]
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the playlist was loaded')
+    monkeypatch.setattr(batch_analysis, 'load_playlist', fail)
+
+    row = analyse_playlist_file(path)
+    assert 'Error' not in row, row['Error']
+    assert row['Tracks'] == 200
+
+
+def test_playlists_sharing_a_file_name_get_their_own_outputs(tmp_path):
+    paths = write_playlists(str(tmp_path / 'a'), count=1) + write_playlists(str(tmp_path / 'b'), count=1)
+    charts_dir, reshaped_dir = str(tmp_path / 'charts'), str(tmp_path / 'reshaped')
+
+    report = analyse_many(paths, equation_number=1, charts_dir=charts_dir, reshaped_dir=reshaped_dir, workers=1)
+
+    assert report['Error'].isna().all(), report['Error'].tolist()
+    assert report['Playlist'].nunique() == 2
+    assert len(find_playlist_files([reshaped_dir])) == 2
+    assert len(os.listdir(charts_dir)) == 6
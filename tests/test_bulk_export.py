@@ -0,0 +1,46 @@
+import pytest
+from bulk_export import bulk_export
+from feature_cache import FeatureCache
+from playlist_csv_manager import get_playlist_tracks
+from playlist_storage import list_partitions, load_store
+from synthetic_playlists import SyntheticLibrary, SyntheticSpotify
+
+
+@pytest.fixture
+def sp():
+    # Three playlists taken from the start of one library, so they share most of their tracks
+    return SyntheticSpotify(SyntheticLibrary(300, missing_features_rate=0.05), playlist_sizes=[250, 150, 300])
+
+
+def test_shared_tracks_are_looked_up_once(sp, tmp_path):
+    exported = bulk_export(sp, root=str(tmp_path))
+
+    assert exported == {'synthetic0': 250, 'synthetic1': 150, 'synthetic2': 300}
+    assert list_partitions(str(tmp_path)) == ['synthetic0', 'synthetic1', 'synthetic2']
+    # 300 unique tracks are three requests of 100, not seven for the 700 listed tracks
+    assert sp.request_counts['audio_features'] == 3
+
+
+def test_every_playlist_gets_the_composite_values_of_a_single_export(sp, tmp_path):
+    bulk_export(sp, root=str(tmp_path))
+    store = load_store(str(tmp_path))
+
+    for playlist_id in ['synthetic0', 'synthetic1', 'synthetic2']:
+        expected = get_playlist_tracks(sp, playlist_id).to_dataframe()
+        stored = store[store['PlaylistID'] == playlist_id].reset_index(drop=True)
+        assert stored['ID'].tolist() == expected['ID'].tolist()
+        assert stored['Composite Value'].equals(expected['Composite Value'])
+
+
+def test_cached_tracks_are_not_requested(sp, tmp_path):
+    cache = FeatureCache(str(tmp_path / 'cache'))
+    try:
+        bulk_export(sp, ['synthetic1'], str(tmp_path / 'store'), cache)
+        sp.reset_counts()
+
+        bulk_export(sp, root=str(tmp_path / 'store'), cache=cache)
+    finally:
+        cache.close()
+
+    # Only the 150 tracks not in the first playlist, and the few without features, which are never cached, are requested
+    assert sp.request_counts['audio_features'] == 2
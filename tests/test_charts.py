@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from playlist_analysis import downsample_min_max, top_artist_counts
+
+
+def bucket_extremes(y, max_points):
+    """
+    Returns the lowest and highest value of each bucket of a series, computed one bucket at a time.
+    """
+    bucket_size = -(-len(y) // (max_points // 2))
+    return [(np.nanmin(y[start:start + bucket_size]), np.nanmax(y[start:start + bucket_size]))
+            for start in range(0, len(y), bucket_size)]
+
+
+def test_short_series_are_kept_whole():
+    x, y = downsample_min_max(np.arange(10), np.arange(10) * 0.1, max_points=10)
+
+    assert x.tolist() == list(range(10))
+    assert y == pytest.approx(np.arange(10) * 0.1)
+
+
+@pytest.mark.parametrize('length', [2001, 4000, 9999, 100000])
+def test_downsampling_keeps_each_buckets_extremes_in_order(length):
+    rng = np.random.default_rng(length)
+    y = rng.random(length)
+    y[rng.integers(0, length, length // 50)] = np.nan  # Tracks without a composite value
+    x = np.arange(1, length + 1)
+
+    kept_x, kept_y = downsample_min_max(x, y, max_points=2000)
+
+    assert len(kept_x) <= 2000
+    assert np.all(np.diff(kept_x) > 0)
+    assert kept_y == pytest.approx(y[kept_x - 1], nan_ok=True)
+    assert np.nanmax(kept_y) == np.nanmax(y)
+    assert np.nanmin(kept_y) == np.nanmin(y)
+
+    # Every bucket's lowest and highest values are among the points kept from it
+    bucket_size = -(-length // 1000)
+    for number, (lowest, highest) in enumerate(bucket_extremes(y, 2000)):
+        in_bucket = kept_y[(kept_x - 1) // bucket_size == number]
+        assert lowest in in_bucket and highest in in_bucket
+
+
+def test_a_spike_survives_downsampling():
+    y = np.zeros(100000)
+    y[54321] = 1.0
+
+    kept_x, kept_y = downsample_min_max(np.arange(len(y)), y, max_points=500)
+
+    assert 54321 in kept_x
+    assert kept_y.max() == 1.0
+
+
+def test_top_artist_counts_groups_the_rest_as_other():
+    counts = pd.Series(np.arange(30, 0, -1), index=[f'Artist {number}' for number in range(30)])
+
+    top = top_artist_counts(counts, top_n=5)
+
+    assert top.index.tolist() == [f'Artist {number}' for number in range(5)] + ['Other']
+    assert top.iloc[:5].tolist() == [30, 29, 28, 27, 26]
+    assert top['Other'] == counts.iloc[5:].sum()
+    assert top.sum() == counts.sum()
+
+
+def test_top_artist_counts_of_few_artists():
+    counts = pd.Series([3, 2, 0], index=['a', 'b', 'c'])
+
+    # Unused categories are dropped and nothing is grouped
+    assert top_artist_counts(counts, top_n=5).to_dict() == {'a': 3, 'b': 2}
+
+
+def test_top_artist_counts_of_a_categorical_column():
+    artists = pd.Series(['a'] * 5 + ['b'] * 3 + ['c'] * 2 + ['d'], dtype='category')
+
+    top = top_artist_counts(artists.value_counts(), top_n=2)
+
+    assert top.to_dict() == {'a': 5, 'b': 3, 'Other': 3}
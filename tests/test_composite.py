@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from composite import composite_values
+
+
+def original_composite(track_features):
+    """
+    The per-track formula composite values were first computed with.
+    """
+    energy = track_features.get('energy', 1)
+    danceability = track_features.get('danceability', 1)
+    tempo = (min(max(track_features.get('tempo', 1), 60), 140) - 60) / 80
+    loudness = (track_features.get('loudness', 1) + 60) / 60
+    valence = track_features.get('valence', 1)
+    value = energy * danceability * tempo * loudness * valence
+    return np.around(value, 3 - int(np.floor(np.log10(abs(value)))) - 1)
+
+
+TRACKS = [
+    {'energy': 0.8, 'danceability': 0.7, 'tempo': 120.0, 'loudness': -6.0, 'valence': 0.6},
+    {'energy': 0.5, 'danceability': 0.9, 'tempo': 95.0, 'loudness': -12.5},  # No valence
+    {'energy': 0.3, 'tempo': 150.0, 'loudness': -3.0, 'valence': 0.2},  # No danceability
+]
+
+
+def test_matches_the_per_track_formula():
+    expected = [original_composite(track) for track in TRACKS]
+    assert composite_values(pd.DataFrame(TRACKS)).tolist() == expected
+
+
+def test_feature_missing_from_every_track_counts_as_default():
+    tracks = [{key: value for key, value in track.items() if key != 'energy'} for track in TRACKS]
+    expected = [original_composite(track) for track in tracks]
+    assert composite_values(pd.DataFrame(tracks)).tolist() == expected
+
+
+def test_tracks_without_features_stay_missing():
+    table = pd.DataFrame(TRACKS + [{}])
+    values = composite_values(table)
+    assert np.isnan(values[-1])
+    assert values[:-1].tolist() == [original_composite(track) for track in TRACKS]
@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import pandas as pd
+from artist_index import ArtistIndex
+from date_rollup import DateRollup, read_rollup, write_rollup
+from playlist_storage import PlaylistWriter
+from synthetic_playlists import SyntheticLibrary
+from track_table import TrackTable
+
+
+def playlist():
+    """
+    Ten tracks added every third day from 2024-01-29, alternating between two artists.
+    """
+    return pd.DataFrame({
+        'Artist': ['Alpha, Beta', 'Gamma'] * 5,
+        'DateAdded': pd.date_range('2024-01-29', periods=10, freq='3D', tz='UTC')
+    })
+
+
+def test_counts_at_each_level():
+    rollup = DateRollup.from_dataframe(playlist())
+
+    days = rollup.counts('day')
+    assert len(days) == 28  # 2024-01-29 to 2024-02-25, empty days filled with zero
+    assert days.sum() == 10
+    assert rollup.counts('day', fill=False).tolist() == [1] * 10
+
+    months = rollup.counts('month')
+    assert months.index.tolist() == [pd.Timestamp('2024-01-01', tz='UTC'), pd.Timestamp('2024-02-01', tz='UTC')]
+    assert months.tolist() == [1, 9]
+
+    weeks = rollup.counts('week')
+    assert weeks.index[0] == pd.Timestamp('2024-01-29', tz='UTC')  # A Monday
+    assert weeks.sum() == 10
+    assert rollup.counts('year').tolist() == [10]
+
+
+def test_cumulative_and_rolling_rate():
+    rollup = DateRollup.from_dataframe(playlist())
+
+    cumulative = rollup.cumulative('month')
+    assert cumulative.tolist() == [1, 10]
+
+    rate = rollup.rolling_rate(window=2, level='month')
+    assert rate.tolist() == [1.0, 5.0]
+
+
+def test_artist_timeline():
+    rollup = DateRollup.from_dataframe(playlist())
+
+    assert rollup.artist_timeline('Alpha', 'month').tolist() == [1, 4]
+    assert rollup.artist_timeline('Gamma', 'month').tolist() == [5]  # Gamma's tracks were all added in February
+    assert rollup.artist_timeline('Nobody').sum() == 0
+
+
+def test_merge_matches_a_single_rollup():
+    df = playlist()
+    whole = DateRollup.from_dataframe(df)
+    merged = DateRollup.from_dataframe(df.iloc[:4]).merge(DateRollup.from_dataframe(df.iloc[4:]))
+
+    assert merged.total == whole.total == 10
+    pd.testing.assert_series_equal(merged.counts('week'), whole.counts('week'))
+    pd.testing.assert_series_equal(merged.artist_timeline('Beta'), whole.artist_timeline('Beta'))
+
+
+def test_rollup_built_page_by_page_matches_the_full_table(tmp_path):
+    library = SyntheticLibrary(1050, seed=3)
+    tracks = TrackTable.from_items([library.item(index) for index in range(library.track_count)])
+    artists = ArtistIndex()
+    artists.add_table(tracks)
+    expected = DateRollup.from_dataframe(tracks.to_dataframe(), artists).to_dict()
+
+    # Each page is rolled up with an index of its own artists, as PlaylistWriter does
+    pages = []
+    for start in range(0, len(tracks), 100):
+        page = tracks.take(range(start, min(start + 100, len(tracks))))
+        page_artists = ArtistIndex()
+        page_artists.add_table(page)
+        pages.append(DateRollup.from_dataframe(page.to_dataframe(), page_artists))
+    assert DateRollup.concat(pages).to_dict() == expected
+
+    path = str(tmp_path / 'playlist.csv')
+    with PlaylistWriter(path) as writer:
+        for start in range(0, len(tracks), 100):
+            writer.write(tracks.take(range(start, min(start + 100, len(tracks)))))
+    assert read_rollup(path).to_dict() == expected
+
+
+def test_sidecar_round_trip(tmp_path):
+    path = tmp_path / 'playlist.csv'
+    path.write_text('')
+    rollup = DateRollup.from_dataframe(playlist())
+    write_rollup(rollup, str(path))
+
+    loaded = read_rollup(str(path))
+    assert np.array_equal(loaded.day_counts, rollup.day_counts)
+    pd.testing.assert_series_equal(loaded.artist_timeline('Gamma'), rollup.artist_timeline('Gamma'))
+
+    # A changed file makes the sidecar stale
+    path.write_text('changed')
+    os.utime(path, ns=(0, 0))
+    assert read_rollup(str(path)) is None
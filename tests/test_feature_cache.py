@@ -0,0 +1,66 @@
+import pytest
+import SpotifyAPI
+from feature_cache import FeatureCache
+
+
+def features(energy):
+    return {'danceability': 0.5, 'energy': energy}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = FeatureCache(str(tmp_path), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_the_least_recently_used_tracks_are_evicted(cache, monkeypatch):
+    now = iter(range(100))
+    monkeypatch.setattr('feature_cache.time.time', lambda: next(now))
+    cache.put_many({'a': features(0.1), 'b': features(0.2), 'c': features(0.3)})
+
+    # Looking 'a' up makes 'b' the least recently used track
+    cache.get_many(['a'])
+    cache.put_many({'d': features(0.4)})
+
+    assert len(cache) == 3
+    assert set(cache.get_many(['a', 'b', 'c', 'd'])) == {'a', 'c', 'd'}
+
+
+def test_cached_features_round_trip(cache):
+    cache.put_many({'a': features(0.1), 'b': None})
+
+    assert cache.get_many(['a', 'b']) == {'a': features(0.1)}
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_invalidate_removes_only_the_given_tracks(cache):
+    cache.put_many({'a': features(0.1), 'b': features(0.2)})
+    generation = cache.generation()
+
+    assert cache.invalidate(['a', 'missing']) == 1
+    assert set(cache.get_many(['a', 'b'])) == {'b'}
+    assert cache.generation() > generation
+
+    # Removing nothing leaves the generation as it was
+    generation = cache.generation()
+    assert cache.invalidate(['a']) == 0
+    assert cache.generation() == generation
+
+
+def test_invalidate_without_ids_clears_the_cache(cache):
+    cache.put_many({'a': features(0.1), 'b': features(0.2)})
+
+    assert cache.invalidate() == 2
+    assert len(cache) == 0
+
+
+def test_clear_cache_command(tmp_path, capsys):
+    cache = FeatureCache(str(tmp_path))
+    cache.put_many({'a': features(0.1), 'b': features(0.2), 'c': features(0.3)})
+    cache.close()
+
+    SpotifyAPI.main(['--cache-dir', str(tmp_path), 'clear-cache', 'a', 'b'])
+    assert "Removed 2 tracks" in capsys.readouterr().out
+    SpotifyAPI.main(['--cache-dir', str(tmp_path), 'clear-cache'])
+    assert "Removed 1 tracks" in capsys.readouterr().out
@@ -0,0 +1,27 @@
+import json
+import pytest
+import SpotifyAPI
+from playlist_storage import save_playlist
+from synthetic_playlists import SyntheticLibrary
+
+
+def test_bad_jobs_do_not_stop_the_others(tmp_path, capsys):
+    path = str(tmp_path / 'playlist.csv')
+    save_playlist(SyntheticLibrary(50).dataframe(), path)
+    job_file = tmp_path / 'jobs.json'
+    job_file.write_text(json.dumps([
+        ['analyse', '--no-such-option'],             # Rejected by argparse
+        ['jobs', 'other.json'],                       # Jobs cannot nest
+        ['--key-file', 'other.txt', 'analyse', '-i', path],  # Global options apply to the whole file
+        'analyse',                                    # Not an argument list
+        ['analyse', '-i', path]
+    ]))
+
+    with pytest.raises(SystemExit) as exit_info:
+        SpotifyAPI.main(['--cache-dir', str(tmp_path / 'cache'), 'jobs', str(job_file)])
+
+    assert exit_info.value.code == "4 of 5 jobs failed"
+    out = capsys.readouterr().out
+    assert "Job 1 failed: invalid arguments" in out
+    assert "Job 3 failed: --key-file must be given before 'jobs'" in out
+    assert "Number of Tracks: 50" in out
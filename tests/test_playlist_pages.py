@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+import pytest
+from playlist_csv_manager import iter_playlist_pages
+from synthetic_playlists import SyntheticLibrary, SyntheticSpotify
+
+
+class JitteringSpotify(SyntheticSpotify):
+    """
+    A SyntheticSpotify whose page requests take a random time, so concurrent pages finish out of order.
+    """
+
+    def __init__(self, library, playlist_sizes, with_total=True):
+        """
+        Args:
+            library (SyntheticLibrary): The library the tracks come from.
+            playlist_sizes (list): The number of tracks of each playlist.
+            with_total (bool): Whether pages report the playlist's total, as the API normally does.
+        """
+        super().__init__(library, playlist_sizes)
+        self.with_total = with_total
+        self._random = random.Random(0)
+        self._random_lock = threading.Lock()
+
+    def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0, market=None, additional_types=('track',)):
+        with self._random_lock:
+            delay = self._random.uniform(0, 0.005)
+        time.sleep(delay)
+        page = super().playlist_tracks(playlist_id, fields, limit, offset, market, additional_types)
+        if not self.with_total:
+            page = {key: value for key, value in page.items() if key != 'total'}
+        return page
+
+
+def fetch(sp, concurrency):
+    """
+    Returns the track IDs of each page of the first playlist, and the number of page requests made.
+    """
+    sp.reset_counts()
+    pages = [page.track_ids() for page in iter_playlist_pages(sp, 'synthetic0', concurrency=concurrency)]
+    return pages, sp.request_counts['playlist_tracks']
+
+
+@pytest.mark.parametrize('track_count', [0, 1, 99, 100, 101, 250, 1000, 1001])
+@pytest.mark.parametrize('concurrency', [2, 8])
+def test_concurrent_pages_match_serial_pages(track_count, concurrency):
+    sp = JitteringSpotify(SyntheticLibrary(max(track_count, 1)), [track_count])
+
+    serial_pages, serial_requests = fetch(sp, 1)
+    concurrent_pages, concurrent_requests = fetch(sp, concurrency)
+
+    assert concurrent_pages == serial_pages
+    assert [track_id for page in serial_pages for track_id in page] == [
+        sp.library.track_id(index) for index in range(track_count)
+    ]
+    # The total is known from the first page, so no empty page is ever requested
+    assert concurrent_requests == serial_requests == max(1, -(-track_count // 100))
+    assert all(0 < len(page) <= 100 for page in serial_pages)
+
+
+@pytest.mark.parametrize('track_count', [1, 100, 250])
+def test_pages_without_a_total_stop_at_the_first_empty_page(track_count):
+    sp = JitteringSpotify(SyntheticLibrary(track_count), [track_count], with_total=False)
+
+    pages, requests = fetch(sp, 4)
+
+    assert [track_id for page in pages for track_id in page] == [
+        sp.library.track_id(index) for index in range(track_count)
+    ]
+    # Without a total the pages are walked until an empty one comes back
+    assert requests == -(-track_count // 100) + 1
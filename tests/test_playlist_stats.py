@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from playlist_stats import HISTOGRAM_BINS, SKETCH_ERROR, CountDistinctSketch, PlaylistStats, round_estimate
+from synthetic_playlists import SyntheticLibrary
+from track_table import TrackTable
+
+
+@pytest.fixture
+def df():
+    library = SyntheticLibrary(3000)
+    tracks = TrackTable.from_items([library.item(index) for index in range(library.track_count)])
+    # One track in twenty has no audio features, so no composite value
+    values = np.random.default_rng(0).random(len(tracks))
+    tracks.set_composites([None if index % 20 == 0 else value for index, value in enumerate(values)])
+    return tracks.to_dataframe()
+
+
+def merge_pages(df, page_size):
+    """
+    Merges the statistics of the pages of a DataFrame, as a batched export does.
+    """
+    stats = PlaylistStats()
+    for start in range(0, len(df), page_size):
+        stats = stats.merge(PlaylistStats.from_dataframe(df.iloc[start:start + page_size], exact=False))
+    return stats
+
+
+@pytest.mark.parametrize('page_size', [1, 7, 100, 3000])
+def test_merged_mean_and_std_match_the_whole_data(df, page_size):
+    stats = merge_pages(df, page_size)
+    composite = df['Composite Value'].astype(float)
+
+    assert stats.rows == len(df)
+    assert stats.composite_count == composite.count()
+    assert stats.composite_mean == pytest.approx(composite.mean(), rel=1e-12)
+    assert stats.composite_std == pytest.approx(composite.std(), rel=1e-9)
+    assert stats.highest['Composite Value'] == composite.max()
+    assert stats.lowest['Composite Value'] == composite.min()
+
+
+def test_merged_quantiles_are_the_bin_of_a_track(df):
+    stats = merge_pages(df, 100)
+    values = df['Composite Value'].dropna().to_numpy()
+
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        # The estimate is the middle of the bin of the track the quantile rounds down to
+        track_value = np.quantile(values, q, method='lower')
+        assert int(stats.composite_quantile(q) * HISTOGRAM_BINS) == int(track_value * HISTOGRAM_BINS)
+        assert stats.composite_quantile(q) == pytest.approx(np.quantile(values, q), abs=2 / HISTOGRAM_BINS)
+
+
+@pytest.mark.parametrize('count', [100, 1000, 20000, 100000])
+def test_merged_sketch_estimates_are_within_three_standard_errors(count):
+    names = pd.Series([f"Track {number}" for number in range(count)])
+    sketches = []
+    for start in range(0, count, 1000):
+        sketch = CountDistinctSketch()
+        # Every page repeats some names of the page before it
+        sketch.add(names.iloc[max(0, start - 100):start + 1000])
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged = merged.merge(sketch)
+
+    assert merged.estimate() == pytest.approx(count, rel=3 * SKETCH_ERROR)
+
+
+def test_statistics_of_the_whole_data_are_exact(df):
+    stats = PlaylistStats.from_dataframe(df)
+    composite = df['Composite Value'].astype(float)
+
+    assert stats.composite_quantile(0.5) == composite.median()
+    assert stats.composite_quantile(0.25) == composite.quantile(0.25)
+    assert stats.unique_names() == df['Name'].nunique()
+    assert PlaylistStats.from_dict(stats.to_dict()).composite_quantile(0.75) == composite.quantile(0.75)
+
+
+def test_merged_statistics_only_have_estimates(df):
+    stats = PlaylistStats.from_dataframe(df.iloc[:1000]).merge(PlaylistStats.from_dataframe(df.iloc[1000:]))
+
+    assert stats.exact is None
+    assert stats.unique_names() == stats.names.estimate()
+
+
+def test_report_labels_estimates(df, capsys):
+    PlaylistStats.from_dataframe(df).report()
+    exact_report = capsys.readouterr().out
+    merge_pages(df, 100).report()
+    estimated_report = capsys.readouterr().out
+
+    assert 'estimate' not in exact_report
+    assert f"Number of Unique Songs: {df['Name'].nunique()}\n" in exact_report
+    assert f"Composite Value Median: {df['Composite Value'].median():.3f}\n" in exact_report
+    assert 'Number of Unique Songs: about' in estimated_report
+    assert 'Composite Value Median:' in estimated_report and '(estimate)' in estimated_report
+
+
+def test_round_estimate():
+    # Two standard errors of 1000 are about 16, so the estimate is good to the nearest ten
+    assert round_estimate(981) == 980
+    assert round_estimate(99601) == 100000
+    assert round_estimate(37) == 37
@@ -0,0 +1,106 @@
+import os
+import pandas as pd
+import pytest
+from artist_index import ArtistIndex
+from playlist_stats import PlaylistStats, read_stats
+from playlist_storage import (
+    DEFAULT_PLAYLIST_PATH, LEGACY_CSV_PATH, PlaylistWriter, load_playlist, read_artist_index, save_playlist
+)
+from synthetic_playlists import SyntheticLibrary
+from track_table import TrackTable
+
+
+@pytest.fixture(params=['csv', 'parquet', 'feather'])
+def extension(request):
+    if request.param != 'csv':
+        pytest.importorskip('pyarrow')
+    return request.param
+
+
+def test_writer_replaces_the_file_on_success(tmp_path, extension):
+    path = str(tmp_path / f'playlist.{extension}')
+    save_playlist(SyntheticLibrary(10).dataframe(), path)
+    tracks = TrackTable.from_dataframe(SyntheticLibrary(30, seed=1).dataframe())
+
+    with PlaylistWriter(path) as writer:
+        writer.write(tracks.take(range(0, 20)))
+        writer.write(tracks.take(range(20, 30)))
+
+    assert len(load_playlist(path)) == 30
+    assert not os.path.exists(f'{path}.partial')
+
+
+def library_tracks(track_count):
+    """
+    Returns the tracks of a synthetic library with their credited artists, as an export pages them.
+    """
+    library = SyntheticLibrary(track_count, seed=2)
+    return TrackTable.from_items([library.item(index) for index in range(track_count)])
+
+
+def write_pages(tracks, path, page_size=100):
+    """
+    Writes tracks through a PlaylistWriter one page at a time.
+    """
+    with PlaylistWriter(path) as writer:
+        for start in range(0, len(tracks), page_size):
+            writer.write(tracks.take(range(start, min(start + page_size, len(tracks)))))
+
+
+def test_writer_artist_index_and_stats_match_the_full_table(tmp_path):
+    path = str(tmp_path / 'playlist.csv')
+    tracks = library_tracks(1050)
+
+    write_pages(tracks, path)
+
+    artists = ArtistIndex()
+    artists.add_table(tracks)
+    saved_artists = read_artist_index(path)
+    for saved, expected in zip(saved_artists.to_frames(), artists.to_frames()):
+        pd.testing.assert_frame_equal(saved, expected)
+
+    expected_stats = PlaylistStats.from_dataframe(tracks.to_dataframe(), artists).to_dict()
+    stats = read_stats(path).to_dict()
+    assert stats.pop('composite_mean') == pytest.approx(expected_stats.pop('composite_mean'))
+    assert stats.pop('composite_m2') == pytest.approx(expected_stats.pop('composite_m2'))
+    assert stats == expected_stats
+
+
+def test_failed_write_keeps_the_existing_file_and_a_readable_partial_file(tmp_path, extension):
+    path = str(tmp_path / f'playlist.{extension}')
+    save_playlist(SyntheticLibrary(10).dataframe(), path)
+    tracks = TrackTable.from_dataframe(SyntheticLibrary(30, seed=1).dataframe())
+
+    with pytest.raises(RuntimeError):
+        with PlaylistWriter(path) as writer:
+            writer.write(tracks.take(range(0, 10)))
+            writer.write(tracks.take(range(10, 20)))
+            raise RuntimeError("page fetch failed")
+
+    assert len(load_playlist(path)) == 10
+    partial = load_playlist(f'{path}.partial')
+    assert partial['ID'].tolist() == tracks.track_ids()[:20]
+
+
+def test_failure_before_the_first_batch_keeps_the_existing_file(tmp_path):
+    path = str(tmp_path / 'playlist.csv')
+    save_playlist(SyntheticLibrary(10).dataframe(), path)
+
+    with pytest.raises(RuntimeError):
+        with PlaylistWriter(path):
+            raise RuntimeError("page fetch failed")
+
+    assert len(load_playlist(path)) == 10
+
+
+def test_legacy_csv_is_only_imported_into_the_default_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_playlist(SyntheticLibrary(10).dataframe(), LEGACY_CSV_PATH)
+
+    with pytest.raises(FileNotFoundError):
+        load_playlist('other.csv')
+    assert not os.path.exists('other.csv')
+
+    if DEFAULT_PLAYLIST_PATH != LEGACY_CSV_PATH:
+        assert len(load_playlist()) == 10
+        assert os.path.exists(DEFAULT_PLAYLIST_PATH)
@@ -0,0 +1,210 @@
+import os
+import random
+import pytest
+from mock_spotify import MockSpotify, make_track_item
+from playlist_maker import get_playlist_track_ids, plan_reorder_moves, publish_playlist, read_checkpoint, reorder_playlist
+from synthetic_playlists import SyntheticLibrary, SyntheticSpotify, synthetic_id
+
+# The tracks published by the tests, more than two chunks of 100
+TRACK_IDS = [synthetic_id(index) for index in range(250)]
+
+
+class PublishInterrupted(Exception):
+    """
+    Stands in for a crash or lost connection partway through a publish.
+    """
+
+
+class InterruptingSpotify(SyntheticSpotify):
+    """
+    A SyntheticSpotify that is interrupted on one call of 'playlist_add_items'.
+    """
+
+    def __init__(self, library, interrupt_on, after_adding=False):
+        """
+        Args:
+            library (SyntheticLibrary): The library the tracks come from.
+            interrupt_on (int): The number of the add request that is interrupted, counting from 1.
+            after_adding (bool): Interrupt once the tracks are added, as if only the response was lost.
+        """
+        super().__init__(library)
+        self.interrupt_on = interrupt_on
+        self.after_adding = after_adding
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        if self.request_counts['playlist_add_items'] + 1 == self.interrupt_on:
+            if self.after_adding:
+                super().playlist_add_items(playlist_id, items, position)
+            else:
+                self._request('playlist_add_items')
+            raise PublishInterrupted('interrupted')
+        return super().playlist_add_items(playlist_id, items, position)
+
+
+@pytest.fixture
+def library():
+    return SyntheticLibrary(300)
+
+
+def apply_moves(current, moves):
+    """
+    Applies reorder moves to a list the way the 'playlist_reorder_items' endpoint does.
+    """
+    current = list(current)
+    for range_start, insert_before, range_length in moves:
+        block = current[range_start:range_start + range_length]
+        del current[range_start:range_start + range_length]
+        insert_at = insert_before if insert_before <= range_start else insert_before - range_length
+        current[insert_at:insert_at] = block
+    return current
+
+
+def test_plan_reorder_moves_of_the_same_order():
+    assert plan_reorder_moves(list('abcde'), list('abcde')) == []
+
+
+def test_plan_reorder_moves_moves_blocks_in_one_request():
+    # The block c, d, e moves to the front in one request
+    moves = plan_reorder_moves(list('abcde'), list('cdeab'))
+
+    assert moves == [(2, 0, 3)]
+    assert apply_moves('abcde', moves) == list('cdeab')
+
+
+def test_plan_reorder_moves_reaches_the_target():
+    target = list(range(200))
+    current = target[:]
+    random.Random(0).shuffle(current)
+
+    assert apply_moves(current, plan_reorder_moves(current, target)) == target
+
+
+def test_plan_reorder_moves_gives_up_after_max_moves():
+    assert plan_reorder_moves(list('abcde'), list('edcba'), max_moves=2) is None
+
+
+def test_reorder_playlist_uses_reorder_requests(library):
+    sp = SyntheticSpotify(library, playlist_sizes=[250])
+    track_ids = TRACK_IDS[200:] + TRACK_IDS[:200]
+    sp.reset_counts()
+
+    assert reorder_playlist(sp, 'synthetic0', track_ids) == 1
+    assert sp.request_counts['playlist_reorder_items'] == 1
+    assert get_playlist_track_ids(sp, 'synthetic0') == track_ids
+
+
+def test_reorder_playlist_replaces_a_shuffled_playlist(library):
+    sp = SyntheticSpotify(library, playlist_sizes=[250])
+    track_ids = TRACK_IDS[:]
+    random.Random(0).shuffle(track_ids)
+    sp.reset_counts()
+
+    # Three replace requests are fewer than one reorder request per misplaced track
+    assert reorder_playlist(sp, 'synthetic0', track_ids) == 3
+    assert sp.request_counts['playlist_reorder_items'] == 0
+    assert get_playlist_track_ids(sp, 'synthetic0') == track_ids
+
+
+def local_file_spotify(track_ids, local_positions):
+    """
+    Returns a MockSpotify with one playlist of the tracks, with local files (no ID) at the given positions.
+    """
+    items = [make_track_item(track_id, track_id, ['Artist'], '2024-01-01T00:00:00Z') for track_id in track_ids]
+    for position in local_positions:
+        items.insert(position, make_track_item(None, f'Local {position}', ['Artist'], '2024-01-01T00:00:00Z'))
+    return MockSpotify({'mixed': {'name': 'Mixed', 'items': items}})
+
+
+def test_reorder_playlist_keeps_local_files_in_place():
+    sp = local_file_spotify(TRACK_IDS[:20], [0, 5, 12])
+    track_ids = TRACK_IDS[:20]
+    random.Random(0).shuffle(track_ids)
+
+    reorder_playlist(sp, 'mixed', track_ids)
+
+    assert sp.request_counts['playlist_replace_items'] == 0
+    names = [item['track']['name'] for item in sp.playlists['mixed']['items']]
+    assert [names[position] for position in (0, 5, 12)] == ['Local 0', 'Local 5', 'Local 12']
+    assert [name for name in names if not name.startswith('Local')] == track_ids
+
+
+def test_reorder_playlist_refuses_to_replace_local_files():
+    sp = local_file_spotify(TRACK_IDS[:20], [3])
+
+    with pytest.raises(ValueError):
+        reorder_playlist(sp, 'mixed', TRACK_IDS[10:30])
+    assert sp.request_counts['playlist_replace_items'] == 0
+    assert len(sp.playlists['mixed']['items']) == 21
+
+
+def test_publish_adds_chunks_of_100(library, tmp_path):
+    sp = SyntheticSpotify(library)
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+
+    playlist_id = publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+
+    assert sp.request_counts['playlist_add_items'] == 3
+    assert get_playlist_track_ids(sp, playlist_id) == TRACK_IDS
+    assert not os.path.exists(checkpoint_path)
+
+
+@pytest.mark.parametrize('after_adding', [False, True])
+def test_publish_resumes_without_adding_tracks_twice(library, tmp_path, after_adding):
+    sp = InterruptingSpotify(library, interrupt_on=2, after_adding=after_adding)
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+
+    with pytest.raises(PublishInterrupted):
+        publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+    checkpoint = read_checkpoint(checkpoint_path)
+    assert checkpoint['added'] == 100
+
+    # Resume with the same tracks: the playlist is reused, whether or not the second chunk landed
+    sp.interrupt_on = 0
+    playlist_id = publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+
+    assert playlist_id == checkpoint['playlist_id']
+    assert sp.request_counts['user_playlist_create'] == 1
+    assert get_playlist_track_ids(sp, playlist_id) == TRACK_IDS
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_publish_of_other_tracks_starts_a_new_playlist(library, tmp_path):
+    sp = InterruptingSpotify(library, interrupt_on=2)
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    with pytest.raises(PublishInterrupted):
+        publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+
+    sp.interrupt_on = 0
+    playlist_id = publish_playlist(sp, 'Other', TRACK_IDS[:50], checkpoint_path)
+
+    assert sp.request_counts['user_playlist_create'] == 2
+    assert get_playlist_track_ids(sp, playlist_id) == TRACK_IDS[:50]
+
+
+def test_resumed_publish_takes_the_new_name(library, tmp_path):
+    sp = InterruptingSpotify(library, interrupt_on=2)
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    with pytest.raises(PublishInterrupted):
+        publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+
+    sp.interrupt_on = 0
+    playlist_id = publish_playlist(sp, 'Renamed', TRACK_IDS, checkpoint_path)
+
+    assert sp.request_counts['user_playlist_create'] == 1
+    assert sp.playlists[playlist_id]['name'] == 'Renamed'
+    assert get_playlist_track_ids(sp, playlist_id) == TRACK_IDS
+
+
+def test_publish_starts_again_if_the_interrupted_playlist_was_deleted(library, tmp_path):
+    sp = InterruptingSpotify(library, interrupt_on=2)
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    with pytest.raises(PublishInterrupted):
+        publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+    del sp.playlists[read_checkpoint(checkpoint_path)['playlist_id']]
+
+    sp.interrupt_on = 0
+    playlist_id = publish_playlist(sp, 'Published', TRACK_IDS, checkpoint_path)
+
+    assert sp.request_counts['user_playlist_create'] == 2
+    assert get_playlist_track_ids(sp, playlist_id) == TRACK_IDS
+    assert not os.path.exists(checkpoint_path)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from benchmarks.bench_rearrange import legacy_rearrange_to_shape, make_playlist
+from playlist_analysis import SHAPES, rearrange_to_shape
+
+
+@pytest.mark.parametrize('track_count', [1, 2, 3333, 10000, 100000])
+@pytest.mark.parametrize('equation_number', [1, 2, 3, 4, 5, 6])
+def test_same_permutation_as_the_original(track_count, equation_number):
+    # Composite values are rounded to 3 significant figures, so many tie
+    df = make_playlist(track_count)
+
+    result = rearrange_to_shape(df, equation_number)
+
+    expected = legacy_rearrange_to_shape(df, equation_number)
+    assert np.array_equal(result['ID'].to_numpy(), expected['ID'].to_numpy())
+
+
+@pytest.mark.parametrize('equation_number', sorted(SHAPES))
+def test_every_shape_is_a_permutation(equation_number):
+    df = make_playlist(1000)
+
+    result = rearrange_to_shape(df, equation_number)
+
+    assert sorted(result['ID']) == list(range(1000))
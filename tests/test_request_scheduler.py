@@ -0,0 +1,116 @@
+import pytest
+from spotipy.exceptions import SpotifyException
+from mock_spotify import MockSpotify
+from request_scheduler import RequestScheduler, ScheduledSpotify, get_retry_after
+
+
+class FakeClock:
+    """
+    A clock that only moves when the scheduler sleeps, so tests never wait.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def scheduled(spotify, **options):
+    """
+    Wraps a MockSpotify in a ScheduledSpotify whose scheduler runs on a FakeClock.
+    """
+    clock = FakeClock()
+    scheduler = RequestScheduler(sleep=clock.sleep, clock=clock, **options)
+    return ScheduledSpotify(spotify, scheduler), clock
+
+
+def test_throttled_requests_wait_for_retry_after():
+    spotify = MockSpotify(throttle_every=3, retry_after=2)
+    sp, clock = scheduled(spotify)
+
+    for _ in range(5):
+        assert sp.current_user()['id'] == 'mock_user'
+
+    # Requests 3 and 6 were throttled, then retried as requests 4 and 7
+    assert spotify.injected_errors[429] == 2
+    assert spotify.request_counts['current_user'] == 7
+    stats = sp.scheduler.stats()
+    assert stats['throttled'] == 2
+    assert stats['retries'] == 2
+    assert stats['server_errors'] == 0
+    assert clock.sleeps.count(2.0) == 2
+
+
+def test_server_errors_are_retried_with_backoff():
+    spotify = MockSpotify(server_error_every=2)
+    sp, clock = scheduled(spotify)
+
+    for _ in range(4):
+        sp.current_user()
+
+    # Requests 2, 4 and 6 failed, then were retried as requests 3, 5 and 7
+    assert spotify.injected_errors[503] == 3
+    assert spotify.request_counts['current_user'] == 7
+    stats = sp.scheduler.stats()
+    assert stats['server_errors'] == 3
+    assert stats['retries'] == 3
+    assert stats['failures'] == 0
+    assert stats['backoff_wait'] == pytest.approx(sum(clock.sleeps))
+
+
+def test_requests_fail_after_max_retries():
+    spotify = MockSpotify(server_error_every=1)
+    sp, _ = scheduled(spotify, max_retries=2)
+
+    with pytest.raises(SpotifyException) as error:
+        sp.current_user()
+
+    assert error.value.http_status == 503
+    assert spotify.request_counts['current_user'] == 3
+    assert sp.scheduler.stats()['failures'] == 1
+
+
+def test_other_errors_are_not_retried():
+    spotify = MockSpotify()
+    sp, _ = scheduled(spotify)
+
+    # MockSpotify rejects requests of more than 100 IDs
+    with pytest.raises(ValueError):
+        sp.audio_features([str(number) for number in range(101)])
+
+    assert spotify.request_counts['audio_features'] == 1
+    assert sp.scheduler.stats()['retries'] == 0
+
+
+def test_requests_are_limited_to_the_rate():
+    sp, clock = scheduled(MockSpotify(), rate=10.0, burst=5)
+
+    for _ in range(15):
+        sp.current_user()
+
+    # The burst is sent at once, then one request per tenth of a second
+    assert clock.now == pytest.approx(1.0)
+
+
+def test_reserve_does_not_wait():
+    clock = FakeClock()
+    scheduler = RequestScheduler(rate=10.0, burst=1, sleep=clock.sleep, clock=clock)
+
+    assert scheduler.reserve() == 0.0
+    assert scheduler.reserve() == pytest.approx(0.1)
+    scheduler.pause(2.0)
+    assert scheduler.reserve() == pytest.approx(2.0)
+    assert clock.sleeps == []
+
+
+def test_get_retry_after():
+    assert get_retry_after(SpotifyException(429, -1, 'rate limited', headers={'Retry-After': '3'})) == 3.0
+    assert get_retry_after(SpotifyException(429, -1, 'rate limited', headers={'retry-after': '1.5'})) == 1.5
+    assert get_retry_after(SpotifyException(429, -1, 'rate limited')) is None
+    assert get_retry_after(SpotifyException(429, -1, 'rate limited', headers={'Retry-After': 'soon'})) is None
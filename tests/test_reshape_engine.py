@@ -0,0 +1,100 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from reshape_engine import RESHAPE_FEATURES, ReshapeProblem, reshape_playlist
+
+
+def random_table(track_count, seed=0):
+    """
+    Returns random normalised features for a playlist, as reshape_features builds them.
+    """
+    rng = np.random.default_rng(seed)
+    table = pd.DataFrame(rng.random((track_count, len(RESHAPE_FEATURES))), columns=list(RESHAPE_FEATURES))
+    table['bpm'] = rng.uniform(70, 170, track_count)
+    table['key'] = rng.integers(0, 12, track_count).astype(float)
+    table['mode'] = rng.integers(0, 2, track_count).astype(float)
+    return table
+
+
+def brute_force_cost(problem):
+    """
+    Returns the lowest cost of any order, trying every one.
+    """
+    return min(problem.total_cost(np.array(order)) for order in itertools.permutations(range(problem.track_count)))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_assignment_order_is_optimal(seed):
+    pytest.importorskip('scipy')
+    problem = ReshapeProblem(random_table(7, seed), {'energy': 9, 'tempo': 1, 'valence': 3})
+
+    assert problem.total_cost(problem.assignment_order()) == pytest.approx(brute_force_cost(problem))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_projection_order_is_optimal_for_one_feature(seed):
+    problem = ReshapeProblem(random_table(7, seed), {'energy': 3})
+
+    assert problem.total_cost(problem.projection_order()) == pytest.approx(brute_force_cost(problem))
+
+
+def test_swap_deltas_match_the_change_in_cost():
+    problem = ReshapeProblem(random_table(40), {'energy': 9, 'tempo': 1}, tempo_smoothness=1.0, key_smoothness=0.5)
+    order = np.random.default_rng(1).permutation(40)
+    first = np.array([0, 0, 5, 10, 37])
+    second = np.array([2, 39, 20, 12, 39])
+
+    deltas = problem.swap_deltas(order, first, second)
+
+    for i, j, delta in zip(first, second, deltas):
+        swapped = order.copy()
+        swapped[i], swapped[j] = swapped[j], swapped[i]
+        assert problem.total_cost(swapped) - problem.total_cost(order) == pytest.approx(delta)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_improve_never_makes_the_order_worse(seed):
+    problem = ReshapeProblem(random_table(300, seed), {'energy': 9, 'tempo': 1}, tempo_smoothness=1.0, key_smoothness=1.0)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(300)
+
+    # Record the cost of the order at the start of every batch of swaps
+    costs = []
+    swap_deltas = problem.swap_deltas
+    def recording_swap_deltas(order, first, second):
+        costs.append(problem.total_cost(order))
+        return swap_deltas(order, first, second)
+    problem.swap_deltas = recording_swap_deltas
+
+    _, swaps = problem.improve(order, float('inf'), rng)
+    costs.append(problem.total_cost(order))
+
+    assert swaps > 0
+    assert costs[-1] < costs[0]
+    assert all(later <= earlier + 1e-9 for earlier, later in zip(costs, costs[1:]))
+    # The tracks are only moved, never lost or repeated
+    assert sorted(order) == list(range(300))
+
+
+def test_reshape_keeps_to_the_time_budget():
+    # A playlist large enough that the swaps would not run out of improvements within the budget
+    table = random_table(50000)
+    df = pd.DataFrame({'ID': [str(number) for number in range(len(table))]})
+
+    _, summary = reshape_playlist(df, table, {'energy': 9, 'tempo': 1}, tempo_smoothness=1.0,
+                                  method='greedy', time_budget=0.3)
+
+    # The deadline is checked between batches, so the search ends within one batch of it
+    assert summary['seconds'] < 0.3 + 0.5
+    assert summary['cost'] <= summary['initial_cost']
+
+
+def test_a_zero_time_budget_only_finds_the_starting_order():
+    table = random_table(500)
+    df = pd.DataFrame({'ID': [str(number) for number in range(len(table))]})
+
+    _, summary = reshape_playlist(df, table, {'energy': 9}, tempo_smoothness=1.0, method='greedy', time_budget=0)
+
+    assert summary['batches'] == 0
+    assert summary['cost'] == summary['initial_cost']
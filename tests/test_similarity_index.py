@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+import similarity_index
+from feature_cache import FeatureCache
+from similarity_index import build_similarity_index, load_similarity_index
+from synthetic_playlists import SyntheticFeatures, SyntheticLibrary
+
+
+def fill_cache(cache, library, indices):
+    """
+    Caches the audio features of the library's tracks at the given indices.
+    """
+    features = SyntheticFeatures(library)
+    cache.put_many({library.track_id(index): features[library.track_id(index)] for index in indices})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = FeatureCache(str(tmp_path / 'cache'))
+    fill_cache(cache, SyntheticLibrary(1000), range(1000))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def index(cache, tmp_path, monkeypatch):
+    # Small blocks, so queries are merged across many blocks
+    monkeypatch.setattr(similarity_index, 'BLOCK_PAIRS', 512)
+    monkeypatch.setattr(similarity_index, 'MAX_BLOCK_ROWS', 128)
+    return build_similarity_index(cache, str(tmp_path / 'index'))
+
+
+def brute_force_distances(index, queries):
+    """
+    Computes the distance of every query to every indexed track directly.
+    """
+    vectors = np.asarray(index.vectors, dtype=np.float64)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+    return np.sqrt(((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2))
+
+
+def test_nearest_matches_brute_force(index):
+    queries = np.asarray(index.vectors[[3, 500, 999]])
+    exclude = np.array([3, 10, 500])
+
+    positions, distances = index.nearest(queries, 20, exclude=exclude)
+
+    expected = brute_force_distances(index, queries)
+    expected[:, exclude] = np.inf
+    for row in range(len(queries)):
+        assert distances[row] == pytest.approx(np.sort(expected[row])[:20], abs=1e-5)
+        assert distances[row] == pytest.approx(expected[row][positions[row]], abs=1e-5)
+        assert not np.isin(positions[row], exclude).any()
+
+
+def test_nearest_pads_when_too_few_tracks_are_left(index):
+    positions, distances = index.nearest(index.vectors[:1], len(index), exclude=np.arange(len(index) - 2))
+
+    assert np.isfinite(distances[0]).sum() == 2
+    assert sorted(positions[0][np.isfinite(distances[0])]) == [len(index) - 2, len(index) - 1]
+
+
+def test_within_matches_brute_force(index):
+    query = np.asarray(index.vectors[42])
+    expected = brute_force_distances(index, query)[0]
+    radius = float(np.quantile(expected, 0.1))
+
+    positions, distances = index.within(query, radius)
+
+    # Tracks right at the radius may fall either side of it in float32
+    inside = np.flatnonzero(expected <= radius - 1e-5)
+    assert set(inside) <= set(positions)
+    assert set(positions) <= set(np.flatnonzero(expected <= radius + 1e-5))
+    assert distances == pytest.approx(expected[positions], abs=1e-5)
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_full_cache_evicting_tracks_rebuilds_the_index(tmp_path):
+    library = SyntheticLibrary(120)
+    cache = FeatureCache(str(tmp_path / 'cache'), max_entries=100)
+    try:
+        fill_cache(cache, library, range(100))
+        path = str(tmp_path / 'index')
+        assert len(load_similarity_index(cache, path)) == 100
+
+        # New tracks evict old ones, so the cache keeps its size but not its tracks
+        fill_cache(cache, library, range(100, 110))
+        assert len(cache) == 100
+
+        index = load_similarity_index(cache, path)
+        assert (index.positions_of([library.track_id(105)]) >= 0).all()
+    finally:
+        cache.close()
+
+
+def test_unchanged_cache_loads_the_saved_index(cache, tmp_path, monkeypatch):
+    path = str(tmp_path / 'index')
+    load_similarity_index(cache, path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the index was rebuilt')
+    monkeypatch.setattr(similarity_index, 'build_similarity_index', fail)
+
+    # Looking tracks up only marks them as recently used
+    cache.get_many(['0' * 22])
+    assert len(load_similarity_index(cache, path)) == 1000
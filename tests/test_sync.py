@@ -0,0 +1,69 @@
+import pytest
+from playlist_csv_manager import create_csv_at, read_sync_state, sync_csv
+from playlist_storage import load_playlist, load_playlist_stats
+from synthetic_playlists import SyntheticLibrary, SyntheticSpotify, synthetic_id
+
+
+@pytest.fixture
+def sp():
+    # Two playlists: the first 200 and the first 150 tracks of the library
+    return SyntheticSpotify(SyntheticLibrary(300), playlist_sizes=[200, 150])
+
+
+def test_export_records_the_snapshot(sp, tmp_path):
+    path = str(tmp_path / 'playlist.csv')
+    create_csv_at(sp, 'synthetic0', path)
+
+    assert read_sync_state(path) == {'playlist_id': 'synthetic0', 'snapshot_id': '0'}
+
+
+def test_unchanged_snapshot_fetches_nothing(sp, tmp_path, capsys):
+    path = str(tmp_path / 'playlist.csv')
+    create_csv_at(sp, 'synthetic0', path)
+    sp.reset_counts()
+
+    sync_csv(sp, 'synthetic0', path)
+
+    assert sp.request_counts == {'playlist': 1}
+    assert "already up to date" in capsys.readouterr().out
+
+
+def test_added_tracks_only_fetch_their_features(sp, tmp_path):
+    path = str(tmp_path / 'playlist.csv')
+    create_csv_at(sp, 'synthetic0', path)
+    sp.playlist_add_items('synthetic0', [synthetic_id(index) for index in range(200, 220)])
+    sp.reset_counts()
+
+    sync_csv(sp, 'synthetic0', path)
+
+    assert sp.request_counts['audio_features'] == 1
+    df = load_playlist(path)
+    assert len(df) == 220
+    assert df['ID'].tolist()[-20:] == [synthetic_id(index) for index in range(200, 220)]
+    assert load_playlist_stats(path).rows == 220
+
+
+def test_removed_tracks_are_dropped(sp, tmp_path):
+    path = str(tmp_path / 'playlist.csv')
+    create_csv_at(sp, 'synthetic0', path)
+    items = sp.playlists['synthetic0']['items']
+    del items.indices[:10]
+    sp.playlists['synthetic0']['snapshot_id'] = '1'
+    sp.reset_counts()
+
+    sync_csv(sp, 'synthetic0', path)
+
+    assert sp.request_counts['audio_features'] == 0
+    assert load_playlist(path)['ID'].tolist() == [synthetic_id(index) for index in range(10, 200)]
+
+
+def test_exporting_another_playlist_invalidates_the_sync_state(sp, tmp_path):
+    path = str(tmp_path / 'playlist.csv')
+    sync_csv(sp, 'synthetic0', path)
+    create_csv_at(sp, 'synthetic1', path)
+
+    # The snapshot of the first playlist is unchanged, but the file now holds the second one
+    sync_csv(sp, 'synthetic0', path)
+
+    assert len(load_playlist(path)) == 200
+    assert read_sync_state(path)['playlist_id'] == 'synthetic0'
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from composite import round_significant
+from mock_spotify import make_track_item
+from synthetic_playlists import SyntheticLibrary
+from track_table import TrackTable
+
+# Tracks with repeated names and artists, a local file without an ID, and missing values
+ROWS = [
+    {'Name': 'Song', 'Artist': 'A', 'ID': '4uLU6hMCjMI75M1A2tKUQC', 'DateAdded': '2024-01-01T00:00:00Z',
+     'Composite Value': 0.512, 'Artists': [('a', 'A')]},
+    {'Name': 'Song', 'Artist': 'A, B', 'ID': '1301WleyT98MSxVHPZCA6M', 'DateAdded': '2024-02-29T23:59:59Z',
+     'Composite Value': 0.0731, 'Artists': [('a', 'A'), ('b', 'B')]},
+    {'Name': 'Chanson d’été', 'Artist': 'Ç', 'ID': None, 'DateAdded': '2023-06-15T12:30:00Z',
+     'Composite Value': None, 'Artists': [(None, 'Ç')]},
+    {'Name': None, 'Artist': None, 'ID': '7ouMYWpwJ422jRcDASZB7P', 'DateAdded': None,
+     'Composite Value': 1.0, 'Artists': []}
+]
+
+
+def expected_dataframe(rows):
+    """
+    Builds the playlist data of rows directly with pandas, in the storage types of the playlist columns.
+    """
+    return pd.DataFrame({
+        'Name': np.array([row['Name'] for row in rows], dtype=object),
+        'Artist': pd.Categorical([row['Artist'] for row in rows]),
+        'ID': np.array([row['ID'] for row in rows], dtype=object),
+        'DateAdded': pd.to_datetime([row['DateAdded'] for row in rows], utc=True).astype('datetime64[ns, UTC]'),
+        'Composite Value': np.array([row['Composite Value'] for row in rows], dtype=float)
+    })
+
+
+def test_rows_round_trip_losslessly():
+    df = TrackTable.from_rows(ROWS).to_dataframe()
+
+    pd.testing.assert_frame_equal(df, expected_dataframe(ROWS), check_categorical=False)
+    assert df['Artist'].cat.categories.tolist() == ['A', 'A, B', 'Ç']
+    assert df['Composite Value'].isna().tolist() == [False, False, True, False]
+
+
+def test_dataframe_round_trip_is_unchanged():
+    df = TrackTable.from_rows(ROWS).to_dataframe()
+
+    pd.testing.assert_frame_equal(TrackTable.from_dataframe(df).to_dataframe(), df)
+
+
+def test_composite_values_read_back_exactly():
+    # Composite values are stored as float32 but have 3 significant figures, which float32 holds
+    values = round_significant(np.random.default_rng(0).random(100000))
+    tracks = TrackTable.from_rows([{'Name': 'x', 'Artist': 'y', 'ID': None, 'DateAdded': None}] * len(values))
+    tracks.set_composites(values)
+
+    assert np.array_equal(tracks.to_dataframe(['Composite Value'])['Composite Value'].to_numpy(), values)
+
+
+def test_items_keep_their_ids_dates_and_credits():
+    items = [make_track_item(row['ID'], row['Name'], [name for _, name in row['Artists']], row['DateAdded'])
+             for row in ROWS]
+
+    tracks = TrackTable.from_items(items)
+
+    assert tracks.track_ids() == [row['ID'] for row in ROWS]
+    pd.testing.assert_series_equal(tracks.to_dataframe(['DateAdded'])['DateAdded'], expected_dataframe(ROWS)['DateAdded'])
+    assert [len(credits) for _, credits in tracks.track_credits()] == [1, 2, 1, 0]
+
+
+def test_concat_of_pages_matches_the_whole_table():
+    library = SyntheticLibrary(1000, seed=3)
+    tracks = TrackTable.from_items([library.item(index) for index in range(library.track_count)])
+    tracks.set_composites(round_significant(np.random.default_rng(1).random(len(tracks))))
+
+    # Each page has its own dictionaries, which concat merges
+    pages = [TrackTable.from_items([library.item(index) for index in range(start, min(start + 100, 1000))])
+             for start in range(0, 1000, 100)]
+    for start, page in zip(range(0, 1000, 100), pages):
+        page.set_composites(tracks.composite[start:start + 100])
+    combined = TrackTable.concat(pages)
+
+    pd.testing.assert_frame_equal(combined.to_dataframe(), tracks.to_dataframe(), check_categorical=False)
+    assert list(combined.track_credits()) == list(tracks.track_credits())
+    assert len(combined.names) == len(set(combined.names))
+    assert len(combined.credits) == len(set(combined.credits))
+
+    # Taking tracks back out of the combined table gives the same tracks
+    positions = np.arange(999, -1, -7)
+    pd.testing.assert_frame_equal(combined.take(positions).to_dataframe(),
+                                  tracks.to_dataframe().iloc[positions].reset_index(drop=True), check_categorical=False)
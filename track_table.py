@@ -0,0 +1,301 @@
+import sys
+import numpy as np
+import pandas as pd
+from artist_index import ARTIST_SEPARATOR
+from composite import round_significant
+
+# The columns a TrackTable converts to, in playlist file order
+TRACK_COLUMNS = ['Name', 'Artist', 'ID', 'DateAdded', 'Composite Value']
+
+# The length of Spotify IDs; IDs are stored as fixed width bytes of at least this width
+ID_LENGTH = 22
+
+
+def _code(dictionary, value):
+    """
+    Returns the dictionary code of a value, adding it if it is new; missing values are -1.
+    """
+    if value is None or value != value:
+        return -1
+    return dictionary.setdefault(value, len(dictionary))
+
+
+def _remap(codes, values, dictionary):
+    """
+    Re-encodes codes of one dictionary's values into another dictionary, adding the values it lacks.
+    """
+    # The extra last entry maps the missing code -1 to itself
+    mapping = np.array([dictionary.setdefault(value, len(dictionary)) for value in values] + [-1], dtype=np.int32)
+    return mapping[codes]
+
+
+def encode_ids(track_ids):
+    """
+    Stores track IDs as fixed width bytes, an empty string for tracks without an ID such as local files.
+    """
+    track_ids = ['' if track_id is None or track_id != track_id else track_id for track_id in track_ids]
+    width = max([ID_LENGTH] + [len(track_id) for track_id in track_ids])
+    return np.array(track_ids, dtype=f'S{width}')
+
+
+def to_nanoseconds(dates):
+    """
+    Converts dates of any form pandas understands to int64 nanoseconds since the epoch, in UTC.
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(dates, utc=True)).tz_localize(None)
+    return index.to_numpy().astype('datetime64[ns]').view(np.int64)
+
+
+def parse_timestamps(timestamps):
+    """
+    Parses the ISO 8601 UTC timestamps the API returns, e.g. '2024-01-01T00:00:00Z', in one pass.
+
+    numpy parses the fixed format directly, which is much faster than pandas inferring it;
+    anything else is left to pandas.
+
+    Returns:
+        np.ndarray: int64 nanoseconds since the epoch, the smallest int64 (NaT) where missing.
+    """
+    try:
+        cleaned = ['NaT' if timestamp is None else timestamp.rstrip('Z') for timestamp in timestamps]
+        return np.array(cleaned, dtype='datetime64[ns]').view(np.int64)
+    except (AttributeError, TypeError, ValueError):
+        return to_nanoseconds(list(timestamps))
+
+
+def _offsets(counts):
+    """
+    Turns the number of credits of each track into the offsets of each track's credits.
+    """
+    return np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64)
+
+
+class TrackTable:
+    """
+    The tracks of a playlist stored column by column with fixed types.
+
+    Names and joined artists are dictionary encoded as int32 codes, IDs are fixed width bytes,
+    dates are int64 nanoseconds since the epoch and composite values are float32, so a track
+    takes a few dozen bytes instead of a dictionary of five boxed values. The credited artists
+    of each track are kept as codes into a dictionary of (artist ID, name) pairs, for the artist
+    index. Converting to pandas needs no type inference or date parsing: codes become
+    categoricals directly and the dates are viewed as datetimes.
+    """
+
+    def __init__(self, name_codes, names, artist_codes, artists, ids, added_at, composite,
+                 credit_offsets=None, credit_codes=None, credits=None):
+        """
+        Initializes a TrackTable instance from its columns.
+
+        Args:
+            name_codes (np.ndarray): The int32 code of each track's name in names, -1 if missing.
+            names (list): The distinct track names.
+            artist_codes (np.ndarray): The int32 code of each track's joined artists in artists, -1 if missing.
+            artists (list): The distinct joined artist names.
+            ids (np.ndarray): The track IDs as fixed width bytes, empty for tracks without one.
+            added_at (np.ndarray): The int64 nanoseconds since the epoch each track was added.
+            composite (np.ndarray): The float32 composite value of each track, NaN if unknown.
+            credit_offsets (np.ndarray): The position of each track's first credit in credit_codes,
+                followed by the number of credits; no credits if None.
+            credit_codes (np.ndarray): The int32 code of each credit in credits.
+            credits (list): The distinct (artist ID, name) pairs credited.
+        """
+        self.name_codes = name_codes
+        self.names = names
+        self.artist_codes = artist_codes
+        self.artists = artists
+        self.ids = ids
+        self.added_at = added_at
+        self.composite = composite
+        self.credit_offsets = credit_offsets if credit_offsets is not None else np.zeros(len(ids) + 1, dtype=np.int64)
+        self.credit_codes = credit_codes if credit_codes is not None else np.empty(0, dtype=np.int32)
+        self.credits = credits if credits is not None else []
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls):
+        return cls.from_rows([])
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Builds a table from playlist items, as the 'playlist_tracks' endpoint returns them.
+
+        Args:
+            items (list): The playlist items.
+        Returns:
+            TrackTable: The tracks, with unknown composite values.
+        """
+        names, artists, credits = {}, {}, {}
+        name_codes, artist_codes, credit_codes, credit_counts, track_ids, timestamps = [], [], [], [], [], []
+
+        for item in items:
+            track = item['track']
+            pairs = [(artist.get('id'), artist['name']) for artist in track['artists']]
+            name_codes.append(_code(names, track['name']))
+            artist_codes.append(_code(artists, ARTIST_SEPARATOR.join([name for _, name in pairs])))
+            credit_codes.extend(_code(credits, pair) for pair in pairs)
+            credit_counts.append(len(pairs))
+            track_ids.append(track['id'])
+            timestamps.append(item['added_at'])
+
+        return cls(
+            np.array(name_codes, dtype=np.int32), list(names),
+            np.array(artist_codes, dtype=np.int32), list(artists),
+            encode_ids(track_ids), parse_timestamps(timestamps), np.full(len(track_ids), np.nan, dtype=np.float32),
+            _offsets(credit_counts), np.array(credit_codes, dtype=np.int32), list(credits)
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a table from track details, one dictionary per track with the playlist columns.
+
+        Rows that carry their artists under 'Artists' keep them as credits.
+
+        Args:
+            rows (list): The track details.
+        Returns:
+            TrackTable: The tracks.
+        """
+        names, artists, credits = {}, {}, {}
+        credit_codes, credit_counts = [], []
+        for row in rows:
+            pairs = row.get('Artists', [])
+            credit_codes.extend(_code(credits, pair) for pair in pairs)
+            credit_counts.append(len(pairs))
+
+        composite = np.array([row.get('Composite Value') for row in rows], dtype=np.float64)
+        return cls(
+            np.array([_code(names, row['Name']) for row in rows], dtype=np.int32), list(names),
+            np.array([_code(artists, row['Artist']) for row in rows], dtype=np.int32), list(artists),
+            encode_ids([row['ID'] for row in rows]), parse_timestamps([row['DateAdded'] for row in rows]),
+            composite.astype(np.float32), _offsets(credit_counts), np.array(credit_codes, dtype=np.int32), list(credits)
+        )
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Builds a table from playlist data; columns the DataFrame lacks are left missing.
+
+        Args:
+            df (pd.DataFrame): The playlist data.
+        Returns:
+            TrackTable: The tracks, without credits.
+        """
+        track_count = len(df)
+
+        def factorize(column):
+            if column not in df:
+                return np.full(track_count, -1, dtype=np.int32), []
+            codes, uniques = pd.factorize(df[column])
+            return codes.astype(np.int32), list(uniques)
+
+        name_codes, names = factorize('Name')
+        artist_codes, artists = factorize('Artist')
+        ids = encode_ids(df['ID'].tolist() if 'ID' in df else [None] * track_count)
+        added_at = to_nanoseconds(df['DateAdded']) if 'DateAdded' in df else np.full(track_count, np.iinfo(np.int64).min)
+        if 'Composite Value' in df:
+            composite = pd.to_numeric(df['Composite Value'], errors='coerce').to_numpy(dtype=np.float32)
+        else:
+            composite = np.full(track_count, np.nan, dtype=np.float32)
+        return cls(name_codes, names, artist_codes, artists, ids, added_at, composite)
+
+    @classmethod
+    def concat(cls, tables):
+        """
+        Combines tables into one, merging their dictionaries.
+
+        Args:
+            tables (list): The tables, in order.
+        Returns:
+            TrackTable: The tracks of every table.
+        """
+        if not tables:
+            return cls.empty()
+        names, artists, credits = {}, {}, {}
+        return cls(
+            np.concatenate([_remap(table.name_codes, table.names, names) for table in tables]), list(names),
+            np.concatenate([_remap(table.artist_codes, table.artists, artists) for table in tables]), list(artists),
+            np.concatenate([table.ids for table in tables]),
+            np.concatenate([table.added_at for table in tables]),
+            np.concatenate([table.composite for table in tables]),
+            _offsets(np.concatenate([np.diff(table.credit_offsets) for table in tables])),
+            np.concatenate([_remap(table.credit_codes, table.credits, credits) for table in tables]).astype(np.int32),
+            list(credits)
+        )
+
+    def take(self, positions):
+        """
+        Returns the tracks at the given positions as a new table sharing this table's dictionaries.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+
+        # Gather the credits of each chosen track into one contiguous run
+        counts = np.diff(self.credit_offsets)[positions]
+        starts = self.credit_offsets[:-1][positions]
+        offsets = _offsets(counts)
+        gather = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+
+        return TrackTable(
+            self.name_codes[positions], self.names, self.artist_codes[positions], self.artists,
+            self.ids[positions], self.added_at[positions], self.composite[positions],
+            offsets, self.credit_codes[gather], self.credits
+        )
+
+    def track_ids(self):
+        """
+        Returns the track IDs as strings, None for tracks without an ID.
+        """
+        return [track_id.decode() or None for track_id in self.ids.tolist()]
+
+    def track_credits(self):
+        """
+        Yields the ID and the (artist ID, name) pairs of the credited artists of each track.
+        """
+        for track_id, start, stop in zip(self.track_ids(), self.credit_offsets[:-1], self.credit_offsets[1:]):
+            yield track_id, [self.credits[code] for code in self.credit_codes[start:stop]]
+
+    def set_composites(self, values):
+        """
+        Sets the composite value of every track.
+
+        Args:
+            values (list): The composite value of each track, None where it has none.
+        """
+        self.composite = np.array(values, dtype=np.float64).astype(np.float32)
+
+    def to_dataframe(self, columns=None):
+        """
+        Converts the tracks to playlist data with the storage types of the playlist columns.
+
+        Artist codes become a categorical without copying the strings, dates are a view of the
+        int64 column, and composite values are widened and rounded back to their significant
+        figures, so they read exactly as they were computed.
+
+        Args:
+            columns (list): The columns to include, every column in TRACK_COLUMNS if None.
+        Returns:
+            pd.DataFrame: The playlist data.
+        """
+        builders = {
+            'Name': lambda: np.array(self.names + [None], dtype=object)[self.name_codes],
+            'Artist': lambda: pd.Categorical.from_codes(self.artist_codes, pd.Index(self.artists, dtype=object)),
+            'ID': lambda: np.where(self.ids == b'', None, np.char.decode(self.ids, 'ascii')).astype(object),
+            'DateAdded': lambda: pd.to_datetime(self.added_at.view('datetime64[ns]'), utc=True),
+            'Composite Value': lambda: round_significant(self.composite.astype(np.float64))
+        }
+        columns = columns or TRACK_COLUMNS
+        return pd.DataFrame({column: builders[column]() for column in columns}, columns=columns)
+
+    def memory_usage(self):
+        """
+        Returns the bytes used by the table's columns and dictionaries.
+        """
+        arrays = (self.name_codes, self.artist_codes, self.ids, self.added_at, self.composite,
+                  self.credit_offsets, self.credit_codes)
+        dictionaries = sum(sys.getsizeof(value) for value in self.names + self.artists)
+        credits = sum(sys.getsizeof(pair) + sys.getsizeof(pair[0]) + sys.getsizeof(pair[1]) for pair in self.credits)
+        return sum(array.nbytes for array in arrays) + dictionaries + credits